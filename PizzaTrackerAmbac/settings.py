@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_extensions',
     "allauth",
     "allauth.account",
@@ -130,6 +131,21 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Table fragments, facet lists, routings and the model change counters that invalidate them live
+# here, so every process that writes (web workers, `run_jobs`, management commands) must share
+# it. The default is a database table, created before `migrate` runs (see `Tracker.signals`);
+# a per-process backend such as LocMemCache would keep serving stale tables after writes made
+# elsewhere.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'tracker_cache'),
+    }
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -187,6 +203,19 @@ NPM_BIN_PATH = os.environ.get("NPM_BIN_PATH")
 
 AUDITLOG_INCLUDE_ALL_MODELS = True
 
+# Derived data and job bookkeeping; the underlying part changes themselves are audited.
+AUDITLOG_EXCLUDE_TRACKING_MODELS = (
+    "Tracker.WipSummary",
+    "Tracker.StepDurationRollup",
+    "Tracker.StepTransitionDailyCount",
+    "Tracker.Watermark",
+    "Tracker.Job",
+    "Tracker.ErpIdSequence",
+)
+
+# Where `manage.py export_analytics` writes its Parquet datasets.
+ANALYTICS_EXPORT_DIR = os.environ.get('ANALYTICS_EXPORT_DIR', BASE_DIR / 'analytics_export')
+
 HUBSPOT_DEBUG = True
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
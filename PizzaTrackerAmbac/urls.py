@@ -23,6 +23,7 @@ from Tracker import views
 from Tracker.forms import DealForm
 from Tracker.generic_views import GenericCreateEntry, GenericUpdateEntry, GenericDeleteEntry, GenericViewEntry
 from Tracker.hubspot_view import hubspot_webhook
+from Tracker.scan_view import scan_batch, scan_part
 from Tracker.views import OrderUpdateView, OrderCreateView, ErrorFormView
 
 from Tracker.AI_view import chat_ai_view
@@ -84,6 +85,10 @@ urlpatterns += [
     path("deals/new/", OrderCreateView.as_view(), name="deal_create"),
     path("deals/<int:order_id>/edit/", OrderUpdateView.as_view(), name="deal_edit"),
 
+    path("jobs/<int:job_id>/", views.job_status, name="job_status"),
+
+    path("analytics/export/<str:dataset>/", views.analytics_export_view, name="analytics_export"),
+
     path("deal_pass/<int:order_id>/", views.deal_pass, name="deal_pass"),
 
     path("partials/parttype_row/", views.add_parttype_partial, name="add_parttype_partial"),
@@ -97,6 +102,8 @@ urlpatterns += [
 
     path("tables/generic_table_view/<str:model_name>", views.generic_table_view, name="generic_table_view"),
 
+    path("tables/export/<str:model_name>", views.export_table_view, name="export_table_view"),
+
     path("edit_model_page/<str:model_name>", views.edit_model_page, name="edit_model_page"),
 ]
 
@@ -113,4 +120,6 @@ urlpatterns += [
     path("chat/", chat_ai_view.as_view(), name="chat_ai_view"),
 
     path("webhooks/hubspot/", hubspot_webhook, name="hubspot_webhook"),
+    path("api/scan/", scan_part, name="scan_part"),
+    path("api/scan/batch/", scan_batch, name="scan_batch"),
 ]
\ No newline at end of file
@@ -6,7 +6,7 @@ from .models import (
     PartTypes, Processes, Steps, Companies, User, Orders, Parts,
     Documents, EquipmentType, Equipments, QualityErrorsList,
     ErrorReports, EquipmentUsage, ExternalAPIOrderIdentifier,
-    ArchiveReason, StepTransitionLog, WorkOrder
+    ArchiveReason, StepTransitionLog, WorkOrder, ScanEvent, Job
 )
 from django.contrib.auth.admin import UserAdmin
 
@@ -131,6 +131,20 @@ class StepTransitionLogAdmin(admin.ModelAdmin):
     list_filter = ("timestamp",)
 
 
+@admin.register(ScanEvent)
+class ScanEventAdmin(admin.ModelAdmin):
+    list_display = ("erp_id", "action", "result", "operator", "equipment", "scanned_at", "received_at")
+    list_filter = ("action", "result")
+    search_fields = ("erp_id", "idempotency_key")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "progress", "total", "attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("name", "status")
+    readonly_fields = ("progress", "total", "result", "error", "attempts", "started_at", "heartbeat_at", "finished_at")
+
+
 @admin.register(WorkOrder)
 class WorkOrderAdmin(admin.ModelAdmin):
     list_display = ("status", "ERP_id", "created_at", "updated_at", "expected_completion", "expected_duration",
@@ -0,0 +1,120 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from Tracker.models import EquipmentUsage, Steps, StepDurationRollup, StepTransitionLog, Watermark
+
+DWELL_LOOKBACK = timedelta(days=7)
+"""
+How far before a refresh window transitions are read to find where a dwell started.
+
+Dwell times longer than this are not counted; it bounds how much of the log each refresh scans.
+"""
+
+REFRESH_CHUNK = {
+    StepDurationRollup.Period.HOUR: timedelta(days=1),
+    StepDurationRollup.Period.DAY: timedelta(days=31),
+}
+"""How much time one rollup statement covers during a catch-up refresh."""
+
+DEFAULT_BACKFILL = timedelta(days=30)
+"""How far back the first refresh starts when there is no watermark yet."""
+
+
+def truncate(value, period):
+    """Returns the start of the hour or (UTC) day that `value` falls in."""
+    value = value.astimezone(dt_timezone.utc)
+    if period == StepDurationRollup.Period.DAY:
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def refresh_step_durations(period, start, end):
+    """
+    Recomputes the `period` rollups for buckets in `[start, end)` from the transition log.
+
+    Dwells are attributed to the bucket in which they ended. One statement derives dwell times
+    with a LEAD window over each part's transitions (reading `DWELL_LOOKBACK` further back to find
+    dwell starts), attaches the equipment used at the step, and aggregates count, total and
+    p50/p95/p99 per process, step, part type, operator and equipment. Existing rows for those
+    buckets are replaced, so refreshing a window twice is safe.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    table = connection.ops.quote_name
+    log = table(StepTransitionLog._meta.db_table)
+    steps = table(Steps._meta.db_table)
+    usage = table(EquipmentUsage._meta.db_table)
+    rollup = table(StepDurationRollup._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {rollup} WHERE period = %s AND bucket >= %s AND bucket < %s", [period, start, end]
+        )
+        cursor.execute(
+            f"""
+            WITH dwell AS (
+                SELECT l.part_id, l.step_id, s.process_id, s.part_type_id,
+                       l."timestamp" AS entered_at,
+                       LEAD(l."timestamp") OVER w AS left_at,
+                       LEAD(l.operator_id) OVER w AS operator_id
+                FROM {log} l
+                JOIN {steps} s ON s.id = l.step_id
+                WHERE l."timestamp" >= %(scan_start)s AND l."timestamp" < %(end)s
+                WINDOW w AS (PARTITION BY l.part_id ORDER BY l."timestamp", l.id)
+            ),
+            measured AS (
+                SELECT d.*, EXTRACT(EPOCH FROM d.left_at - d.entered_at) AS seconds, u.equipment_id
+                FROM dwell d
+                LEFT JOIN LATERAL (
+                    SELECT equipment_id FROM {usage}
+                    WHERE part_id = d.part_id AND step_id = d.step_id
+                    ORDER BY used_at LIMIT 1
+                ) u ON true
+                WHERE d.left_at >= %(start)s AND d.left_at < %(end)s
+            )
+            INSERT INTO {rollup} (period, bucket, process_id, step_id, part_type_id, operator_id, equipment_id,
+                                  count, total_seconds, p50_seconds, p95_seconds, p99_seconds)
+            SELECT %(period)s, date_trunc(%(period)s, left_at), process_id, step_id, part_type_id, operator_id,
+                   equipment_id, COUNT(*), SUM(seconds),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY seconds),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY seconds),
+                   percentile_cont(0.99) WITHIN GROUP (ORDER BY seconds)
+            FROM measured
+            GROUP BY 2, 3, 4, 5, 6, 7
+            """,
+            {"period": period, "start": start, "end": end, "scan_start": start - DWELL_LOOKBACK},
+        )
+        return cursor.rowcount
+
+
+def refresh_pending(period, since=None, now=None):
+    """
+    Brings the `period` rollups up to date, refreshing only buckets completed since the last run.
+
+    Progress is kept in the `Watermark` named "step_durations:<period>"; `since` overrides it, e.g.
+    to recompute after offline scans with old timestamps were uploaded. The current, still open
+    bucket is never written.
+
+    Returns:
+        tuple[datetime, datetime, int]: The refreshed window and the number of rollup rows written.
+    """
+    name = f"step_durations:{period}"
+    end = truncate(now or timezone.now(), period)
+    if since is not None:
+        start = truncate(since, period)
+    else:
+        watermark = Watermark.objects.filter(name=name).values_list("value", flat=True).first()
+        start = watermark or truncate(end - DEFAULT_BACKFILL, period)
+
+    written = 0
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + REFRESH_CHUNK[period], end)
+        written += refresh_step_durations(period, chunk_start, chunk_end)
+        Watermark.objects.update_or_create(name=name, defaults={"value": chunk_end})
+        chunk_start = chunk_end
+    return start, end, written
+
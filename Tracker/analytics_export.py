@@ -0,0 +1,223 @@
+import io
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.db import models
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from Tracker.models import EquipmentUsage, ErrorReports, Parts, StepTransitionLog, Watermark
+from Tracker.tables.export import EXPORT_CHUNK_SIZE
+
+BATCH_ROWS = 50000
+"""Rows per Arrow record batch, i.e. per Parquet file written per partition and run."""
+
+EXPORT_LAG = timedelta(minutes=5)
+"""
+Changes newer than this are left for a later run.
+
+Gives transactions that were open when the export started time to commit, so rows stamped
+before the watermark (or given a lower id) but committed after it are not skipped. Time-ordered
+datasets leave out rows changed within the lag; id-ordered datasets export up to the highest id
+a previous run saw at least this long ago (see `_id_horizon`).
+"""
+
+DATASETS = {
+    "parts": {
+        "model": Parts,
+        "order": ("updated_at", "id"),
+        "date": "updated_at",
+        "columns": ["id", "ERP_id", "order_id", "part_type_id", "step_id", "status", "archived", "created_at", "updated_at"],
+    },
+    "transitions": {
+        "model": StepTransitionLog,
+        "order": ("id",),
+        "date": "timestamp",
+        "columns": ["id", "part_id", "part__part_type_id", "step_id", "operator_id", "timestamp"],
+    },
+    "error_reports": {
+        "model": ErrorReports,
+        "order": ("id",),
+        "date": "created_at",
+        "columns": ["id", "part_id", "part__part_type_id", "machine_id", "operator_id", "description", "created_at"],
+    },
+    "equipment_usage": {
+        "model": EquipmentUsage,
+        "order": ("id",),
+        "date": "used_at",
+        "columns": ["id", "equipment_id", "step_id", "part_id", "part__part_type_id", "error_report_id", "operator_id",
+                    "used_at", "notes"],
+    },
+}
+"""
+Exported tables: the model, the columns (values_list paths), the timestamp rows are dated by and
+the order rows are exported in. Parts change, so they are picked up by `updated_at`; the other
+tables only grow, so they are picked up by id, which also catches offline scans stamped in the past.
+"""
+
+PARTITION_COLUMNS = ["date", "part_type_id"]
+"""Hive-style partition directories of the Parquet datasets, e.g. transitions/date=2025-06-01/part_type_id=3/."""
+
+
+def _column_name(path):
+    return path.split("__")[-1]
+
+
+def _arrow_type(model, path):
+    """Maps the model field behind a values_list path to an Arrow type."""
+    field = None
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        if field.is_relation:
+            model = field.related_model
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, (models.FloatField, models.DecimalField)):
+        return pa.float64()
+    return pa.string()
+
+
+def dataset_schema(name):
+    """Returns the Arrow schema of a dataset: its columns plus the UTC `date` partition column."""
+    spec = DATASETS[name]
+    fields = [pa.field(_column_name(path), _arrow_type(spec["model"], path)) for path in spec["columns"]]
+    return pa.schema(fields + [pa.field("date", pa.date32())])
+
+
+def record_batches(name, queryset):
+    """
+    Yields Arrow record batches of `BATCH_ROWS` rows from a dataset queryset.
+
+    Rows are read through a server-side cursor (`values_list().iterator()`) and converted column by
+    column with the dataset's fixed schema, so memory use is bounded by one batch and every batch
+    has the same types even when a column is all nulls.
+    """
+    spec = DATASETS[name]
+    schema = dataset_schema(name)
+    date_index = [_column_name(path) for path in spec["columns"]].index(spec["date"])
+    rows = queryset.values_list(*spec["columns"]).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(rows, BATCH_ROWS))
+        if not chunk:
+            return
+        columns = [list(column) for column in zip(*chunk)]
+        columns.append([value.astimezone(dt_timezone.utc).date() if value else None for value in columns[date_index]])
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+
+def dataset_rows(name, start=None, end=None):
+    """Returns a dataset's rows dated within `[start, end)` (either bound optional), in export order."""
+    spec = DATASETS[name]
+    rows = spec["model"].objects.order_by(*spec["order"])
+    if start is not None:
+        rows = rows.filter(**{f"{spec['date']}__gte": start})
+    if end is not None:
+        rows = rows.filter(**{f"{spec['date']}__lt": end})
+    return rows
+
+
+def _id_horizon(name, now):
+    """
+    Returns the highest id of an id-ordered dataset that is safe to export, or None if none is yet.
+
+    Ids are handed out when a row is inserted, not when it commits, so a concurrent upload can
+    commit a lower id after a higher one was exported. Each run therefore records the table's
+    current highest id in the "analytics_export:<name>:horizon" watermark, and rows up to it are
+    exported once it is `EXPORT_LAG` old. The first run only records the horizon.
+    """
+    horizon_name = f"analytics_export:{name}:horizon"
+    horizon = Watermark.objects.filter(name=horizon_name).first()
+    if horizon is not None and horizon.value > now - EXPORT_LAG:
+        return None
+    latest = DATASETS[name]["model"].objects.aggregate(latest=Max("id"))["latest"] or 0
+    Watermark.objects.update_or_create(name=horizon_name, defaults={"value": now, "position": latest})
+    return horizon.position if horizon is not None else None
+
+
+def _pending_rows(name, watermark, now):
+    spec = DATASETS[name]
+    rows = spec["model"].objects.order_by(*spec["order"])
+    if spec["order"] == ("id",):
+        horizon = _id_horizon(name, now)
+        if horizon is None:
+            return rows.none()
+        rows = rows.filter(id__lte=horizon)
+        return rows.filter(id__gt=watermark.position) if watermark and watermark.position else rows
+    field = spec["order"][0]
+    rows = rows.filter(**{f"{field}__lt": now - EXPORT_LAG})
+    if watermark:
+        rows = rows.filter(Q(**{f"{field}__gt": watermark.value}) | Q(**{field: watermark.value, "id__gt": watermark.position or 0}))
+    return rows
+
+
+def export_dataset(name, root, now=None, full=False):
+    """
+    Appends a dataset's rows added or changed since the last export to a partitioned Parquet dataset.
+
+    Progress is kept in the `Watermark` named "analytics_export:<name>" and advanced after every
+    batch, so an interrupted export resumes where it stopped. Rows changed or added within
+    `EXPORT_LAG` are left for a later run. Each run writes new files (named by
+    run) into `root/<name>/date=.../part_type_id=.../`; existing files are never rewritten, so
+    readers should keep the latest row per `id` for the parts dataset.
+
+    Args:
+        root (str | Path): Directory holding one Parquet dataset per exported table.
+        full (bool): Ignore the watermark and export every row again.
+
+    Returns:
+        int: Number of rows exported.
+    """
+    now = now or timezone.now()
+    spec = DATASETS[name]
+    watermark_name = f"analytics_export:{name}"
+    watermark = None if full else Watermark.objects.filter(name=watermark_name).first()
+    target = Path(root) / name
+    run = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+    exported = 0
+    for number, batch in enumerate(record_batches(name, _pending_rows(name, watermark, now))):
+        pq.write_to_dataset(
+            pa.Table.from_batches([batch]),
+            root_path=str(target),
+            partition_cols=PARTITION_COLUMNS,
+            basename_template=f"{run}-{number}-{{i}}.parquet",
+        )
+        exported += batch.num_rows
+        last = batch.slice(batch.num_rows - 1).to_pylist()[0]
+        if spec["order"] == ("id",):
+            value, position = now, last["id"]
+        else:
+            value, position = last[spec["order"][0]], last["id"]
+        Watermark.objects.update_or_create(name=watermark_name, defaults={"value": value, "position": position})
+    return exported
+
+
+def iter_arrow_stream(name, queryset):
+    """
+    Yields a dataset queryset as an Arrow IPC stream, one record batch at a time, for HTTP downloads.
+
+    Read it with `pyarrow.ipc.open_stream(...)`, e.g. `.read_pandas()`.
+    """
+    buffer = io.BytesIO()
+    writer = pa.ipc.new_stream(buffer, dataset_schema(name))
+    for batch in record_batches(name, queryset):
+        writer.write_batch(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    writer.close()
+    yield buffer.getvalue()
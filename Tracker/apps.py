@@ -5,5 +5,8 @@ class TrackerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Tracker'
 
+    def ready(self):
+        from Tracker import signals  # noqa: F401  Registers signal receivers
 
-verbose_name = 'Inventory Management'
\ No newline at end of file
+
+verbose_name = 'Inventory Management'
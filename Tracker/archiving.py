@@ -0,0 +1,93 @@
+from collections import Counter
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from Tracker.models import ArchiveReason, Parts
+from Tracker.transitions import after_bulk_write
+from Tracker.wip import apply_wip_deltas
+
+
+def archive_parts(parts, reason="user_error", user=None, notes="", summary_object=None):
+    """
+    Archives every active part in `parts` with set-based writes.
+
+    The bulk counterpart of `Parts.archive()`: `archived` is flipped with one UPDATE, and
+    `ArchiveReason` rows are written with one UPDATE for parts that already had a reason plus
+    one `bulk_create` for the rest, using a single content type lookup. Instead of one audit
+    entry per part, one summary entry records the archived part ids.
+
+    Args:
+        parts (QuerySet[Parts]): The parts to archive; already archived parts are skipped.
+        reason (str): Archive reason code (must match ArchiveReason.REASON_CHOICES).
+        user (User): Optional user for attribution on the reasons and the audit entry.
+        notes (str): Free-text notes stored on every reason.
+        summary_object (Model): Object the summary audit entry is attached to, e.g. the order.
+            Defaults to an entry on the Parts content type.
+
+    Returns:
+        list[int]: Ids of the parts that were archived.
+
+    Example:
+        archive_parts(Parts.objects.filter(order=order), reason="completed", user=request.user, summary_object=order)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            parts.filter(archived=False).select_for_update(of=("self",)).order_by()
+            .values_list("pk", "order_id", "step_id", "status")
+        )
+        if not rows:
+            return []
+        pks = [pk for pk, _, _, _ in rows]
+
+        Parts.objects.filter(pk__in=pks).update(archived=True, updated_at=now)
+        archived_counts = Counter((order_id, step_id, status) for _, order_id, step_id, status in rows)
+        apply_wip_deltas({key: -count for key, count in archived_counts.items()})
+
+        content_type = ContentType.objects.get_for_model(Parts)
+        existing = ArchiveReason.objects.filter(content_type=content_type, object_id__in=pks)
+        existing_ids = set(existing.values_list("object_id", flat=True))
+        if existing_ids:
+            existing.update(reason=reason, notes=notes, user=user)
+        ArchiveReason.objects.bulk_create(
+            [
+                ArchiveReason(content_type=content_type, object_id=pk, reason=reason, notes=notes, user=user)
+                for pk in pks
+                if pk not in existing_ids
+            ],
+            batch_size=2000,
+        )
+
+        summary_type = ContentType.objects.get_for_model(summary_object) if summary_object else content_type
+        LogEntry.objects.create(
+            actor=user,
+            action=LogEntry.Action.UPDATE,
+            content_type=summary_type,
+            object_pk=str(summary_object.pk) if summary_object else "",
+            object_id=summary_object.pk if summary_object else None,
+            object_repr=str(summary_object) if summary_object else f"{len(pks)} parts",
+            timestamp=now,
+            changes_text=f"Archived {len(pks)} parts ({reason})",
+            changes={"archived": ["False", "True"]},
+            additional_data={"part_ids": pks, "reason": reason, "notes": notes},
+        )
+        transaction.on_commit(lambda: after_bulk_write(Parts, ArchiveReason))
+
+    return pks
+
+
+def archive_order(order, reason="user_error", user=None, notes=""):
+    """
+    Archives an order and all of its parts in one transaction.
+
+    Returns:
+        list[int]: Ids of the parts that were archived.
+    """
+    with transaction.atomic():
+        order.archive(reason=reason, user=user, notes=notes)
+        return archive_parts(
+            Parts.objects.filter(order=order), reason=reason, user=user, notes=notes, summary_object=order
+        )
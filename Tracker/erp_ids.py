@@ -0,0 +1,213 @@
+import re
+
+from django.db import connection, connections, transaction
+
+from Tracker.models import ArchiveReason, ErpIdSequence, Parts
+
+DEFAULT_PREFIX = "PART"
+"""Prefix used for part types without an `ID_prefix`."""
+
+SERIAL_PATTERN = re.compile(r"^(.+)-([0-9]{1,18})$")
+"""Splits an ERP id into prefix and serial, like `seed_erp_sequences` does in SQL."""
+
+
+def erp_prefix(part_type):
+    """Returns the prefix a part type's ERP ids are generated with."""
+    return part_type.ID_prefix or DEFAULT_PREFIX
+
+
+def erp_id(prefix, serial):
+    """Formats a generated ERP id, e.g. "DI-1042"."""
+    return f"{prefix}-{serial}"
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def allocate_erp_ids(prefix, count):
+    """
+    Reserves `count` consecutive serials for `prefix` and returns the first one.
+
+    Normally one UPDATE ... RETURNING on the prefix's `ErpIdSequence` row. The first allocation
+    for a prefix creates the row, starting after the highest serial any existing part (archived
+    or not) has with that prefix. Prefixes are compared case-insensitively, like ERP ids.
+
+    The row stays locked until the surrounding transaction ends, so concurrent allocations for
+    the same prefix wait for each other; allocate outside long transactions. Serials of a rolled
+    back or failed order are not reused.
+
+    Example:
+        start = allocate_erp_ids("DI", 500)
+        erp_ids = [erp_id("DI", start + i) for i in range(500)]
+    """
+    table = connection.ops.quote_name(ErpIdSequence._meta.db_table)
+    parts_table = connection.ops.quote_name(Parts._meta.db_table)
+    key = prefix.upper()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET next_value = next_value + %s, updated_at = now() "
+            f"WHERE prefix = %s RETURNING next_value - %s",
+            [count, key, count],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (prefix, next_value, updated_at)
+                SELECT %(prefix)s, COALESCE(MAX(substring(p."ERP_id" FROM %(start)s)::bigint), 0) + 1 + %(count)s, now()
+                FROM {parts_table} p
+                WHERE upper(p."ERP_id") LIKE %(pattern)s AND substring(p."ERP_id" FROM %(start)s) ~ '^[0-9]{{1,18}}$'
+                ON CONFLICT (prefix) DO UPDATE
+                SET next_value = {table}.next_value + %(count)s, updated_at = now()
+                RETURNING next_value - %(count)s
+                """,
+                {"prefix": key, "count": count, "start": len(prefix) + 2, "pattern": _escape_like(key) + "-%"},
+            )
+            row = cursor.fetchone()
+    return row[0]
+
+
+def reserve_through(prefix, last):
+    """
+    Moves `prefix`'s sequence past `last`, for serials chosen by hand (e.g. a line item's "IDs Start").
+
+    Later allocations then continue after the manually numbered block instead of colliding with it.
+    """
+    allocate_erp_ids(prefix, 0)
+    ErpIdSequence.objects.filter(prefix=prefix.upper(), next_value__lte=last).update(next_value=last + 1)
+
+
+def reserve_erp_ids(erp_ids):
+    """
+    Moves each prefix's sequence past the highest serial among `erp_ids`, for ids created by hand or by import.
+
+    Ids that do not end in `-<serial>` cannot collide with generated ids and are ignored.
+
+    Returns:
+        dict[str, int]: The highest serial reserved per (upper-cased) prefix.
+    """
+    highest = {}
+    for value in erp_ids:
+        match = SERIAL_PATTERN.match(value)
+        if match:
+            prefix, serial = match[1].upper(), int(match[2])
+            highest[prefix] = max(highest.get(prefix, 0), serial)
+    for prefix, last in sorted(highest.items()):
+        reserve_through(prefix, last)
+    return highest
+
+
+def seed_erp_sequences():
+    """
+    Creates or advances every prefix's sequence past the highest serial used by existing parts.
+
+    Run once after deploying the allocator, or after importing parts with ERP ids from elsewhere.
+
+    Returns:
+        int: Number of sequences created or updated.
+    """
+    table = connection.ops.quote_name(ErpIdSequence._meta.db_table)
+    parts_table = connection.ops.quote_name(Parts._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (prefix, next_value, updated_at)
+            SELECT upper(substring("ERP_id" FROM '^(.*)-[0-9]{{1,18}}$')),
+                   MAX(substring("ERP_id" FROM '-([0-9]{{1,18}})$')::bigint) + 1, now()
+            FROM {parts_table}
+            WHERE "ERP_id" ~ '^.+-[0-9]{{1,18}}$'
+            GROUP BY 1
+            ON CONFLICT (prefix) DO UPDATE
+            SET next_value = GREATEST({table}.next_value, EXCLUDED.next_value), updated_at = now()
+            """
+        )
+        return cursor.rowcount
+
+
+def duplicate_erp_ids(limit=100):
+    """
+    Returns ERP ids shared by more than one active part (case-insensitively), with their part ids.
+
+    These must be resolved (renamed or archived) before the `parts_erp_id_unique_active`
+    constraint can be created; `archive_duplicate_erp_ids` does so when migrating.
+
+    Returns:
+        list[tuple[str, list[int]]]
+    """
+    parts_table = connection.ops.quote_name(Parts._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT upper("ERP_id"), array_agg(id ORDER BY id)
+            FROM {parts_table}
+            WHERE NOT archived
+            GROUP BY 1
+            HAVING COUNT(*) > 1
+            ORDER BY 1
+            LIMIT %s
+            """,
+            [limit],
+        )
+        return cursor.fetchall()
+
+
+def archive_duplicate_erp_ids(using="default"):
+    """
+    Archives all but the oldest active part of every ERP id that several active parts share.
+
+    Lets `parts_erp_id_unique_active` be created on a database that predates it. Runs before
+    migrations (see `Tracker.signals`), so it is written in SQL against columns that predate the
+    constraint rather than through the current models, and does nothing while the constraint
+    exists. Each archived part gets an "obsolete" archive reason. The WIP summary does not see
+    these writes; run `rebuild_wip_summary` afterwards.
+
+    Returns:
+        list[tuple[str, list[int]]]: Per duplicated ERP id (upper-cased), the ids of the parts
+        that were archived.
+    """
+    db = connections[using]
+    parts_table = Parts._meta.db_table
+    if parts_table not in db.introspection.table_names():
+        return []
+    with db.cursor() as cursor:
+        if "parts_erp_id_unique_active" in db.introspection.get_constraints(cursor, parts_table):
+            return []
+
+    parts_table = db.ops.quote_name(parts_table)
+    reasons_table = db.ops.quote_name(ArchiveReason._meta.db_table)
+    with transaction.atomic(using=using), db.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH ranked AS (
+                SELECT id, upper("ERP_id") AS erp_id, row_number() OVER (PARTITION BY upper("ERP_id") ORDER BY id) AS n
+                FROM {parts_table}
+                WHERE NOT archived
+            )
+            UPDATE {parts_table} p SET archived = true
+            FROM ranked
+            WHERE p.id = ranked.id AND ranked.n > 1
+            RETURNING ranked.erp_id, p.id
+            """
+        )
+        duplicates = {}
+        for erp_id_upper, pk in sorted(cursor.fetchall()):
+            duplicates.setdefault(erp_id_upper, []).append(pk)
+        if duplicates:
+            cursor.execute(
+                f"""
+                INSERT INTO {reasons_table} (reason, notes, content_type_id, object_id, archived_at)
+                SELECT 'obsolete', %s, ct.id, p.id, now()
+                FROM django_content_type ct, unnest(%s::integer[]) AS p(id)
+                WHERE ct.app_label = %s AND ct.model = %s
+                ON CONFLICT (content_type_id, object_id)
+                DO UPDATE SET reason = EXCLUDED.reason, notes = EXCLUDED.notes, archived_at = EXCLUDED.archived_at
+                """,
+                [
+                    "Duplicate ERP id; the oldest active part keeps it",
+                    [pk for pks in duplicates.values() for pk in pks],
+                    Parts._meta.app_label,
+                    Parts._meta.model_name,
+                ],
+            )
+    return list(duplicates.items())
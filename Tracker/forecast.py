@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Avg
+from django.utils import timezone
+
+from Tracker.models import Orders, Parts, StepDurationRollup, Steps
+from Tracker.transitions import after_bulk_write
+
+HISTORY = timedelta(days=90)
+"""How far back daily dwell-time rollups are read to estimate each step's duration."""
+
+DEFAULT_STEP_DURATION = timedelta(hours=8)
+"""Duration assumed for steps with neither dwell history nor an `expected_duration`."""
+
+DEFAULT_SPREAD = 0.5
+"""Log-normal sigma used for simulation when a step's p95 is unknown."""
+
+Z95 = 1.6449
+"""Standard normal quantile of 0.95, to fit a log-normal to a step's p50 and p95."""
+
+CLOSED_STATUSES = (Orders.Status.COMPLETED, Orders.Status.CANCELLED)
+
+
+def step_durations(step_ids, since):
+    """
+    Estimates the median and spread of each step's dwell time.
+
+    Daily `StepDurationRollup` rows since `since` are combined per step (mean of the rows'
+    p50/p95); steps without history fall back to `Steps.expected_duration`
+    and then `DEFAULT_STEP_DURATION`.
+
+    Returns:
+        dict[int, tuple[float, float]]: step id -> (median seconds, log-normal sigma)
+    """
+    history = {
+        row["step_id"]: row
+        for row in StepDurationRollup.objects.filter(
+            period=StepDurationRollup.Period.DAY, bucket__gte=since, step_id__in=step_ids
+        )
+        .values("step_id")
+        .annotate(p50=Avg("p50_seconds"), p95=Avg("p95_seconds"))
+        .order_by()
+    }
+    expected = dict(Steps.objects.filter(pk__in=step_ids).values_list("pk", "expected_duration"))
+
+    durations = {}
+    for step_id in step_ids:
+        row = history.get(step_id)
+        if row and row["p50"]:
+            median = max(row["p50"], 1.0)
+            spread = np.log(max(row["p95"], median) / median) / Z95 if row["p95"] else DEFAULT_SPREAD
+        else:
+            fallback = expected.get(step_id) or DEFAULT_STEP_DURATION
+            median, spread = fallback.total_seconds(), DEFAULT_SPREAD
+        durations[step_id] = (median, spread)
+    return durations
+
+
+def _remaining_after(process_ids, numbers, durations):
+    """
+    For step arrays of one or more processes, sums the duration of each step and every later step of its process.
+
+    `durations` is `(n_steps,)` or `(samples, n_steps)`; the sum runs along the last axis with one
+    cumulative sum over steps sorted by process and descending step number.
+    """
+    order = np.lexsort((-numbers, process_ids))
+    totals = np.cumsum(durations[..., order], axis=-1)
+    sorted_processes = process_ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_processes[1:] != sorted_processes[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(order)]))
+    before = np.where(starts > 0, np.take(totals, starts - 1, axis=-1), 0.0)
+    remaining = np.empty_like(totals)
+    remaining[..., order] = totals - np.take(before, group, axis=-1)
+    return remaining
+
+
+def forecast_orders(order_ids=None, simulations=0, percentile=50, now=None, seed=None):
+    """
+    Projects a completion date for every open order with active parts, in one vectorized pass.
+
+    Active parts are loaded as `(order, step)` pairs. Each step's remaining time is its own
+    duration plus that of every later step in its process, and an order is done when its slowest
+    part is. The current step is counted in full, as the time a part has already spent there is
+    not tracked on the part.
+
+    With `simulations`, step durations are drawn from log-normals fitted to each step's p50/p95
+    and the order's `percentile` of simulated completion times is used; otherwise the p50 sum.
+
+    Returns:
+        dict[int, date]: order id -> estimated completion date (local time).
+    """
+    now = now or timezone.now()
+    parts = Parts.objects.filter(archived=False, order__archived=False, step__isnull=False).exclude(
+        status=Parts.Status.COMPLETED
+    ).exclude(order__status__in=CLOSED_STATUSES)
+    if order_ids is not None:
+        parts = parts.filter(order_id__in=order_ids)
+    pairs = np.array(
+        list(parts.values_list("order_id", "step_id").distinct().order_by("order_id")), dtype=np.int64
+    ).reshape(-1, 2)
+    if not len(pairs):
+        return {}
+
+    process_ids = set(
+        Steps.objects.filter(pk__in=np.unique(pairs[:, 1]).tolist()).values_list("process_id", flat=True)
+    )
+    steps = np.array(
+        list(Steps.objects.filter(process_id__in=process_ids).values_list("pk", "process_id", "step")), dtype=np.int64
+    )
+    durations = step_durations(steps[:, 0].tolist(), now - HISTORY)
+    median = np.array([durations[pk][0] for pk in steps[:, 0]])
+    spread = np.array([durations[pk][1] for pk in steps[:, 0]])
+
+    if simulations:
+        rng = np.random.default_rng(seed)
+        samples = rng.lognormal(np.log(median), spread, size=(simulations, len(median)))
+        remaining = _remaining_after(steps[:, 1], steps[:, 2], samples)
+    else:
+        remaining = _remaining_after(steps[:, 1], steps[:, 2], median)
+
+    by_pk = np.argsort(steps[:, 0])
+    step_index = by_pk[np.searchsorted(steps[:, 0], pairs[:, 1], sorter=by_pk)]
+    pair_remaining = np.take(remaining, step_index, axis=-1)
+
+    orders, starts = np.unique(pairs[:, 0], return_index=True)
+    order_remaining = np.maximum.reduceat(pair_remaining, starts, axis=-1)
+    if simulations:
+        order_remaining = np.percentile(order_remaining, percentile, axis=0)
+
+    return {
+        int(order_id): timezone.localdate(now + timedelta(seconds=float(seconds)))
+        for order_id, seconds in zip(orders, order_remaining)
+    }
+
+
+def update_estimates(order_ids=None, simulations=0, percentile=50, seed=None, batch_size=1000):
+    """
+    Forecasts open orders and writes changed `Orders.estimated_completion` values with `bulk_update`.
+
+    Returns:
+        int: Number of orders whose estimate changed.
+    """
+    estimates = forecast_orders(order_ids, simulations=simulations, percentile=percentile, seed=seed)
+    current = Orders.objects.filter(pk__in=list(estimates)).values_list("pk", "estimated_completion")
+    changed = [
+        Orders(pk=pk, estimated_completion=estimates[pk])
+        for pk, estimated in current.iterator(chunk_size=batch_size)
+        if estimated != estimates[pk]
+    ]
+    if changed:
+        with transaction.atomic():
+            Orders.objects.bulk_update(changed, ["estimated_completion"], batch_size=batch_size)
+            transaction.on_commit(lambda: after_bulk_write(Orders))
+    return len(changed)
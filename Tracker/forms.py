@@ -78,7 +78,9 @@ class PartTypeForm(forms.ModelForm):
 class LineItemForm(forms.Form):
     quantity = forms.IntegerField(min_value=1)
     part_type = forms.ModelChoiceField(queryset=PartTypes.objects.all(), required=False)
-    enumeration_start = forms.IntegerField(min_value=0)
+    enumeration_start = forms.IntegerField(
+        min_value=0, required=False, widget=forms.NumberInput(attrs={"placeholder": "Auto"})
+    )
     process = forms.ModelChoiceField(queryset=Processes.objects.all(), required=False)
 
 
@@ -329,6 +329,9 @@ class GenericViewEntry(DetailView):
 
         fields = []
         for field in obj._meta.fields:
+            if field.get_internal_type() == "SearchVectorField":
+                continue  # Internal search index column, not meaningful to display
+
             label = field.verbose_name.title()
             raw_value = getattr(obj, field.name)
 
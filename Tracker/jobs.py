@@ -0,0 +1,239 @@
+import io
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from Tracker.models import Job, Orders, PartTypes, Processes, User
+from Tracker.part_generation import generate_parts
+
+JOBS = {}
+"""Job functions by name; see `register`."""
+
+STALE_AFTER = timedelta(minutes=15)
+"""A running job whose heartbeat is older than this is assumed to have lost its worker."""
+
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+"""How often a worker refreshes the heartbeat of the job it runs; must be well below `STALE_AFTER`."""
+
+MAX_ATTEMPTS = 3
+"""Abandoned jobs are requeued until they have been started this many times, then failed."""
+
+JOB_REPORT_SKIPPED = 100
+"""Skipped parts listed in a part generation job's stored result; the rest are only counted."""
+
+
+def register(name):
+    """
+    Registers a function as job `name`.
+
+    The function is called with a `JobProgress` followed by the job's params as keyword
+    arguments, and its return value (which must be JSON serializable) is stored as the result.
+
+    Example:
+        @register("rebuild_wip_summary")
+        def rebuild(progress):
+            return {"rows": rebuild_wip_summary()}
+    """
+    def decorator(func):
+        JOBS[name] = func
+        return func
+    return decorator
+
+
+class JobProgress:
+    """
+    Progress reporter handed to job functions: `progress(done, total)`.
+
+    Each report is one UPDATE that also refreshes the job's heartbeat. Reports made inside a
+    transaction only become visible when it commits, so report between transactions.
+    """
+
+    def __init__(self, job):
+        self.job = job
+
+    def __call__(self, done, total=None):
+        fields = {"progress": done, "heartbeat_at": timezone.now()}
+        if total is not None:
+            fields["total"] = total
+        Job.objects.filter(pk=self.job.pk).update(**fields)
+
+
+def enqueue(name, params=None, user=None, total=None):
+    """
+    Queues job `name` with keyword arguments `params` (JSON serializable).
+
+    Call it inside the transaction that creates the job's inputs, if any; workers can only see
+    the job once that transaction commits.
+
+    Raises:
+        ValueError: If no job is registered under `name`.
+    """
+    if name not in JOBS:
+        raise ValueError(f"Unknown job: {name}")
+    return Job.objects.create(name=name, params=params or {}, created_by=user, total=total)
+
+
+def claim_job():
+    """
+    Claims the oldest queued job and marks it running, or returns None if the queue is empty.
+
+    Uses `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent workers claim different jobs
+    without waiting on each other; the row lock is held only until the claim commits.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.Status.QUEUED)
+            .order_by("created_at", "pk")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING, started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+        )
+    job.refresh_from_db()
+    return job
+
+
+@contextmanager
+def heartbeat(job):
+    """
+    Refreshes a running job's heartbeat from a background thread until the block exits.
+
+    Keeps jobs that report no progress, like long management commands, from being taken for
+    abandoned by `requeue_stale` and started a second time while they still run.
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT_INTERVAL.total_seconds()):
+                Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """Runs a claimed job and records its result, or the traceback if it raised. Returns the updated job."""
+    try:
+        func = JOBS.get(job.name)
+        if func is None:
+            raise ValueError(f"Unknown job: {job.name}")
+        with heartbeat(job):
+            result = func(JobProgress(job), **job.params)
+    except Exception:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.FAILED, error=traceback.format_exc(), finished_at=timezone.now()
+        )
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.SUCCEEDED, result=result, finished_at=timezone.now()
+        )
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale(now=None):
+    """
+    Requeues running jobs whose heartbeat is older than `STALE_AFTER`, e.g. after a worker was killed.
+
+    Workers refresh the heartbeat of the job they run every `HEARTBEAT_INTERVAL`, so only jobs
+    whose worker is gone go stale, however long they take.
+
+    Jobs already started `MAX_ATTEMPTS` times are failed instead. Jobs should be safe to run
+    again from the start; the built-in ones are.
+
+    Returns:
+        int: Number of jobs requeued or failed.
+    """
+    cutoff = (now or timezone.now()) - STALE_AFTER
+    stale = Job.objects.filter(status=Job.Status.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=Job.Status.FAILED, error="Worker stopped responding.", finished_at=timezone.now()
+    )
+    return failed + stale.update(status=Job.Status.QUEUED)
+
+
+def run_worker(poll_interval=1.0, max_jobs=None, burst=False, on_finish=None):
+    """
+    Claims and runs jobs until stopped.
+
+    Args:
+        poll_interval (float): Seconds to sleep when the queue is empty.
+        max_jobs (int): Stop after running this many jobs.
+        burst (bool): Stop as soon as the queue is empty instead of polling.
+        on_finish (callable): Called with each finished job, e.g. to print it.
+
+    Returns:
+        int: Number of jobs run.
+    """
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        job = claim_job()
+        if job is None:
+            if burst:
+                break
+            requeue_stale()
+            time.sleep(poll_interval)
+            continue
+        job = run_job(job)
+        ran += 1
+        if on_finish:
+            on_finish(job)
+    return ran
+
+
+# Built-in jobs ---------------------------------------------------------------------------------
+
+@register("generate_parts")
+def generate_parts_job(progress, order_id, line_items, user_id=None):
+    """
+    Generates an order's parts in the background; see `generate_parts`.
+
+    `line_items` hold ids: `{"part_type_id", "process_id", "quantity", "enumeration_start"}`.
+    Batches commit as they are written, and ERP ids created by an earlier attempt are skipped as
+    taken, so a requeued job resumes rather than duplicating parts.
+    """
+    order = Orders.objects.get(pk=order_id)
+    part_types = PartTypes.objects.in_bulk({item["part_type_id"] for item in line_items})
+    processes = Processes.objects.in_bulk({item["process_id"] for item in line_items})
+    items = [
+        {
+            "part_type": part_types.get(item["part_type_id"]),
+            "process": processes.get(item["process_id"]),
+            "quantity": item["quantity"],
+            "enumeration_start": item.get("enumeration_start"),
+        }
+        for item in line_items
+    ]
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    report = generate_parts(order, items, user=user, progress=progress, atomic=False)
+    report.pop("part_ids")
+    report["skipped_count"] = len(report["skipped"])
+    report["skipped"] = report["skipped"][:JOB_REPORT_SKIPPED]
+    return report
+
+
+@register("command")
+def command_job(progress, command, args=(), options=None):
+    """Runs a management command, so any command can be queued (see `manage.py enqueue_command`)."""
+    out = io.StringIO()
+    call_command(command, *args, stdout=out, stderr=out, **(options or {}))
+    return {"output": out.getvalue()[-10000:]}
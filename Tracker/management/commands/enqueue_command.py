@@ -0,0 +1,21 @@
+import argparse
+
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+
+from Tracker.jobs import enqueue
+
+
+class Command(BaseCommand):
+    help = "Queues a management command to run on the background job workers, e.g. enqueue_command forecast_orders --simulations 500"
+
+    def add_arguments(self, parser):
+        parser.add_argument("command_name", help="The management command to run")
+        parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed to the command")
+
+    def handle(self, *args, **options):
+        name = options["command_name"]
+        if name not in get_commands():
+            raise CommandError(f"Unknown command: {name}")
+        job = enqueue("command", {"command": name, "args": list(options["args"])})
+        self.stdout.write(self.style.SUCCESS(f"Queued {job}"))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Tracker.analytics_export import DATASETS, export_dataset
+
+
+class Command(BaseCommand):
+    help = ("Appends parts, transitions, error reports and equipment usage added or changed since the last run "
+            "to Parquet datasets partitioned by date and part type")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dataset",
+            choices=list(DATASETS) + ["all"],
+            default="all",
+            help="Which dataset to export (default: all)",
+        )
+        parser.add_argument(
+            "--output",
+            default=settings.ANALYTICS_EXPORT_DIR,
+            help="Directory holding the datasets (default: ANALYTICS_EXPORT_DIR)",
+        )
+        parser.add_argument("--full", action="store_true", help="Ignore the watermark and export every row again")
+
+    def handle(self, *args, **options):
+        names = list(DATASETS) if options["dataset"] == "all" else [options["dataset"]]
+        for name in names:
+            exported = export_dataset(name, options["output"], full=options["full"])
+            self.stdout.write(self.style.SUCCESS(f"{name}: {exported} rows"))
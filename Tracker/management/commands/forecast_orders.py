@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Tracker.forecast import update_estimates
+
+
+class Command(BaseCommand):
+    help = "Re-forecasts estimated completion dates for all open orders from step dwell-time history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--simulations",
+            type=int,
+            default=0,
+            help="Monte Carlo samples per step (default: 0, use median step durations)",
+        )
+        parser.add_argument(
+            "--percentile",
+            type=float,
+            default=50,
+            help="Percentile of simulated completion times to store (default: 50)",
+        )
+        parser.add_argument("--seed", type=int, help="Random seed, for reproducible simulations")
+
+    def handle(self, *args, **options):
+        if options["simulations"] < 0 or not 0 <= options["percentile"] <= 100:
+            raise CommandError("--simulations must be >= 0 and --percentile between 0 and 100.")
+        changed = update_estimates(
+            simulations=options["simulations"], percentile=options["percentile"], seed=options["seed"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated {changed} order estimates"))
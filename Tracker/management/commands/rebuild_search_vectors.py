@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+
+from Tracker.tables.search import refresh_search_vectors, searchable_models
+
+
+class Command(BaseCommand):
+    help = "Recomputes the full-text search vectors used by table search"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Rows updated per statement (default: 10000)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write("Full-text search is PostgreSQL-only; nothing to rebuild.")
+            return
+
+        batch_size = options["batch_size"]
+        for model in searchable_models():
+            bounds = model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+            if bounds["low"] is None:
+                continue
+
+            updated = 0
+            for start in range(bounds["low"], bounds["high"] + 1, batch_size):
+                updated += refresh_search_vectors(
+                    model.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                )
+            self.stdout.write(self.style.SUCCESS(f"{model._meta.label}: {updated} search vectors rebuilt"))
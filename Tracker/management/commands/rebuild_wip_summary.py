@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from Tracker.wip import rebuild_wip_summary
+
+
+class Command(BaseCommand):
+    help = "Recomputes the WIP summary (active part counts per order, step and status) from Parts"
+
+    def handle(self, *args, **options):
+        rows = rebuild_wip_summary()
+        self.stdout.write(self.style.SUCCESS(f"WIP summary rebuilt: {rows} rows"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from Tracker.analytics import refresh_pending
+from Tracker.models import StepDurationRollup
+
+
+class Command(BaseCommand):
+    help = "Refreshes the hourly and daily step dwell-time rollups for buckets completed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=StepDurationRollup.Period.values + ["all"],
+            default="all",
+            help="Which rollups to refresh (default: all)",
+        )
+        parser.add_argument(
+            "--since",
+            help="Recompute from this ISO 8601 time instead of the stored watermark (e.g. after late uploads)",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_datetime(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 datetime.")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        periods = StepDurationRollup.Period.values if options["period"] == "all" else [options["period"]]
+        for period in periods:
+            start, end, written = refresh_pending(period, since=since)
+            self.stdout.write(self.style.SUCCESS(f"{period}: {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M}, {written} rows"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Tracker.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs; start as many workers as needed, they never run the same job twice"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty (default: 1)")
+        parser.add_argument("--max-jobs", type=int, help="Exit after running this many jobs")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        def report(job):
+            style = self.style.SUCCESS if job.status == job.Status.SUCCEEDED else self.style.ERROR
+            self.stdout.write(style(f"{job} in {(job.finished_at - job.started_at).total_seconds():.1f}s"))
+
+        ran = run_worker(
+            poll_interval=options["poll"], max_jobs=options["max_jobs"], burst=options["burst"], on_finish=report
+        )
+        self.stdout.write(f"Ran {ran} jobs")
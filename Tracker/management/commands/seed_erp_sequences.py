@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Tracker.erp_ids import duplicate_erp_ids, seed_erp_sequences
+
+
+class Command(BaseCommand):
+    help = ("Advances the ERP id sequences past every serial used by existing parts and lists active "
+            "duplicate ERP ids that block the uniqueness constraint")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check-only", action="store_true", help="Only list duplicates, do not touch the sequences")
+
+    def handle(self, *args, **options):
+        if not options["check_only"]:
+            self.stdout.write(self.style.SUCCESS(f"Seeded {seed_erp_sequences()} prefixes"))
+
+        duplicates = duplicate_erp_ids()
+        for erp_id, part_ids in duplicates:
+            self.stdout.write(self.style.WARNING(f"{erp_id}: active parts {', '.join(map(str, part_ids))}"))
+        if duplicates:
+            self.stdout.write(self.style.ERROR(
+                f"{len(duplicates)} duplicate ERP ids (first 100 shown); rename or archive them, or "
+                f"migrate archives all but the oldest part of each before creating parts_erp_id_unique_active"
+            ))
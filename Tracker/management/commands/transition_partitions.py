@@ -0,0 +1,69 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from Tracker import transition_log
+
+
+def _months_ago(months, today=None):
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintains the monthly partitions of the step transition log: creates upcoming months and "
+        "applies the cold-storage and retention policy. Run daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="One-time: rebuild the existing table as a partitioned table (takes an exclusive lock)",
+        )
+        parser.add_argument("--months-ahead", type=int, default=3, help="Future months to create (default: 3)")
+        parser.add_argument("--cold-tablespace", help="Tablespace that partitions older than --cold-after move to")
+        parser.add_argument("--cold-after", type=int, default=6, help="Months before a partition goes cold (default: 6)")
+        parser.add_argument(
+            "--retain-months",
+            type=int,
+            help="Roll up and drop partitions older than this many months (default: keep everything)",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only list partitions and what would change")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Transition log partitioning requires PostgreSQL.")
+
+        if options["convert"]:
+            if transition_log.is_partitioned():
+                raise CommandError("The transition log is already partitioned.")
+            if options["dry_run"]:
+                self.stdout.write("Would convert the transition log to monthly partitions.")
+                return
+            copied = transition_log.convert_to_partitioned(options["months_ahead"])
+            self.stdout.write(self.style.SUCCESS(f"Converted the transition log; {copied} rows copied."))
+        elif not transition_log.is_partitioned():
+            raise CommandError("The transition log is not partitioned yet; run with --convert first.")
+
+        if options["dry_run"]:
+            for month, name in transition_log.partitions():
+                self.stdout.write(f"{month:%Y-%m}  {name}")
+            return
+
+        created = transition_log.ensure_partitions(options["months_ahead"])
+        self.stdout.write(f"Partitions through {created[-1]} are in place.")
+
+        if options["cold_tablespace"]:
+            moved = transition_log.move_partitions(_months_ago(options["cold_after"]), options["cold_tablespace"])
+            for name in moved:
+                self.stdout.write(f"Moved {name} to {options['cold_tablespace']}")
+
+        if options["retain_months"] is not None:
+            if options["retain_months"] < 1:
+                raise CommandError("--retain-months must be at least 1.")
+            for name in transition_log.expire_partitions(_months_ago(options["retain_months"])):
+                self.stdout.write(self.style.WARNING(f"Rolled up and dropped {name}"))
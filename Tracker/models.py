@@ -3,7 +3,10 @@ from datetime import date
 
 import requests
 from django.db import models
+from django.db.models.functions import Coalesce, Upper
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import BrinIndex, GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
@@ -158,6 +161,9 @@ class Documents(models.Model):
         verbose_name_plural = 'Documents'
         verbose_name = 'Document'
         db_table = 'tracker_partdocs'
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'], name='documents_object'),
+        ]
 
     def __str__(self):
         """
@@ -301,6 +307,9 @@ class Processes(models.Model):
         ]
         Steps.objects.bulk_create(steps)
 
+        from Tracker.routing import invalidate_routing
+        invalidate_routing()
+
     def save(self, *args, **kwargs):
         """
         Overrides save to enforce versioning by creating a new DB entry on changes.
@@ -442,8 +451,16 @@ class Orders(models.Model):
     hubspot_deal_id = models.CharField(max_length=60, unique=True, null=True, blank=True)
     last_synced_hubspot_stage = models.CharField(max_length=100, null=True, blank=True)
 
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    """Full-text search document for table search, maintained by `Tracker.tables.search`."""
+
     class Meta:
         verbose_name = 'Order'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='orders_search_vector_gin'),
+            models.Index(fields=['customer', '-updated_at'], condition=models.Q(archived=False),
+                         name='orders_customer_active'),
+        ]
 
     def delete(self, *args, **kwargs):
         """
@@ -599,6 +616,19 @@ class Parts(models.Model):
     class Meta:
         verbose_name_plural = 'Parts'
         verbose_name = 'Part'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='parts_search_vector_gin'),
+            models.Index(OpClass(Upper('ERP_id'), name='text_pattern_ops'), name='parts_erp_id_prefix'),
+            models.Index(fields=['order', 'ERP_id'], name='parts_order_erp_id'),
+            models.Index(fields=['order', 'id'], condition=models.Q(archived=False), name='parts_order_active'),
+            models.Index(fields=['id'], condition=models.Q(archived=False), name='parts_active'),
+            models.Index(fields=['updated_at', 'id'], name='parts_updated_at'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                Upper('ERP_id'), condition=models.Q(archived=False), name='parts_erp_id_unique_active'
+            ),
+        ]
 
     class Status(models.TextChoices):
         PENDING = 'PENDING', "Pending"
@@ -608,7 +638,11 @@ class Parts(models.Model):
         CANCELLED = 'CANCELLED', "Cancelled"
 
     ERP_id = models.CharField(max_length=50)
-    """External ERP identifier used to reference this part in outside systems."""
+    """
+    External ERP identifier used to reference this part in outside systems.
+
+    Unique (case-insensitively) among active parts; generated ids come from `ErpIdSequence`.
+    """
 
     documents = GenericRelation('Documents')
 
@@ -658,6 +692,9 @@ class Parts(models.Model):
     )
     """Optional reference to the internal Work Order this part is attached to."""
 
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+    """Full-text search document for table search, maintained by `Tracker.tables.search`."""
+
     def delete(self, *args, **kwargs):
         """
         Overrides default delete behavior to perform a soft archive instead.
@@ -671,31 +708,42 @@ class Parts(models.Model):
         """
         Progresses the part to the next step in its associated process.
 
-        Updates the step pointer and status if completed. Raises an error if the
+        Updates the step pointer and status if completed. The next step is resolved from the
+        cached process routing (`Tracker.routing`) rather than queried. Raises an error if the
         current or next step is undefined.
 
         Returns:
             str: "completed" if final step reached, "advanced" otherwise.
         """
-        if not self.step or not self.part_type:
+        from Tracker.routing import next_routing_step, routing_step
+
+        current = routing_step(self.step_id) if self.step_id else None
+        if current is None or not self.part_type_id:
             raise ValueError("Current step or part type is missing.")
 
-        if self.step.is_last_step:
+        if current["is_last_step"]:
             self.status = self.Status.COMPLETED
             self.save()
             return "completed"
 
-        try:
-            next_step = Steps.objects.get(
-                part_type=self.part_type,
-                process=self.step.process,
-                step=self.step.step + 1
-            )
-            self.step = next_step
-            self.save()
-            return "advanced"
-        except Steps.DoesNotExist:
+        next_step = next_routing_step(self.step_id, part_type_id=self.part_type_id)
+        if next_step is None:
             raise ValueError("Next step not found for this part.")
+        self.step_id = next_step["id"]
+        self.save()
+        return "advanced"
+
+    def advance_step(self, expected_step_id=None, operator=None):
+        """
+        Progresses the part like `increment_step()`, but only if it is still on `expected_step_id`.
+
+        Uses a conditional UPDATE instead of a read-modify-save, so parallel stations passing the
+        same part cannot both advance it; the losing station gets a "conflict" result. See
+        `Tracker.transitions.advance_part` for the returned dict.
+        """
+        from Tracker.transitions import advance_part
+
+        return advance_part(self, expected_step_id=expected_step_id, operator=operator)
 
     def archive(self, reason="user_error", user=None, notes=""):
         """
@@ -912,8 +960,8 @@ class EquipmentUsage(models.Model):
     )
     """Optional link to an error report generated during or after this usage event."""
 
-    used_at = models.DateTimeField(auto_now_add=True)
-    """Timestamp indicating when the equipment was used."""
+    used_at = models.DateTimeField(default=timezone.now)
+    """Timestamp indicating when the equipment was used; set from the station's clock for offline scans."""
 
     operator = models.ForeignKey(
         User,
@@ -1030,6 +1078,10 @@ class StepTransitionLog(models.Model):
     This model enables historical tracking of part progression for auditing, traceability,
     and metrics collection. Each log entry captures the part, the step it moved to,
     the operator who performed the transition, and the timestamp of the event.
+
+    The log is append-only. On PostgreSQL its table can be range-partitioned by month on
+    `timestamp` (see `Tracker.transition_log` and `manage.py transition_partitions`); time-bounded
+    reports should go through `Tracker.transition_log` so only the relevant months are scanned.
     """
 
     step = models.ForeignKey(
@@ -1060,18 +1112,381 @@ class StepTransitionLog(models.Model):
     """ForeignKey to the `User` who executed the step transition."""
 
     timestamp = models.DateTimeField(
-        auto_now_add=True,
-        help_text="Timestamp automatically recorded at the time of transition."
+        default=timezone.now,
+        help_text="Timestamp of the transition; defaults to the time it was recorded."
     )
-    """Datetime when the step transition occurred (auto-generated)."""
+    """Datetime when the step transition occurred (the station's scan time for offline uploads)."""
 
     class Meta:
         verbose_name_plural = 'Step Transition Log'
         verbose_name = 'Step Transition Log'
+        indexes = [
+            models.Index(fields=['part', 'timestamp'], name='transition_part_timestamp'),
+            BrinIndex(fields=['timestamp'], name='transition_timestamp_brin'),
+        ]
 
     def __str__(self):
         """
         Return a human-readable summary of the transition event.
+
+        The step number comes from the cached process routing rather than loading `step`.
         """
-        return f"Step {self.step.step} for {self.part} completed at {self.timestamp}"
+        from Tracker.routing import routing_step
+
+        step = routing_step(self.step_id) if self.step_id else None
+        return f"Step {step['step'] if step else '?'} for {self.part} completed at {self.timestamp}"
+
+
+class StepTransitionDailyCount(models.Model):
+    """
+    Daily transition counts per step and operator, kept for months whose raw log was expired.
+
+    Written by `Tracker.transition_log.expire_partitions` before a month partition of
+    `StepTransitionLog` is dropped, so throughput history outlives the retention window.
+    """
+
+    day = models.DateField()
+    """The (UTC) day the transitions happened."""
+
+    step = models.ForeignKey(
+        Steps,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    """The step the parts transitioned to."""
+
+    operator = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    """The operator who performed the transitions."""
+
+    count = models.IntegerField()
+    """Number of transitions."""
+
+    class Meta:
+        verbose_name_plural = 'Step Transition Daily Counts'
+        verbose_name = 'Step Transition Daily Count'
+        indexes = [
+            models.Index(fields=['day', 'step'], name='transition_daily_day_step'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} step {self.step_id}: {self.count}"
+
 
+class ScanEvent(models.Model):
+    """
+    Records a scan event uploaded by a station, keyed by the station's idempotency key.
+
+    Stations that lose connectivity buffer scans and upload them in batches; replaying a batch
+    returns the stored outcome of each event instead of applying it twice.
+    """
+
+    class Action(models.TextChoices):
+        PASS = 'pass', "Pass"
+        FAIL = 'fail', "Fail"
+        ARCHIVE = 'archive', "Archive"
+
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    """Station-generated key that identifies the scan across retries."""
+
+    erp_id = models.CharField(max_length=50)
+    """The ERP ID that was scanned."""
+
+    action = models.CharField(max_length=10, choices=Action.choices)
+    """What the operator did with the part."""
+
+    part = models.ForeignKey(
+        Parts,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='scan_events'
+    )
+    """The part the ERP ID resolved to, if any."""
+
+    step = models.ForeignKey(
+        Steps,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    """The step the station scanned the part at; passes only apply while the part is still there."""
+
+    operator = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    """The operator who scanned the part."""
+
+    equipment = models.ForeignKey(
+        Equipments,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    """Optional equipment the part was scanned on."""
+
+    scanned_at = models.DateTimeField()
+    """When the scan happened, according to the station's clock."""
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    """When the server received the scan."""
+
+    result = models.CharField(max_length=20)
+    """Outcome of applying the scan, e.g. "advanced", "completed", "failed", "archived" or "rejected"."""
+
+    message = models.TextField(blank=True)
+    """Explanation for rejected scans."""
+
+    class Meta:
+        verbose_name_plural = 'Scan Events'
+        verbose_name = 'Scan Event'
+        indexes = [
+            models.Index(fields=['part', 'scanned_at'], name='scan_event_part_scanned'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.erp_id} at {self.scanned_at} ({self.result})"
+
+
+class WipSummary(models.Model):
+    """
+    Denormalized count of active (non-archived) parts per order, step and status.
+
+    Maintained by `Tracker.wip` from part saves, step transitions and archival in the same
+    transaction as the change, so progress dashboards read a handful of rows instead of
+    aggregating over Parts. Rebuild with `manage.py rebuild_wip_summary`.
+    """
+
+    order = models.ForeignKey(
+        Orders,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='wip_summary'
+    )
+    """The order the counted parts belong to."""
+
+    step = models.ForeignKey(
+        Steps,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='wip_summary'
+    )
+    """The process step the counted parts are on."""
+
+    status = models.CharField(max_length=50, choices=Parts.Status.choices)
+    """The status of the counted parts."""
+
+    count = models.IntegerField(default=0)
+    """Number of active parts with this order, step and status."""
+
+    updated_at = models.DateTimeField(auto_now=True)
+    """When the count last changed."""
+
+    class Meta:
+        verbose_name_plural = 'WIP Summary'
+        verbose_name = 'WIP Summary'
+        constraints = [
+            models.UniqueConstraint(Coalesce('order', 0), Coalesce('step', 0), 'status', name='wip_summary_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} / step {self.step_id} / {self.status}: {self.count}"
+
+
+class StepDurationRollup(models.Model):
+    """
+    Dwell-time statistics of parts at process steps, pre-aggregated per hour or day.
+
+    A row summarizes the dwell times (time from arriving at a step to leaving it) that ended
+    within one bucket, for one combination of process, step, part type, operator and equipment.
+    Built incrementally from `StepTransitionLog` by `Tracker.analytics` so dashboards do not scan the log.
+    """
+
+    class Period(models.TextChoices):
+        HOUR = 'hour', "Hour"
+        DAY = 'day', "Day"
+
+    period = models.CharField(max_length=4, choices=Period.choices)
+    """Bucket size of this row."""
+
+    bucket = models.DateTimeField()
+    """Start of the hour or (UTC) day the dwell times ended in."""
+
+    process = models.ForeignKey(Processes, on_delete=models.SET_NULL, null=True, blank=True)
+    """Process of the step."""
+
+    step = models.ForeignKey(Steps, on_delete=models.SET_NULL, null=True, blank=True)
+    """The step the parts dwelled at."""
+
+    part_type = models.ForeignKey(PartTypes, on_delete=models.SET_NULL, null=True, blank=True)
+    """Part type of the step."""
+
+    operator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    """The operator who passed the parts on from the step."""
+
+    equipment = models.ForeignKey(Equipments, on_delete=models.SET_NULL, null=True, blank=True)
+    """Equipment used on the parts at the step, if recorded."""
+
+    count = models.IntegerField()
+    """Number of dwell times summarized."""
+
+    total_seconds = models.FloatField()
+    """Sum of the dwell times, for weighted averages across rows."""
+
+    p50_seconds = models.FloatField()
+    """Median dwell time."""
+
+    p95_seconds = models.FloatField()
+    """95th percentile dwell time."""
+
+    p99_seconds = models.FloatField()
+    """99th percentile dwell time."""
+
+    class Meta:
+        verbose_name_plural = 'Step Duration Rollups'
+        verbose_name = 'Step Duration Rollup'
+        indexes = [
+            models.Index(fields=['period', 'bucket'], name='duration_rollup_bucket'),
+            models.Index(fields=['period', 'step', 'bucket'], name='duration_rollup_step'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} step {self.step_id}: p50 {self.p50_seconds:.0f}s"
+
+
+class Watermark(models.Model):
+    """
+    Progress marker for incremental jobs: the point in time up to which a job has processed data.
+
+    Used by the analytics rollups and incremental exports to pick up where the last run stopped.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    """Identifies the job, e.g. "step_durations:hour"."""
+
+    value = models.DateTimeField()
+    """Data before this time has been processed."""
+
+    position = models.BigIntegerField(null=True, blank=True)
+    """Id of the last row processed, for jobs that walk a table in id order (alone or as a tie-breaker after `value`)."""
+
+    updated_at = models.DateTimeField(auto_now=True)
+    """When the job last advanced the watermark."""
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, queued by the web app or a command and run by `manage.py run_jobs`.
+
+    Workers claim queued jobs with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of them can
+    share the table without a broker and without running a job twice. See `Tracker.jobs`.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', "Queued"
+        RUNNING = 'RUNNING', "Running"
+        SUCCEEDED = 'SUCCEEDED', "Succeeded"
+        FAILED = 'FAILED', "Failed"
+
+    name = models.CharField(max_length=100)
+    """Registered job function to run, e.g. "generate_parts"."""
+
+    params = models.JSONField(default=dict, blank=True)
+    """Keyword arguments for the job function."""
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.QUEUED)
+    """Where the job is in its lifecycle."""
+
+    progress = models.PositiveIntegerField(default=0)
+    """Units of work done so far, reported by the job."""
+
+    total = models.PositiveIntegerField(null=True, blank=True)
+    """Units of work in the job, if known."""
+
+    result = models.JSONField(null=True, blank=True)
+    """What the job function returned."""
+
+    error = models.TextField(blank=True)
+    """Traceback of a failed job."""
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    """How many times a worker has started the job."""
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    """The user who queued the job, if any."""
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    """When the job was queued."""
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    """When a worker last started the job."""
+
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    """When the running job last reported progress; stale heartbeats mark abandoned jobs."""
+
+    finished_at = models.DateTimeField(null=True, blank=True)
+    """When the job succeeded or failed."""
+
+    class Meta:
+        verbose_name_plural = 'Jobs'
+        verbose_name = 'Job'
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(status='QUEUED'), name='job_queued'),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED)
+
+    @property
+    def percent(self):
+        """Progress as a whole percentage, or None while the total is unknown."""
+        if not self.total:
+            return None
+        return min(100, self.progress * 100 // self.total)
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class ErpIdSequence(models.Model):
+    """
+    Next free ERP id serial per prefix, so generated part ids never collide across orders.
+
+    Serials are reserved in contiguous blocks by `Tracker.erp_ids.allocate_erp_ids`.
+    """
+
+    prefix = models.CharField(max_length=50, unique=True)
+    """Upper-cased ERP id prefix, e.g. "DI" for ids like "DI-1042"."""
+
+    next_value = models.BigIntegerField()
+    """The next serial to hand out."""
+
+    updated_at = models.DateTimeField(auto_now=True)
+    """When a block was last reserved."""
+
+    class Meta:
+        verbose_name_plural = 'ERP ID Sequences'
+        verbose_name = 'ERP ID Sequence'
+
+    def __str__(self):
+        return f"{self.prefix}: next {self.next_value}"
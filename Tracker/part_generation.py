@@ -0,0 +1,206 @@
+from collections import Counter
+from contextlib import nullcontext
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from Tracker.erp_ids import allocate_erp_ids, erp_id, erp_prefix, reserve_through
+from Tracker.models import Parts, Steps
+from Tracker.tables.search import refresh_search_vectors
+from Tracker.transitions import after_bulk_write
+from Tracker.wip import apply_wip_deltas
+
+GENERATE_BATCH_SIZE = 2000
+"""Rows per `bulk_create` and per ERP id collision query."""
+
+
+def line_item_erp_ids(part_type, quantity, enumeration_start):
+    """Returns the ERP ids a line item generates: `{ID_prefix}-{n}` for `quantity` consecutive numbers."""
+    prefix = erp_prefix(part_type)
+    return [erp_id(prefix, enumeration_start + i) for i in range(quantity)]
+
+
+def number_line_items(line_items):
+    """
+    Reserves serials for line items without an `enumeration_start` and fills it in.
+
+    Call before queueing generation, so a job that is retried numbers its parts the same way.
+    """
+    for item in line_items:
+        if item.get("enumeration_start") is None:
+            item["enumeration_start"] = allocate_erp_ids(erp_prefix(item["part_type"]), item["quantity"])
+    return line_items
+
+
+def existing_erp_ids(erp_ids):
+    """
+    Returns which of `erp_ids` are already used by active parts, compared case-insensitively like scans are.
+
+    Looks them up in batches of `GENERATE_BATCH_SIZE` through the `parts_erp_id_prefix` expression index.
+
+    Returns:
+        set[str]: Upper-cased ERP ids that are taken.
+    """
+    wanted = sorted({value.upper() for value in erp_ids})
+    taken = set()
+    for i in range(0, len(wanted), GENERATE_BATCH_SIZE):
+        taken.update(
+            Parts.objects.annotate(erp_id_upper=Upper("ERP_id"))
+            .filter(erp_id_upper__in=wanted[i:i + GENERATE_BATCH_SIZE], archived=False)
+            .values_list("erp_id_upper", flat=True)
+        )
+    return taken
+
+
+def _first_steps(line_items):
+    """Looks up step 1 of every line item's process in one query, preferring the step for the item's part type."""
+    process_ids = {item["process"].pk for item in line_items}
+    first_steps = {}
+    for step in Steps.objects.filter(process_id__in=process_ids, step=1).order_by("pk"):
+        first_steps.setdefault((step.process_id, step.part_type_id), step)
+        first_steps.setdefault((step.process_id, None), step)
+    return first_steps
+
+
+def generate_parts(order, line_items, user=None, progress=None, atomic=True):
+    """
+    Creates the parts for an order's line items with set-based writes.
+
+    Line items without an `enumeration_start` are numbered from their prefix's `ErpIdSequence`,
+    which cannot collide. Hand-numbered ids are checked against active parts (and the other ids
+    in the request) before anything is written; colliding ids are skipped, not overwritten, and
+    the sequence is moved past them; ids another request takes between that check and the
+    insert are skipped the same way when the insert hits `parts_erp_id_unique_active`. The
+    remaining parts are inserted in batches of `GENERATE_BATCH_SIZE`, each with one
+    `bulk_create`, one bulk insert of audit entries (one per part) and one update of search
+    vectors, WIP counts and table caches.
+
+    Args:
+        order (Orders): The order the parts belong to.
+        line_items (list[dict]): `{"part_type", "process", "quantity", "enumeration_start"}`
+            per line item, e.g. `LineItemForm.cleaned_data`. Items missing a part type, process
+            or quantity are ignored; `enumeration_start` may be None.
+        user (User): Optional actor for the audit entries.
+        progress (callable): Called as `progress(created, total)` after each batch.
+        atomic (bool): Write every batch in one transaction. Background jobs pass False so
+            each batch commits, and progress reports are visible, as it is written.
+
+    Returns:
+        dict: `{"created": int, "part_ids": list[int], "skipped": list[dict]}`; each skipped
+        entry is `{"erp_id", "reason"}`, or `{"part_type", "process", "reason"}` for a whole
+        line item whose process has no first step.
+
+    Example:
+        report = generate_parts(order, [form.cleaned_data for form in lineitem_formset])
+    """
+    line_items = [
+        item for item in line_items
+        if item.get("quantity") and item.get("part_type") and item.get("process")
+    ]
+    report = {"created": 0, "part_ids": [], "skipped": []}
+    if not line_items:
+        return report
+
+    first_steps = _first_steps(line_items)
+    planned = []
+    for item in line_items:
+        part_type, process = item["part_type"], item["process"]
+        step = first_steps.get((process.pk, part_type.pk)) or first_steps.get((process.pk, None))
+        if step is None:
+            report["skipped"].append({
+                "part_type": str(part_type), "process": str(process), "reason": "process has no step 1",
+            })
+            continue
+        start = item.get("enumeration_start")
+        checked = start is not None
+        if checked:
+            reserve_through(erp_prefix(part_type), start + item["quantity"] - 1)
+        else:
+            start = allocate_erp_ids(erp_prefix(part_type), item["quantity"])
+        for part_erp_id in line_item_erp_ids(part_type, item["quantity"], start):
+            planned.append((part_erp_id, part_type, step, checked))
+
+    taken = existing_erp_ids(part_erp_id for part_erp_id, _, _, checked in planned if checked)
+    seen = set()
+    parts = []
+    for part_erp_id, part_type, step, checked in planned:
+        key = part_erp_id.upper()
+        if key in taken:
+            report["skipped"].append({"erp_id": part_erp_id, "reason": "ERP id already in use"})
+        elif checked and key in seen:
+            report["skipped"].append({"erp_id": part_erp_id, "reason": "duplicate in request"})
+        else:
+            seen.add(key)
+            parts.append(Parts(ERP_id=part_erp_id, part_type=part_type, step=step, order=order))
+    if not parts:
+        return report
+
+    created = []
+    with transaction.atomic() if atomic else nullcontext():
+        for i in range(0, len(parts), GENERATE_BATCH_SIZE):
+            created.extend(_insert_batch(order, parts[i:i + GENERATE_BATCH_SIZE], user, report))
+            if progress:
+                progress(len(created), len(parts))
+
+    report["created"] = len(created)
+    report["part_ids"] = created
+    return report
+
+
+def _insert_batch(order, parts, user, report):
+    """
+    Inserts a batch with `insert_parts`, skipping ids that became taken since they were checked.
+
+    A concurrent insert of the same ERP id fails the batch on `parts_erp_id_unique_active`; the
+    batch's savepoint is rolled back, the ids now in use are reported as skipped and the rest is
+    inserted again. Other integrity errors are raised.
+    """
+    while parts:
+        try:
+            with transaction.atomic():
+                return insert_parts(order, parts, user)
+        except IntegrityError:
+            taken = existing_erp_ids(part.ERP_id for part in parts)
+            if not taken:
+                raise
+        report["skipped"].extend(
+            {"erp_id": part.ERP_id, "reason": "ERP id already in use"} for part in parts if part.ERP_id.upper() in taken
+        )
+        parts = [part for part in parts if part.ERP_id.upper() not in taken]
+    return []
+
+
+def insert_parts(order, parts, user):
+    """Inserts one batch of parts with their audit entries, search vectors and WIP counts. Returns their ids."""
+    now = timezone.now()
+    Parts.objects.bulk_create(parts)
+    pks = [part.pk for part in parts]
+    refresh_search_vectors(Parts.objects.filter(pk__in=pks))
+    apply_wip_deltas(Counter((order.pk, part.step_id, part.status) for part in parts))
+
+    content_type = ContentType.objects.get_for_model(Parts)
+    LogEntry.objects.bulk_create([
+        LogEntry(
+            actor=user,
+            action=LogEntry.Action.CREATE,
+            content_type=content_type,
+            object_pk=str(part.pk),
+            object_id=part.pk,
+            object_repr=str(part),
+            timestamp=now,
+            changes={
+                "ERP_id": ["None", part.ERP_id],
+                "order": ["None", str(order.pk)],
+                "part_type": ["None", str(part.part_type_id)],
+                "step": ["None", str(part.step_id)],
+                "status": ["None", part.status],
+            },
+            changes_text="",
+        )
+        for part in parts
+    ])
+    transaction.on_commit(lambda: after_bulk_write(Parts, LogEntry))
+    return pks
@@ -0,0 +1,393 @@
+import csv
+import io
+from collections import defaultdict
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Upper
+from django.utils import timezone
+
+from Tracker.archiving import archive_parts
+from Tracker.erp_ids import reserve_erp_ids
+from Tracker.models import Parts, PartTypes, Steps, StepTransitionLog
+from Tracker.part_generation import existing_erp_ids, insert_parts
+from Tracker.routing import routing_step
+from Tracker.tables.search import refresh_search_vectors
+from Tracker.transitions import after_bulk_write
+from Tracker.wip import apply_wip_deltas, record_part_change
+
+IMPORT_CHUNK = 2000
+"""Changed parts written per `bulk_update` during an import."""
+
+IMPORT_FIELDS = ("part_type_id", "step_id", "status")
+"""CSV columns an import can change, besides the `ERP_id` key column."""
+
+
+DEFAULT_EXPORT_COLUMNS = ("ERP_id", "part_type_id", "step_id", "status")
+"""Columns of a part list export when none are chosen; the format the imports read back."""
+
+
+def _transition_time(current_step):
+    """Timestamp of a part's latest transition into its current step, or of its first transition."""
+    transitions = StepTransitionLog.objects.filter(part=OuterRef("pk"))
+    if current_step:
+        transitions = transitions.filter(step=OuterRef("step")).order_by("-timestamp")
+    else:
+        transitions = transitions.order_by("timestamp")
+    return Subquery(transitions.values("timestamp")[:1])
+
+
+PART_EXPORT_COLUMNS = {
+    "ERP_id": "ERP_id",
+    "part_type_id": "part_type_id",
+    "step_id": "step_id",
+    "status": "status",
+    "part_type": "part_type__name",
+    "step": "step__step",
+    "process": "step__process__name",
+    "order": "order__name",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+    "entered_step_at": lambda: _transition_time(current_step=True),
+    "first_transition_at": lambda: _transition_time(current_step=False),
+}
+"""
+Columns a part list export can include: a values_list path, or a callable building an annotation.
+
+Transition timestamps are correlated subqueries on the `transition_part_timestamp` index.
+"""
+
+
+def part_export_queryset(order_id, columns=DEFAULT_EXPORT_COLUMNS):
+    """
+    Returns an order's active parts, ordered by ERP id, annotated for the chosen export columns.
+
+    Everything is selected in one query, with joined names instead of per-row lookups.
+
+    Returns:
+        tuple[QuerySet, list[tuple[str, str]]]: The parts and the (header, values_list path)
+        pairs to pass to `iter_csv`.
+
+    Raises:
+        ValueError: If a column is not in `PART_EXPORT_COLUMNS`.
+    """
+    unknown = [column for column in columns if column not in PART_EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    annotations = {}
+    paths = []
+    for column in columns:
+        source = PART_EXPORT_COLUMNS[column]
+        if callable(source):
+            annotations[f"export_{column}"] = source()
+            source = f"export_{column}"
+        paths.append((column, source))
+    parts = Parts.objects.filter(order_id=order_id, archived=False).annotate(**annotations).order_by("ERP_id")
+    return parts, paths
+
+
+class CsvFormatError(ValueError):
+    """Raised when an uploaded CSV cannot be read at all, e.g. it has no `ERP_id` column."""
+
+
+def read_csv(file, required=("ERP_id",)):
+    """
+    Streams rows from an uploaded CSV file without reading it into memory.
+
+    Decodes UTF-8 (with or without a byte order mark) as the file is read.
+
+    Yields:
+        tuple[int, dict]: (line number, row), with the header on line 1 and values stripped.
+
+    Raises:
+        CsvFormatError: If the header lacks a `required` column or the file is not UTF-8.
+    """
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        missing = [column for column in required if column not in (reader.fieldnames or [])]
+        if missing:
+            raise CsvFormatError(f"Missing column(s): {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, {key: (value or "").strip() for key, value in row.items() if key}
+    except UnicodeDecodeError:
+        raise CsvFormatError("The file is not UTF-8 encoded text.")
+    finally:
+        text.detach()
+
+
+class PartRowValidator:
+    """
+    Validates part CSV rows against part types, steps and statuses preloaded in three queries.
+
+    `clean(row)` returns the row's changes as `{field: value}` for the `IMPORT_FIELDS` columns
+    with a value (blank cells leave a field unchanged), or raises ValueError with the reason.
+    Steps must belong to the row's part type (or, without a part type column, the part's).
+    """
+
+    def __init__(self):
+        self.part_type_ids = set(PartTypes.objects.values_list("pk", flat=True))
+        self.step_part_types = dict(Steps.objects.values_list("pk", "part_type_id"))
+        self.statuses = set(Parts.Status.values)
+
+    def clean(self, row, current_part_type_id=None):
+        changes = {}
+        for field in ("part_type_id", "step_id"):
+            value = row.get(field)
+            if value:
+                try:
+                    changes[field] = int(value)
+                except ValueError:
+                    raise ValueError(f"{field} must be a number, not {value!r}")
+
+        if "part_type_id" in changes and changes["part_type_id"] not in self.part_type_ids:
+            raise ValueError(f"Unknown part_type_id {changes['part_type_id']}")
+        if "step_id" in changes:
+            if changes["step_id"] not in self.step_part_types:
+                raise ValueError(f"Unknown step_id {changes['step_id']}")
+            part_type_id = changes.get("part_type_id", current_part_type_id)
+            step_part_type_id = self.step_part_types[changes["step_id"]]
+            if part_type_id and step_part_type_id and step_part_type_id != part_type_id:
+                raise ValueError(f"Step {changes['step_id']} does not belong to part type {part_type_id}")
+
+        status = row.get("status")
+        if status:
+            if status not in self.statuses:
+                raise ValueError(f"Unknown status {status!r}")
+            changes["status"] = status
+        return changes
+
+
+def order_part_map(order, lock=False):
+    """
+    Loads an order's active parts into a compact map keyed by upper-cased ERP id.
+
+    Returns:
+        dict[str, list]: ERP id -> [pk, ERP_id, part_type_id, step_id, status]
+    """
+    parts = Parts.objects.filter(order=order, archived=False).order_by()
+    if lock:
+        parts = parts.select_for_update(of=("self",))
+    return {
+        row[0]: list(row[1:])
+        for row in parts.annotate(erp_id_upper=Upper("ERP_id")).values_list(
+            "erp_id_upper", "pk", "ERP_id", "part_type_id", "step_id", "status"
+        )
+    }
+
+
+def _step_label(step_id):
+    step = routing_step(step_id) if step_id else None
+    return step["label"] if step else None
+
+
+def write_part_updates(order, updates, user=None):
+    """
+    Applies `updates` to existing parts with chunked `bulk_update`, inside the caller's transaction.
+
+    Args:
+        updates (list[tuple[list, dict]]): (current `order_part_map` entry, {field: new value}).
+
+    Returns:
+        int: Number of parts updated.
+    """
+    if not updates:
+        return 0
+    now = timezone.now()
+    content_type = ContentType.objects.get_for_model(Parts)
+    deltas = defaultdict(int)
+    for i in range(0, len(updates), IMPORT_CHUNK):
+        chunk = updates[i:i + IMPORT_CHUNK]
+        parts, entries = [], []
+        for (pk, erp_id, part_type_id, step_id, status), changes in chunk:
+            new = {"part_type_id": part_type_id, "step_id": step_id, "status": status, **changes}
+            parts.append(Parts(pk=pk, updated_at=now, **new))
+            record_part_change(deltas, (order.pk, step_id, status, False), (order.pk, new["step_id"], new["status"], False))
+
+            logged = {}
+            if new["part_type_id"] != part_type_id:
+                logged["part_type"] = [str(part_type_id), str(new["part_type_id"])]
+            if new["step_id"] != step_id:
+                logged["step"] = [_step_label(step_id), _step_label(new["step_id"])]
+            if new["status"] != status:
+                logged["status"] = [status, new["status"]]
+            entries.append(LogEntry(
+                actor=user,
+                action=LogEntry.Action.UPDATE,
+                content_type=content_type,
+                object_pk=str(pk),
+                object_id=pk,
+                object_repr=erp_id,
+                timestamp=now,
+                changes=logged,
+                changes_text="",
+                additional_data={"source": "csv import", "order_id": order.pk},
+            ))
+
+        Parts.objects.bulk_update(parts, ["part_type", "step", "status", "updated_at"])
+        LogEntry.objects.bulk_create(entries)
+        if any("part_type_id" in changes for _, changes in chunk):
+            refresh_search_vectors(Parts.objects.filter(pk__in=[part.pk for part in parts]))
+
+    apply_wip_deltas(deltas)
+    transaction.on_commit(lambda: after_bulk_write(Parts, LogEntry))
+    return len(updates)
+
+
+def import_part_updates(order, file, user=None):
+    """
+    Updates an order's parts from a CSV upload in one transaction.
+
+    The file is decoded as it is read and every row is validated against the order's parts
+    (matched by ERP id, case-insensitively) and preloaded part types, steps and statuses; a bad
+    row is reported and skipped without affecting the others. Rows that change nothing are not
+    written. Changes are applied with chunked `bulk_update`, one audit entry per changed part.
+
+    Returns:
+        dict: `{"rows": int, "updated": int, "unchanged": int, "errors": list[dict]}`; errors
+        are `{"line", "erp_id", "error"}`.
+
+    Raises:
+        CsvFormatError: If the file cannot be read; nothing is changed.
+    """
+    report = {"rows": 0, "updated": 0, "unchanged": 0, "errors": []}
+    validator = PartRowValidator()
+    with transaction.atomic():
+        current = order_part_map(order, lock=True)
+        seen = set()
+        updates = []
+        for line, row in read_csv(file):
+            report["rows"] += 1
+            erp_id = row.get("ERP_id", "")
+            key = erp_id.upper()
+            try:
+                if not erp_id:
+                    raise ValueError("ERP_id is empty")
+                if key in seen:
+                    raise ValueError("ERP_id appears more than once in the file")
+                seen.add(key)
+                part = current.get(key)
+                if part is None:
+                    raise ValueError("No active part with this ERP_id in the order")
+                changes = validator.clean(row, current_part_type_id=part[2])
+            except ValueError as e:
+                report["errors"].append({"line": line, "erp_id": erp_id, "error": str(e)})
+                continue
+
+            changes = {
+                field: value for field, value in changes.items()
+                if value != part[2 + IMPORT_FIELDS.index(field)]
+            }
+            if changes:
+                updates.append((part, changes))
+            else:
+                report["unchanged"] += 1
+
+        report["updated"] = write_part_updates(order, updates, user=user)
+    return report
+
+
+def diff_order_parts(order, file, lock=False):
+    """
+    Compares a CSV of an order's complete part list with its active parts, set-wise.
+
+    Rows whose ERP id matches an active part of the order become updates (if a value differs);
+    other rows become new parts, which need `part_type_id` and `step_id` and an ERP id no other
+    active part uses (checked in batched queries); active parts missing from the file are to be
+    archived. Nothing is written.
+
+    Args:
+        lock (bool): Lock the order's parts, when the diff is about to be applied.
+
+    Returns:
+        dict: `{"rows", "unchanged", "create", "update", "archive", "errors"}`. `create` holds
+        `{"ERP_id", "part_type_id", "step_id", "status"}` dicts, `update` `(part, changes)` pairs
+        and `archive` `order_part_map` entries; errors are `{"line", "erp_id", "error"}`.
+
+    Raises:
+        CsvFormatError: If the file cannot be read.
+    """
+    diff = {"rows": 0, "unchanged": 0, "create": [], "update": [], "archive": [], "errors": []}
+    validator = PartRowValidator()
+    current = order_part_map(order, lock=lock)
+    seen = set()
+    for line, row in read_csv(file):
+        diff["rows"] += 1
+        erp_id = row.get("ERP_id", "")
+        key = erp_id.upper()
+        try:
+            if not erp_id:
+                raise ValueError("ERP_id is empty")
+            if len(erp_id) > Parts._meta.get_field("ERP_id").max_length:
+                raise ValueError("ERP_id is too long")
+            if key in seen:
+                raise ValueError("ERP_id appears more than once in the file")
+            seen.add(key)
+            part = current.get(key)
+            changes = validator.clean(row, current_part_type_id=part[2] if part else None)
+            if part is None and not ("part_type_id" in changes and "step_id" in changes):
+                raise ValueError("New parts need a part_type_id and a step_id")
+        except ValueError as e:
+            diff["errors"].append({"line": line, "erp_id": erp_id, "error": str(e)})
+            continue
+
+        if part is None:
+            diff["create"].append({
+                "line": line, "ERP_id": erp_id, "status": Parts._meta.get_field("status").default, **changes,
+            })
+            continue
+        changes = {
+            field: value for field, value in changes.items()
+            if value != part[2 + IMPORT_FIELDS.index(field)]
+        }
+        if changes:
+            diff["update"].append((part, changes))
+        else:
+            diff["unchanged"] += 1
+
+    taken = existing_erp_ids(row["ERP_id"] for row in diff["create"])
+    if taken:
+        for row in diff["create"]:
+            if row["ERP_id"].upper() in taken:
+                diff["errors"].append({"line": row["line"], "erp_id": row["ERP_id"], "error": "ERP_id is used by another order"})
+        diff["create"] = [row for row in diff["create"] if row["ERP_id"].upper() not in taken]
+    diff["archive"] = [part for key, part in current.items() if key not in seen]
+    return diff
+
+
+def apply_order_diff(order, file, user=None):
+    """
+    Applies a full part list CSV to an order: creates, updates and archives parts in bulk.
+
+    The diff is recomputed from the file under a lock on the order's parts, so it reflects any
+    changes since it was previewed. New parts are inserted with `bulk_create`, changed parts
+    written with `bulk_update` and missing parts archived with one UPDATE, all in one transaction.
+    The serials of new parts' ERP ids are reserved first (`reserve_erp_ids`), so parts generated
+    for the same prefix later are numbered after them.
+
+    Returns:
+        dict: The applied diff (see `diff_order_parts`).
+    """
+    with transaction.atomic():
+        diff = diff_order_parts(order, file, lock=True)
+        if diff["create"]:
+            reserve_erp_ids(row["ERP_id"] for row in diff["create"])
+            part_types = PartTypes.objects.in_bulk({row["part_type_id"] for row in diff["create"]})
+            parts = [
+                Parts(
+                    ERP_id=row["ERP_id"], order=order, part_type=part_types[row["part_type_id"]],
+                    step_id=row["step_id"], status=row["status"],
+                )
+                for row in diff["create"]
+            ]
+            for i in range(0, len(parts), IMPORT_CHUNK):
+                insert_parts(order, parts[i:i + IMPORT_CHUNK], user)
+        write_part_updates(order, diff["update"], user=user)
+        if diff["archive"]:
+            archive_parts(
+                Parts.objects.filter(pk__in=[part[0] for part in diff["archive"]]),
+                reason="obsolete", user=user, notes="Not in uploaded part list", summary_object=order,
+            )
+    return diff
@@ -0,0 +1,142 @@
+import time
+
+from django.core.cache import cache
+
+from Tracker.models import PartTypes, Processes, Steps
+from Tracker.tables.versions import bump_model_version, model_version
+
+ROUTING_TTL = 60 * 60 * 24
+"""Seconds a process routing is kept in the shared cache."""
+
+GENERATION_TTL = 5
+"""
+Seconds a process trusts the routing generation it last read before reading the shared cache again.
+
+Step edits made in other processes become visible within this delay; edits in this process
+(`invalidate_routing`) immediately.
+"""
+
+_local = {}
+"""In-process copy of routings, keyed by (generation, process id); cleared when the generation moves."""
+
+_step_processes = {}
+"""In-process index of step id -> process id for routings loaded so far."""
+
+_generation_seen = None
+
+_generation_read_at = 0.0
+
+
+def _generation(refresh=False):
+    """
+    Returns the current routing generation, clearing the in-process maps when it has moved.
+
+    Routings are derived from Steps and PartTypes (for labels), so the generation is built from
+    their change counters, which signals advance on every save and delete. Reading them costs a
+    shared-cache round trip each, so the value is reused for `GENERATION_TTL` seconds.
+    """
+    global _generation_seen, _generation_read_at
+    now = time.monotonic()
+    if refresh or _generation_seen is None or now - _generation_read_at >= GENERATION_TTL:
+        generation = f"{model_version(Steps)}.{model_version(PartTypes)}"
+        if generation != _generation_seen:
+            _local.clear()
+            _step_processes.clear()
+            _generation_seen = generation
+        _generation_read_at = now
+    return _generation_seen
+
+
+def process_routing(process_id):
+    """
+    Returns the ordered step array of a process.
+
+    Processes are versioned (every edit saves a new row), so a routing only changes when its
+    steps or part type are edited directly. Lookups are served from an in-process map, then the
+    shared cache, then a single query; the map is checked against the shared generation at most
+    every `GENERATION_TTL` seconds, so repeated lookups make no round trips.
+
+    Returns:
+        list[dict]: One dict per step, ordered by step number, with keys `id`, `step`,
+        `process_id`, `part_type_id`, `is_last_step` and `label` (the `Steps.__str__` text).
+
+    Example:
+        for step in process_routing(part.step.process_id):
+            print(step["label"], step["is_last_step"])
+    """
+    generation = _generation()
+    routing = _local.get(process_id)
+    if routing is not None:
+        return routing
+
+    key = f"routing:{generation}:{process_id}"
+    routing = cache.get(key)
+    if routing is None:
+        routing = [
+            {
+                "id": step_id,
+                "step": number,
+                "process_id": process_id,
+                "part_type_id": part_type_id,
+                "is_last_step": is_last,
+                "label": f"{part_type_name} Step {number}",
+            }
+            for step_id, number, part_type_id, is_last, part_type_name in Steps.objects.filter(process_id=process_id)
+            .order_by("step")
+            .values_list("id", "step", "part_type_id", "is_last_step", "part_type__name")
+        ]
+        cache.set(key, routing, ROUTING_TTL)
+
+    _local[process_id] = routing
+    for step in routing:
+        _step_processes[step["id"]] = process_id
+    return routing
+
+
+def routing_step(step_id):
+    """Returns the routing entry of `step_id`, or None if the step does not exist."""
+    _generation()
+    process_id = _step_processes.get(step_id)
+    if process_id is None:
+        key = f"routing:{_generation()}:step:{step_id}"
+        process_id = cache.get(key)
+        if process_id is None:
+            process_id = Steps.objects.filter(pk=step_id).values_list("process_id", flat=True).first()
+            if process_id is None:
+                return None
+            cache.set(key, process_id, ROUTING_TTL)
+    return next((step for step in process_routing(process_id) if step["id"] == step_id), None)
+
+
+def next_routing_step(step_id, part_type_id=None):
+    """
+    Returns the routing entry that follows `step_id` in its process, or None if there is none.
+
+    When `part_type_id` is given, the next step must also belong to that part type.
+    """
+    current = routing_step(step_id)
+    if current is None:
+        return None
+    for step in process_routing(current["process_id"]):
+        if step["step"] == current["step"] + 1 and part_type_id in (None, step["part_type_id"]):
+            return step
+    return None
+
+
+def step_choices(part_type_id):
+    """Returns the routing entries of every process of a part type, for step dropdowns."""
+    choices = []
+    for process_id in Processes.objects.filter(part_type_id=part_type_id).order_by("pk").values_list("pk", flat=True):
+        choices.extend(process_routing(process_id))
+    return choices
+
+
+def invalidate_routing():
+    """
+    Starts a new routing generation, discarding cached routings in every process.
+
+    Step saves and deletes do this through signals; call it after writing steps with
+    `bulk_create()`, `bulk_update()` or `update()`.
+    """
+    bump_model_version(Steps)
+    _generation(refresh=True)
@@ -0,0 +1,274 @@
+import json
+
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
+
+from .archiving import archive_parts
+from .models import EquipmentUsage, ErrorReports, Parts, ScanEvent
+from .routing import routing_step
+from .transitions import ScanKeyConflict, after_bulk_write, apply_scan_events
+
+SCAN_ACTIONS = tuple(ScanEvent.Action.values)
+
+MAX_SCAN_BATCH = 5000
+"""Most events accepted in one offline upload; stations split larger buffers across requests."""
+
+
+def _error(message, status):
+    return JsonResponse({"status": "error", "message": message}, status=status)
+
+
+def _int_or_none(value):
+    if value in (None, ""):
+        return None
+    return int(value)
+
+
+def find_scanned_parts(erp_id):
+    """
+    Returns up to two active parts with `erp_id` (case-insensitive); more than one means the scan is ambiguous.
+
+    Matches through the `parts_erp_id_prefix` expression index. Parts come with their order and
+    part type joined in, so writing an audit entry does not trigger further queries.
+    """
+    return list(
+        Parts.objects.filter(ERP_id__iexact=erp_id, archived=False)
+        .select_related("order", "part_type")
+        .only("ERP_id", "status", "archived", "step_id", "part_type__name", "order__name")[:2]
+    )
+
+
+@require_POST
+def scan_part(request):
+    """
+    Passes, fails or archives a part by ERP ID for scan stations and test rigs.
+
+    A lean JSON alternative to the `qa_page` form: no messages, redirect or table re-render, and
+    a fixed number of queries per scan (part lookup, the conditional transition UPDATE, and the
+    transition/usage/audit inserts). Step routing comes from `Tracker.routing`. Fails and archives
+    are written like `apply_scan_events` writes them, without per-row save signals: error reports
+    and equipment usage with `bulk_create`, archives with `archiving.archive_parts`.
+
+    Request body (JSON):
+        {
+            "erp_id": "INJ-000123",
+            "action": "pass" | "fail" | "archive",
+            "equipment_id": 4,               # optional, recorded as EquipmentUsage
+            "expected_step_id": 17,          # optional, defaults to the part's current step
+            "description": "Leak at 2 bar",  # fail: error description
+            "errors": [3, 5],                # fail: optional QualityErrorsList ids
+            "notes": "..."                   # archive: optional notes
+        }
+
+    Responses:
+        200 {"status": "ok", "result": "advanced" | "completed" | "failed" | "archived", "part_id", "erp_id", "step_id", "step", "part_status"}
+        400 malformed request, 403 not staff, 404 unknown ERP ID,
+        409 {"status": "conflict", ...} when another station moved the part first or the ERP ID is ambiguous.
+
+    Example:
+        fetch("/api/scan/", {method: "POST", headers: {"X-CSRFToken": token}, body: JSON.stringify({erp_id, action: "pass"})})
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return _error("Staff login required.", 403)
+
+    try:
+        payload = json.loads(request.body)
+        erp_id = str(payload["erp_id"]).strip()
+        action = payload["action"]
+        equipment_id = _int_or_none(payload.get("equipment_id"))
+        expected_step_id = _int_or_none(payload.get("expected_step_id"))
+        error_ids = [int(pk) for pk in payload.get("errors", [])]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return _error("Expected a JSON object with erp_id and action.", 400)
+    if action not in SCAN_ACTIONS:
+        return _error(f"Unknown action {action!r}; expected one of {', '.join(SCAN_ACTIONS)}.", 400)
+
+    parts = find_scanned_parts(erp_id)
+    if not parts:
+        return _error(f"No active part with ERP ID {erp_id}.", 404)
+    if len(parts) > 1:
+        return _error(f"ERP ID {erp_id} matches more than one active part.", 409)
+    part = parts[0]
+
+    worked_step_id = expected_step_id or part.step_id
+    written = []
+    try:
+        with transaction.atomic():
+            if action == "pass":
+                outcome = part.advance_step(expected_step_id=expected_step_id, operator=request.user)
+                if outcome["result"] == "conflict":
+                    transaction.set_rollback(True)
+                    step = routing_step(outcome["step_id"]) if outcome["step_id"] else None
+                    return JsonResponse({
+                        "status": "conflict",
+                        "message": "Part was already updated by another station.",
+                        "part_id": part.pk,
+                        "erp_id": part.ERP_id,
+                        "step_id": outcome["step_id"],
+                        "step": step["label"] if step else None,
+                        "part_status": outcome["status"],
+                        "archived": outcome["archived"],
+                    }, status=409)
+                if outcome["result"] == "error":
+                    transaction.set_rollback(True)
+                    return _error(outcome["error"], 409)
+                result = outcome["result"]
+                error_report = None
+
+            elif action == "fail":
+                error_report = ErrorReports(
+                    part=part,
+                    machine_id=equipment_id,
+                    operator=request.user,
+                    description=str(payload.get("description") or "Failed at scan station"),
+                )
+                ErrorReports.objects.bulk_create([error_report])
+                ErrorReports.errors.through.objects.bulk_create([
+                    ErrorReports.errors.through(errorreports_id=error_report.pk, qualityerrorslist_id=error_id)
+                    for error_id in set(error_ids)
+                ])
+                written.append(ErrorReports)
+                result = "failed"
+
+            else:
+                archive_parts(
+                    Parts.objects.filter(pk=part.pk), reason="user_error", user=request.user,
+                    notes=str(payload.get("notes") or "Archived via scan station"), summary_object=part,
+                )
+                part.archived = True
+                result = "archived"
+                error_report = None
+
+            if equipment_id is not None:
+                EquipmentUsage.objects.bulk_create([EquipmentUsage(
+                    equipment_id=equipment_id,
+                    step_id=worked_step_id,
+                    part=part,
+                    operator=request.user,
+                    error_report=error_report,
+                )])
+                written.append(EquipmentUsage)
+            if written:
+                transaction.on_commit(lambda: after_bulk_write(*written))
+    except IntegrityError:
+        return _error("Unknown equipment or error type id.", 400)
+
+    step = routing_step(part.step_id) if part.step_id else None
+    return JsonResponse({
+        "status": "ok",
+        "result": result,
+        "part_id": part.pk,
+        "erp_id": part.ERP_id,
+        "step_id": part.step_id,
+        "step": step["label"] if step else None,
+        "part_status": part.status,
+    })
+
+
+def parse_scan_event(raw):
+    """
+    Validates one uploaded scan event and returns it in the form `apply_scan_events` expects.
+
+    Raises:
+        ValueError: With a message suitable for the station if the event is malformed.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Event must be an object.")
+    key = str(raw.get("key") or "").strip()
+    if not key or len(key) > 100:
+        raise ValueError("Event needs a key of at most 100 characters.")
+    erp_id = str(raw.get("erp_id") or "").strip()
+    if not erp_id:
+        raise ValueError("Event needs an erp_id.")
+    if raw.get("action") not in SCAN_ACTIONS:
+        raise ValueError(f"Unknown action; expected one of {', '.join(SCAN_ACTIONS)}.")
+
+    scanned_at = parse_datetime(str(raw.get("timestamp") or ""))
+    if scanned_at is None:
+        raise ValueError("Event needs an ISO 8601 timestamp.")
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+
+    try:
+        step_id = _int_or_none(raw.get("step_id"))
+    except (TypeError, ValueError):
+        raise ValueError("step_id must be an integer id.")
+    if raw["action"] == "pass" and step_id is None:
+        raise ValueError("Pass events need the step_id the part was scanned at.")
+
+    try:
+        return {
+            "key": key,
+            "erp_id": erp_id,
+            "action": raw["action"],
+            "scanned_at": scanned_at,
+            "step_id": step_id,
+            "operator_id": _int_or_none(raw.get("operator_id")),
+            "equipment_id": _int_or_none(raw.get("equipment_id")),
+            "errors": [int(pk) for pk in raw.get("errors", [])],
+            "description": str(raw.get("description") or ""),
+            "notes": str(raw.get("notes") or ""),
+        }
+    except (TypeError, ValueError):
+        raise ValueError("operator_id, equipment_id and errors must be integer ids.")
+
+
+@require_POST
+def scan_batch(request):
+    """
+    Accepts a batch of scans buffered by a station while it was offline.
+
+    Every event carries an idempotency key, so a station can resend the whole buffer after a
+    timeout without double-advancing parts, and passes name the step the part was scanned at
+    (`step_id`), so a pass is rejected if the part was moved on in the meantime. Events are applied in timestamp order by
+    `Tracker.transitions.apply_scan_events` with set-wise writes; malformed events are reported
+    individually and do not block the rest of the batch.
+
+    Request body (JSON):
+        {"events": [
+            {"key": "station4-000981", "erp_id": "INJ-000123", "action": "pass", "step_id": 17,
+             "timestamp": "2025-05-02T07:41:09Z", "operator_id": 12, "equipment_id": 4},
+            ...
+        ]}
+
+    Responses:
+        200 {"status": "ok", "results": [{"key", "result", "message", "part_id", "step_id", "replayed"}, ...]}
+            in the same order as the events; `result` is "advanced", "completed", "failed",
+            "archived", "rejected", "duplicate" or "invalid".
+        400 malformed body or too many events, 403 not staff,
+        409 if a concurrent upload of the same keys is in progress (retry the batch).
+    """
+    if not request.user.is_authenticated or not request.user.is_staff:
+        return _error("Staff login required.", 403)
+
+    try:
+        raw_events = json.loads(request.body)["events"]
+    except (ValueError, TypeError, KeyError):
+        return _error("Expected a JSON object with an events list.", 400)
+    if not isinstance(raw_events, list):
+        return _error("Expected a JSON object with an events list.", 400)
+    if len(raw_events) > MAX_SCAN_BATCH:
+        return _error(f"At most {MAX_SCAN_BATCH} events per upload.", 400)
+
+    results = [None] * len(raw_events)
+    positions, events = [], []
+    for i, raw in enumerate(raw_events):
+        try:
+            events.append(parse_scan_event(raw))
+            positions.append(i)
+        except ValueError as e:
+            key = raw.get("key") if isinstance(raw, dict) else None
+            results[i] = {"key": key, "result": "invalid", "message": str(e), "part_id": None,
+                          "step_id": None, "replayed": False}
+
+    try:
+        applied = apply_scan_events(events, default_operator=request.user)
+    except ScanKeyConflict:
+        return _error("Another upload of these scans is in progress; retry the batch.", 409)
+
+    for i, result in zip(positions, applied):
+        results[i] = result
+    return JsonResponse({"status": "ok", "results": results})
@@ -0,0 +1,154 @@
+from collections import Counter
+
+from django.core.management import call_command
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_migrate, pre_save
+from django.dispatch import receiver
+
+from Tracker.erp_ids import archive_duplicate_erp_ids
+from Tracker.models import Orders, Parts, PartTypes
+from Tracker.tables.facets import invalidate_facets, record_saved
+from Tracker.tables.search import refresh_search_vectors
+from Tracker.tables.versions import bump_model_version
+from Tracker.wip import WIP_FIELDS, apply_wip_deltas, part_state, record_part_change
+
+
+@receiver(pre_migrate)
+def create_cache_table(sender, using, **kwargs):
+    """
+    Creates the database cache table before migrations run.
+
+    Migrations save rows (content types, permissions), and the receivers below record every save
+    in the shared cache, so the table has to exist first, on a fresh database as well as in tests.
+    Does nothing for other cache backends or when the table already exists.
+    """
+    if sender.name == "Tracker":
+        call_command("createcachetable", database=using, verbosity=0)
+
+
+@receiver(pre_migrate)
+def archive_duplicate_parts(sender, using, stdout=None, **kwargs):
+    """
+    Archives duplicate active ERP ids before `parts_erp_id_unique_active` is created, reporting each.
+
+    The constraint's migration is generated at deploy time, so the data fix runs here, ahead of it.
+    """
+    if sender.name != "Tracker":
+        return
+    duplicates = archive_duplicate_erp_ids(using)
+    if duplicates and stdout:
+        for erp_id, part_ids in duplicates:
+            stdout.write(f"  Archived duplicate ERP id {erp_id}: parts {', '.join(map(str, part_ids))}")
+        stdout.write(
+            f"  Archived {sum(len(part_ids) for _, part_ids in duplicates)} parts sharing {len(duplicates)} "
+            f"ERP ids; run rebuild_wip_summary to recount them"
+        )
+
+
+@receiver(post_save, sender=Parts)
+@receiver(post_save, sender=Orders)
+def update_search_vector(sender, instance, update_fields=None, **kwargs):
+    """
+    Keeps `search_vector` in step with the row after every save.
+
+    Runs as a single UPDATE on the saved row and does not re-trigger `post_save`, so it
+    does not produce an extra audit log entry.
+    """
+    if update_fields is not None and set(update_fields) == {"search_vector"}:
+        return
+    refresh_search_vectors(sender.objects.filter(pk=instance.pk))
+
+
+@receiver(post_init, sender=PartTypes)
+def remember_part_type_name(sender, instance, **kwargs):
+    """Remembers a loaded part type's name, so saving it only refreshes its parts' vectors if it changed."""
+    instance._search_name = instance.__dict__.get("name")
+
+
+@receiver(post_save, sender=PartTypes)
+def update_part_type_search_vectors(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Refreshes the search vectors of a renamed part type's parts, which include its name.
+
+    One UPDATE for all of them. `PartTypes.save()` stores a change as a new version that no part
+    references yet, so this only does work for rows renamed in place (saves that bypass the
+    versioning, e.g. `Model.save(part_type)` or `save_base()`).
+    """
+    if raw or created or instance.name == getattr(instance, "_search_name", None):
+        return
+    refresh_search_vectors(Parts.objects.filter(part_type=instance))
+    instance._search_name = instance.name
+
+
+@receiver(post_save)
+def update_table_facets(sender, instance, created=False, raw=False, **kwargs):
+    """Folds saved rows' values into the cached filter dropdowns."""
+    if raw:
+        return
+    record_saved(sender, instance, created)
+
+
+@receiver(post_delete)
+def drop_table_facets(sender, instance, **kwargs):
+    """Drops cached filter dropdowns that may still list a deleted row's values."""
+    invalidate_facets(sender)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_table_version(sender, raw=False, **kwargs):
+    """Advances the model's change counter so cached table fragments and ETags go stale."""
+    if raw:
+        return
+    bump_model_version(sender)
+
+
+@receiver(m2m_changed)
+def bump_m2m_table_version(sender, instance, action, model, **kwargs):
+    """Advances the counters of both sides of a many-to-many change."""
+    if action.startswith("post_"):
+        bump_model_version(type(instance), model)
+
+
+@receiver(post_init, sender=Parts)
+def remember_wip_state(sender, instance, **kwargs):
+    """Remembers which WIP summary row a loaded part is counted in, so its next save can move it."""
+    instance._wip_state = part_state(instance)
+
+
+@receiver(pre_save, sender=Parts)
+def load_wip_state(sender, instance, raw=False, **kwargs):
+    """
+    Settles the WIP summary row a part is counted in before it is saved.
+
+    Uses the state remembered when the part was loaded; only parts loaded with deferred fields,
+    or unsaved instances given an explicit pk, need a query.
+    """
+    if raw:
+        return
+    if instance.pk is None:
+        instance._wip_old = None
+    elif instance._state.adding or getattr(instance, "_wip_state", None) is None:
+        instance._wip_old = Parts.objects.filter(pk=instance.pk).values_list(*WIP_FIELDS).first()
+    else:
+        instance._wip_old = instance._wip_state
+
+
+@receiver(post_save, sender=Parts)
+def update_wip_summary(sender, instance, created=False, raw=False, **kwargs):
+    """Moves a saved part between WIP summary rows in the same transaction as the save."""
+    if raw:
+        return
+    old = None if created else getattr(instance, "_wip_old", None)
+    new = tuple(instance.__dict__.get(name, old[i] if old else None) for i, name in enumerate(WIP_FIELDS))
+    deltas = Counter()
+    record_part_change(deltas, old, new)
+    apply_wip_deltas(deltas)
+    instance._wip_state = new
+
+
+@receiver(post_delete, sender=Parts)
+def remove_from_wip_summary(sender, instance, **kwargs):
+    """Uncounts a hard-deleted part (soft archives go through `update_wip_summary`)."""
+    deltas = Counter()
+    record_part_change(deltas, part_state(instance) or getattr(instance, "_wip_state", None), None)
+    apply_wip_deltas(deltas)
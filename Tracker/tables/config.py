@@ -0,0 +1,117 @@
+"""
+Per-model configuration for the HTMX tables rendered by `generic_table_view`.
+
+Each entry maps a model name (as used in the `generic_table_view` URL) to:
+    - "headers": Column labels.
+    - "fields": Field paths rendered per row through the `get_attr` template filter.
+    - "link_prefix": Prefix used to build the row detail link.
+    - "search_fields": Field paths OR-ed together for the `q` search box.
+    - "filter_fields": Field paths rendered as dropdown filters (optional).
+    - "cursor_pagination": Page by keyset instead of LIMIT/OFFSET (optional).
+    - "facet_counts": Show per-value counts for the current query next to each filter option (optional).
+    - "export_fields": Field paths written by the CSV export instead of "fields" (optional).
+"""
+from django.apps import apps
+
+TABLE_CONFIG = {
+    "auditlog_logentry": {
+        "headers": ["Timestamp", "Actor Email", "Action", "Object", "Changes", "Remote IP"],
+        "fields": ["timestamp", "actor_email", "action", "object_repr", "changes_text", "remote_addr"],
+        "link_prefix": "auditlog_logentry",
+        "search_fields": [
+            "actor_email",
+            "object_repr",
+            "changes_text",
+            "remote_addr",
+            "action",
+            "additional_data"
+        ],
+        "filter_fields": ["action", "actor_email"],
+        "cursor_pagination": True,
+    },
+    "Orders": {
+        "headers": ["Name", "Estimated Completion", "Status"],
+        "fields": ["name", "estimated_completion", "status"],
+        "link_prefix": "Orders",
+        "search_fields": ["name", "status"],
+        "filter_fields": ["status"],
+        "facet_counts": True,
+    },
+    "Parts": {
+        "headers": ["ERP ID", "Part Type", "Step", "Status"],
+        "fields": ["ERP_id", "part_type", "step", "status"],
+        "link_prefix": "Parts",
+        "search_fields": ["ERP_id", "status", "part_type__name"],
+        "filter_fields": ["status", "part_type__name"],
+        "cursor_pagination": True,
+        "export_fields": ["ERP_id", "order__name", "part_type__name", "step__process__name", "step__step", "status"],
+    },
+    "Documents": {
+        "headers": ["File Name", "File", "Part", "Upload Date", "Uploaded By"],
+        "fields": ["file_name", "file", "part", "upload_date", "uploaded_by"],
+        "link_prefix": "Documents",
+        "search_fields": ["file_name", "file", "part__part_type__ID_prefix", "part__part_type__name",
+                          "part__order__name", "uploaded_by__first_name", "uploaded_by__last_name",
+                          "uploaded_by__email", "uploaded_by__username"],
+    },
+    "WorkOrder": {
+        "headers": ["ERP ID", "Operator", "Related Order", "Status", "Expected Completion"],
+        "fields": ["ERP_id", "operator", "related_order", "status", "expected_completion"],
+        "link_prefix": "WorkOrder",
+        "search_fields": ["ERP_id", "operator__username", "related_order__name", "status"],
+        "filter_fields": ["status", "operator__username"]
+    },
+    "PartTypes": {
+        "headers": ["Name", "Updated Last", "Glovia ID Prefix"],
+        "fields": ["name", "updated_at", "ID_prefix"],
+        "link_prefix": "PartTypes",
+        "search_fields": ["Name", "ID_prefix"],
+    },
+    "QualityErrorsList": {
+        "headers": ["Error Name", "Error Example", "Part Type"],
+        "fields": ["error_name", "error_example", "part_type"],
+        "link_prefix": "QualityErrorsList",
+        "search_fields": ["error_name", "error_example", "part_type__name"],
+    },
+    "Processes": {
+        "headers": ["Name", "Remanufactured Process", "Number of Steps", "Version", "Part Type"],
+        "fields": ["name", "is_remanufactured", "num_steps", "version", "part_type__name"],
+        "link_prefix": "Processes",
+        "search_fields": ["name", "num_steps", "version", "part_type__name", ],
+    },
+    "Equipments": {
+        "headers": ["Name", "Equipment Type"],
+        "fields": ["name", "equipment_type__name"],
+        "link_prefix": "Equipments",
+        "search_fields": [],
+    },
+    "EquipmentType": {
+        "headers": ["Name"],
+        "fields": ["name"],
+        "link_prefix": "EquipmentType",
+        "search_fields": ["name"],
+    },
+    "Steps": {
+        "headers": ["Step", "Part Type", "Process"],
+        "fields": ["step", "part_type__name", "process__name"],
+        "link_prefix": "Steps",
+        "search_fields": ["part_type__name", "process__name"],
+    }
+}
+
+
+def resolve_table_model(model_name):
+    """
+    Resolves a table name to its model class.
+
+    Accepts either 'ModelName' (looked up in the Tracker app) or 'app_label_ModelName'.
+
+    Raises:
+        LookupError: If no such model exists.
+    """
+    if '_' in model_name:
+        app_label, model_str = model_name.split('_', 1)
+    else:
+        app_label = 'Tracker'  # default app
+        model_str = model_name
+    return apps.get_model(app_label, model_str)
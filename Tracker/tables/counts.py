@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from Tracker.tables.versions import model_version
+
+APPROXIMATE_THRESHOLD = 10000
+"""Row counts at or above this are shown as approximate ("page X of ~N")."""
+
+COUNT_CACHE_TTL = 60
+"""Seconds a count is reused; writes to the counted table start a new count sooner (see `query_cache_key`)."""
+
+
+def planner_estimate(queryset):
+    """
+    Returns the query planner's row estimate for `queryset`, or None if the database cannot provide one.
+
+    Costs one EXPLAIN (no execution), so it is constant-time regardless of table size.
+    """
+    if connections[queryset.db].vendor != "postgresql":
+        return None
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def query_cache_key(prefix, queryset):
+    """
+    Returns a cache key for a result computed from `queryset`, e.g. a count.
+
+    The key covers the SQL and the change counter of the queried model, so a write to the table
+    (through signals or `after_bulk_write`) starts a fresh result instead of serving a stale one.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    version = model_version(queryset.model)
+    return f"tables:{prefix}:" + hashlib.sha1(f"{queryset.db}:{version}:{sql}:{params}".encode()).hexdigest()
+
+
+def count_rows(queryset, filtered=False):
+    """
+    Counts `queryset` using the cheapest strategy that is accurate enough for pagination.
+
+    - Unfiltered views use the planner estimate once it reaches `APPROXIMATE_THRESHOLD`,
+      and an exact count below it.
+    - Filtered views (search or dropdown filters) use an exact count.
+
+    Either result is reused for `COUNT_CACHE_TTL` seconds per distinct query, so a page whose
+    fragment was invalidated (e.g. a new sort or page number) skips the EXPLAIN and COUNT.
+
+    Returns:
+        tuple[int, bool]: The count, and whether it should be presented as approximate.
+    """
+    key = query_cache_key("count", queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+
+    estimate = None if filtered else planner_estimate(queryset)
+    if estimate is not None and estimate >= APPROXIMATE_THRESHOLD:
+        result = (estimate, True)
+    else:
+        count = queryset.count()
+        result = (count, filtered and count >= APPROXIMATE_THRESHOLD)
+    cache.set(key, result, COUNT_CACHE_TTL)
+    return result
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator whose total comes from `count_rows` instead of an exact COUNT(*) on every request.
+
+    When the count is an estimate, page numbers past the estimated last page are still served
+    (they may exist), and pages are sliced without clamping to the estimated total.
+
+    Example:
+        paginator = EstimatedCountPaginator(qs, 25, filtered=bool(query))
+        page_obj = paginator.get_page(request.GET.get("page"))
+        # page_obj.paginator.count_is_estimate -> render "of ~N"
+    """
+
+    def __init__(self, object_list, per_page, filtered=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.filtered = filtered
+
+    @cached_property
+    def _count_info(self):
+        return count_rows(self.object_list, self.filtered)
+
+    @property
+    def count(self):
+        return self._count_info[0]
+
+    @property
+    def count_is_estimate(self):
+        return self._count_info[1]
+
+    def validate_number(self, number):
+        if not self.count_is_estimate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        if not self.count_is_estimate:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
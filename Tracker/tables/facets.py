@@ -0,0 +1,152 @@
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from Tracker.tables.config import TABLE_CONFIG, resolve_table_model
+from Tracker.tables.counts import COUNT_CACHE_TTL, query_cache_key
+
+FACET_TTL = 60 * 30
+"""Seconds a cached facet list lives; a safety net for writes that bypass signals (bulk updates)."""
+
+
+def _cache_key(model, field):
+    return f"tables:facets:{model._meta.label}:{field}"
+
+
+def _path_models(model, field):
+    """Returns every model a `__`-separated filter path reads from, starting with `model`."""
+    models = [model]
+    for name in field.split("__")[:-1]:
+        model = model._meta.get_field(name).related_model
+        models.append(model)
+    return models
+
+
+@lru_cache(maxsize=None)
+def _facets_by_model():
+    """
+    Maps each model label to the cached facets it can affect.
+
+    Returns:
+        dict[str, list[tuple[Model, str]]]: For each label, the (table model, filter field) pairs
+        whose values are read from that model, either directly or across a join.
+    """
+    dependents = {}
+    for model_name, config in TABLE_CONFIG.items():
+        try:
+            model = resolve_table_model(model_name)
+        except LookupError:
+            continue
+        for field in config.get("filter_fields", []):
+            for path_model in _path_models(model, field):
+                dependents.setdefault(path_model._meta.label, []).append((model, field))
+    return dependents
+
+
+def facet_values(model, field):
+    """
+    Returns the sorted distinct non-null values of `field` across all rows of `model`.
+
+    Served from the cache when possible; a miss runs one `SELECT DISTINCT` and repopulates it.
+    """
+    key = _cache_key(model, field)
+    values = cache.get(key)
+    if values is None:
+        values = sorted(
+            v for v in model.objects.order_by().values_list(field, flat=True).distinct() if v is not None
+        )
+        cache.set(key, values, FACET_TTL)
+    return values
+
+
+def facet_counts(queryset, field):
+    """
+    Counts rows per value of `field` within `queryset` (i.e. scoped to the current search and filters).
+
+    Reused like page counts (see `Tracker.tables.counts.query_cache_key`), so re-rendering the
+    same query for another page or sort order does not run the GROUP BY again.
+
+    Returns:
+        dict: value -> row count
+    """
+    key = query_cache_key(f"facet_counts:{field}", queryset)
+    counts = cache.get(key)
+    if counts is None:
+        rows = queryset.order_by().values(field).annotate(facet_count=Count("pk"))
+        counts = {row[field]: row["facet_count"] for row in rows}
+        cache.set(key, counts, COUNT_CACHE_TTL)
+    return counts
+
+
+def _resolve(instance, field):
+    value = instance
+    for name in field.split("__"):
+        value = getattr(value, name, None)
+        if value is None:
+            return None
+    return value
+
+
+def record_saved(model, instance, created):
+    """
+    Folds a saved row into the cached facets.
+
+    The row's own facet values are appended to the cached lists in place, so append-heavy
+    tables like the audit log and busy tables like Parts keep their cache across writes.
+    A value that no row uses any more after an update lingers until the TTL expires. Facets
+    on other tables that read this model across a join are dropped when an existing row
+    changes, since the value they display may have changed. Concurrent appends can race;
+    the TTL bounds any resulting staleness.
+    """
+    for table_model, field in _facets_by_model().get(model._meta.label, []):
+        key = _cache_key(table_model, field)
+        if table_model is not model:
+            if not created:
+                cache.delete(key)
+            # A new related row has no referencing rows yet, so the facet is unchanged.
+            continue
+        values = cache.get(key)
+        if values is None:
+            continue
+        value = _resolve(instance, field)
+        if value is None or value in values:
+            continue
+        cache.set(key, sorted(values + [value]), FACET_TTL)
+
+
+def record_values(model, values):
+    """
+    Folds values a bulk write gave `model`'s rows into its own cached facets.
+
+    The set-based counterpart of `record_saved`, for `bulk_create()` and for updates that only
+    change values of `model`'s own filter fields, such as a part moving to another step or
+    status: one cache read, and at most one write, per affected facet, and nothing is dropped.
+    Writes that change values other tables filter on across a join need `invalidate_facets`.
+
+    Args:
+        values (dict[str, Iterable]): Filter field -> the values the written rows now have.
+    """
+    for table_model, field in _facets_by_model().get(model._meta.label, []):
+        new = {value for value in values.get(field, ()) if value is not None} if table_model is model else None
+        if not new:
+            continue
+        key = _cache_key(model, field)
+        cached = cache.get(key)
+        if cached is None or new.issubset(cached):
+            continue
+        cache.set(key, sorted(set(cached) | new), FACET_TTL)
+
+
+def record_created(model, rows):
+    """Folds bulk-created rows into `model`'s own cached facets (see `record_values`)."""
+    fields = [field for table_model, field in _facets_by_model().get(model._meta.label, []) if table_model is model]
+    if rows and fields:
+        record_values(model, {field: [_resolve(row, field) for row in rows] for field in fields})
+
+
+def invalidate_facets(model):
+    """Drops every cached facet that reads from `model`; called on deletes and bulk writes."""
+    keys = {_cache_key(table_model, field) for table_model, field in _facets_by_model().get(model._meta.label, [])}
+    if keys:
+        cache.delete_many(keys)
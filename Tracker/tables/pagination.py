@@ -0,0 +1,208 @@
+import datetime
+import decimal
+import uuid
+
+from django.core import signing
+from django.db.models import F, Q
+
+CURSOR_SALT = "Tracker.tables.cursor"
+
+
+def resolve_sort_field(model, path):
+    """
+    Resolves a `__`-separated sort path to the concrete column used for keyset seeking.
+
+    Relations are replaced by their foreign key column, so `part_type` seeks on `part_type_id`.
+    The column is considered nullable if any hop along the path is nullable.
+
+    Args:
+        model (Model): The model the path starts from.
+        path (str): A field path as used in CONFIG["fields"], e.g. "part_type__name".
+
+    Returns:
+        tuple[str, bool]: The ORM path to order and filter on, and whether it can be NULL.
+
+    Raises:
+        FieldDoesNotExist: If any segment of the path is not a field.
+    """
+    nullable = False
+    field = None
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        nullable = nullable or getattr(field, "null", False)
+        if field.is_relation:
+            model = field.related_model
+    if field is not None and field.is_relation:
+        return f"{path}_id", nullable
+    return path, nullable
+
+
+def _encode_value(value):
+    """Converts a sort value into something the JSON cursor payload can carry."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    return value
+
+
+def _seek_filter(field, value, pk, descending, nullable, nulls_first):
+    """
+    Builds the WHERE clause selecting rows strictly after (`value`, `pk`) in the given ordering.
+
+    NULL sort values are kept in a single block at the start or end of the ordering, with `pk`
+    as the tie-breaker inside the block.
+    """
+    pk_after = Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+    if field == "pk":
+        return pk_after
+
+    if value is None:
+        after = Q(**{f"{field}__isnull": True}) & pk_after
+        if nulls_first:
+            after |= Q(**{f"{field}__isnull": False})
+        return after
+
+    lookup = "lt" if descending else "gt"
+    after = Q(**{f"{field}__{lookup}": value}) | (Q(**{field: value}) & pk_after)
+    if nullable and not nulls_first:
+        after |= Q(**{f"{field}__isnull": True})
+    return after
+
+
+def _ordering(field, descending, nullable, nulls_first):
+    pk = F("pk").desc() if descending else F("pk").asc()
+    if field == "pk":
+        return [pk]
+    expression = F(field).desc if descending else F(field).asc
+    if not nullable:
+        return [expression(), pk]
+    if nulls_first:
+        return [expression(nulls_first=True), pk]
+    return [expression(nulls_last=True), pk]
+
+
+class KeysetPage:
+    """
+    A single page of a keyset-paginated queryset.
+
+    Exposes the subset of the `django.core.paginator.Page` interface used by
+    `partials/pagination.html`, plus opaque `next_cursor` / `previous_cursor` tokens.
+    No COUNT query is issued, so there is no total page count.
+    """
+
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by seeking on (sort column, pk) instead of LIMIT/OFFSET.
+
+    Every page costs a single indexed range scan of `per_page + 1` rows regardless of depth,
+    and no COUNT(*) is run. Cursors are signed so they cannot be forged, and are bound to the
+    sort column and direction they were issued for; a cursor presented with a different sort
+    is ignored and the first page is returned.
+
+    Example:
+        paginator = KeysetPaginator(qs, 25, sort="updated_at", descending=True)
+        page_obj = paginator.get_page(request.GET.get("cursor"))
+    """
+
+    def __init__(self, queryset, per_page, sort=None, descending=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.sort = sort or "pk"
+        self.descending = descending
+        if self.sort == "pk":
+            self.field, self.nullable = "pk", False
+        elif self.sort in queryset.query.annotations:
+            # Computed orderings such as `search_rank`; treated as nullable to be safe.
+            self.field, self.nullable = self.sort, True
+        else:
+            self.field, self.nullable = resolve_sort_field(queryset.model, self.sort)
+
+    def _dumps(self, row, direction):
+        value = None if self.field == "pk" else row._keyset_value
+        return signing.dumps({
+            "s": self.sort,
+            "o": "desc" if self.descending else "asc",
+            "d": direction,
+            "v": _encode_value(value),
+            "k": _encode_value(row.pk),
+        }, salt=CURSOR_SALT, compress=True)
+
+    def _loads(self, token):
+        if not token:
+            return None
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            return None
+        if payload.get("s") != self.sort or payload.get("o") != ("desc" if self.descending else "asc"):
+            return None
+        return payload
+
+    def get_page(self, token=None):
+        """
+        Returns the page following (or preceding) the position encoded in `token`.
+
+        Args:
+            token (str | None): A cursor from a previous page's `next_cursor` or `previous_cursor`.
+                Missing, tampered or stale tokens yield the first page.
+
+        Returns:
+            KeysetPage
+        """
+        cursor = self._loads(token)
+        backwards = bool(cursor and cursor["d"] == "prev")
+
+        # Walking backwards inverts both the direction and where the NULL block sits.
+        descending = self.descending != backwards
+        nulls_first = backwards
+
+        qs = self.queryset
+        if self.field != "pk":
+            qs = qs.annotate(_keyset_value=F(self.field))
+        if cursor:
+            qs = qs.filter(_seek_filter(self.field, cursor["v"], cursor["k"], descending, self.nullable, nulls_first))
+        qs = qs.order_by(*_ordering(self.field, descending, self.nullable, nulls_first))
+
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], None, None)
+
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._dumps(rows[-1], "next") if has_next else None,
+            previous_cursor=self._dumps(rows[0], "prev") if has_previous else None,
+        )
@@ -0,0 +1,130 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+
+DISPLAY_RELATIONS = {
+    "Tracker.Parts": ["order", "part_type"],
+    "Tracker.Steps": ["part_type"],
+    "Tracker.Processes": ["part_type"],
+    "Tracker.Equipments": ["equipment_type"],
+    "Tracker.QualityErrorsList": ["part_type"],
+    "Tracker.ErrorReports": ["part"],
+    "Tracker.EquipmentUsage": ["equipment", "part", "step"],
+    "Tracker.StepTransitionLog": ["step", "part"],
+}
+"""
+Relations each model's `__str__` dereferences, keyed by "app_label.ModelName".
+
+When a table column renders a related object directly (e.g. the "step" column on Parts),
+these are joined in as well so that `__str__` does not trigger a lazy load per row.
+Keep this in sync when changing a model's `__str__`.
+"""
+
+MAX_DISPLAY_DEPTH = 3
+"""How many levels of `DISPLAY_RELATIONS` to follow from a rendered relation."""
+
+
+def _display_paths(model, prefix, depth=0):
+    if depth >= MAX_DISPLAY_DEPTH:
+        return []
+    paths = []
+    for name in DISPLAY_RELATIONS.get(model._meta.label, []):
+        field = model._meta.get_field(name)
+        path = f"{prefix}__{name}"
+        paths.append(path)
+        paths.extend(_display_paths(field.related_model, path, depth + 1))
+    return paths
+
+
+@lru_cache(maxsize=None)
+def build_query_plan(model, fields):
+    """
+    Derives the joins and column projection needed to render `fields` for rows of `model`.
+
+    Forward to-one relations become `select_related` joins, to-many hops become
+    `prefetch_related` lookups, and the base model is projected with `.only()` down to the
+    columns actually rendered. Relations rendered through `__str__` pull in the relations
+    listed in `DISPLAY_RELATIONS`. Paths that are not model fields (properties, methods, the
+    generic `part` on Documents) disable the projection, since their column needs are unknown.
+
+    Args:
+        model (Model): The model whose rows are rendered.
+        fields (tuple[str]): Field paths as used in TABLE_CONFIG, separated by "__" or ".".
+
+    Returns:
+        dict: {"select_related": list[str], "prefetch_related": list[str], "only": list[str] | None}
+    """
+    select_related = set()
+    prefetch_related = set()
+    only = {model._meta.pk.name}
+    projectable = True
+
+    for path in fields:
+        current = model
+        hops = []
+        to_one = True
+        field = None
+
+        for name in path.replace(".", "__").split("__"):
+            try:
+                field = current._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+                break
+            if field.is_relation and field.related_model is None:
+                # GenericForeignKey: resolved per row by content type, nothing to join.
+                field = None
+                break
+
+            hops.append(name)
+            if not field.is_relation:
+                break
+
+            if not (field.many_to_one or field.one_to_one) or not field.concrete:
+                to_one = False
+            lookup = "__".join(hops)
+            if to_one:
+                select_related.add(lookup)
+            else:
+                prefetch_related.add(lookup)
+            current = field.related_model
+
+        if not hops:
+            projectable = False
+            continue
+        if field is None:
+            projectable = False
+
+        root = model._meta.get_field(hops[0])
+        if root.concrete:
+            only.add(root.name)
+
+        if field is not None and field.is_relation:
+            for display in _display_paths(current, "__".join(hops)):
+                (select_related if to_one else prefetch_related).add(display)
+
+    def leaves(paths):
+        return sorted(p for p in paths if not any(o.startswith(f"{p}__") for o in paths))
+
+    return {
+        "select_related": leaves(select_related),
+        "prefetch_related": sorted(prefetch_related),
+        "only": sorted(only) if projectable else None,
+    }
+
+
+def apply_query_plan(queryset, fields):
+    """
+    Applies `build_query_plan` for `fields` to `queryset`.
+
+    Example:
+        qs = apply_query_plan(Parts.objects.filter(archived=False), TABLE_CONFIG["Parts"]["fields"])
+    """
+    plan = build_query_plan(queryset.model, tuple(fields))
+    if plan["select_related"]:
+        queryset = queryset.select_related(*plan["select_related"])
+    if plan["prefetch_related"]:
+        queryset = queryset.prefetch_related(*plan["prefetch_related"])
+    if plan["only"]:
+        queryset = queryset.only(*plan["only"])
+    return queryset
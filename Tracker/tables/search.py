@@ -0,0 +1,139 @@
+import re
+
+from django.apps import apps
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+SEARCH_VECTORS = {
+    "Tracker.Parts": {"ERP_id": "A", "part_type__name": "B"},
+    "Tracker.Orders": {"name": "A"},
+}
+"""
+Columns folded into each model's `search_vector`, keyed by "app_label.ModelName", with their rank weight.
+
+Joined paths are read through a correlated subquery, so the vector can be rebuilt with a single UPDATE.
+Only stable columns belong here; fields with choices (e.g. `status`) are matched against their labels
+at query time instead, so bulk status changes never leave vectors stale.
+"""
+
+PREFIX_FIELDS = {
+    "Tracker.Parts": ["ERP_id"],
+}
+"""Columns matched with an index-backed case-insensitive prefix search, keyed like `SEARCH_VECTORS`."""
+
+SEARCH_CONFIG = "simple"
+"""Text search configuration; 'simple' avoids stemming ERP IDs and part names."""
+
+
+def supports_vector_search(model):
+    """Returns True if `model` has a maintained search vector and the database can use it."""
+    return connection.vendor == "postgresql" and model._meta.label in SEARCH_VECTORS
+
+
+def search_vector_expression(model):
+    """
+    Builds the SearchVector expression that `search_vector` is kept equal to for `model`.
+
+    Suitable for `QuerySet.update()`: joined paths are expressed as correlated subqueries
+    rather than joins, which UPDATE does not allow.
+    """
+    vector = None
+    for path, weight in SEARCH_VECTORS[model._meta.label].items():
+        relation, _, rest = path.partition("__")
+        if rest:
+            fk = model._meta.get_field(relation)
+            source = Subquery(
+                fk.related_model.objects.filter(pk=OuterRef(fk.attname)).values(rest)[:1]
+            )
+        else:
+            source = F(path)
+        part = SearchVector(source, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def refresh_search_vectors(queryset):
+    """
+    Recomputes `search_vector` for every row in `queryset` with one UPDATE.
+
+    No-op on databases without full-text search or for models without a configured vector.
+
+    Returns:
+        int: Number of rows updated.
+    """
+    model = queryset.model
+    if not supports_vector_search(model):
+        return 0
+    return queryset.order_by().update(search_vector=search_vector_expression(model))
+
+
+def prefix_tsquery(query):
+    """
+    Turns free text into a raw tsquery that prefix-matches every word, e.g. "di-12 inj" -> "di:* & 12:* & inj:*".
+
+    Returns an empty string if the text contains no searchable words.
+    """
+    words = re.findall(r"\w+", query.lower())
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def _choice_matches(model, field_name, query):
+    """Returns the stored values of a choices field whose value or label starts with `query`."""
+    try:
+        field = model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return None
+    if not field.choices:
+        return None
+    needle = query.strip().lower().replace(" ", "_")
+    return [
+        value for value, label in field.flatchoices
+        if str(value).lower().startswith(needle) or str(label).lower().replace(" ", "_").startswith(needle)
+    ]
+
+
+def search_queryset(queryset, search_fields, query):
+    """
+    Applies the table search box to `queryset`.
+
+    On PostgreSQL, models listed in `SEARCH_VECTORS` match against their GIN-indexed
+    `search_vector` with prefix semantics, ERP IDs in `PREFIX_FIELDS` match by prefix, and
+    choice fields match by label. Results are annotated with `search_rank`. Everything else
+    falls back to OR-ing `icontains` across `search_fields`.
+
+    Args:
+        queryset (QuerySet): The queryset to filter.
+        search_fields (list[str]): The TABLE_CONFIG "search_fields" for the model.
+        query (str): The raw search text.
+
+    Returns:
+        tuple[QuerySet, bool]: The filtered queryset, and whether it carries a `search_rank` annotation.
+    """
+    model = queryset.model
+    tsquery = prefix_tsquery(query)
+
+    if not supports_vector_search(model) or not tsquery:
+        q_filter = Q()
+        for field in search_fields:
+            q_filter |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(q_filter), False
+
+    search_query = SearchQuery(tsquery, search_type="raw", config=SEARCH_CONFIG)
+    q_filter = Q(search_vector=search_query)
+    for field in PREFIX_FIELDS.get(model._meta.label, []):
+        q_filter |= Q(**{f"{field}__istartswith": query.strip()})
+    for field in search_fields:
+        matches = _choice_matches(model, field, query)
+        if matches:
+            q_filter |= Q(**{f"{field}__in": matches})
+
+    queryset = queryset.filter(q_filter).annotate(search_rank=SearchRank(F("search_vector"), search_query))
+    return queryset, True
+
+
+def searchable_models():
+    """Yields every model that has a maintained search vector."""
+    for label in SEARCH_VECTORS:
+        yield apps.get_model(label)
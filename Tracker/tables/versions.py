@@ -0,0 +1,105 @@
+import hashlib
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+
+from Tracker.tables.config import TABLE_CONFIG, resolve_table_model
+from Tracker.tables.query_plan import build_query_plan
+
+FRAGMENT_TTL = 60 * 10
+"""Seconds a rendered table fragment is kept for reuse under its ETag."""
+
+
+def _version_key(model):
+    return f"tables:version:{model._meta.label}"
+
+
+def model_version(model):
+    """
+    Returns the current change counter for `model`.
+
+    Counters start from the current time in milliseconds rather than 0, so a cache flush or
+    restart never hands out a version that was already used for different data.
+    """
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_model_version(*models):
+    """
+    Advances the change counter of each model, invalidating ETags and cached fragments that read it.
+
+    Called from save/delete signals; code that writes with `update()`, `bulk_create()` or
+    `bulk_update()` must call it explicitly.
+    """
+    for model in models:
+        key = _version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+
+def _path_models(model, path):
+    models = [model]
+    for name in path.replace(".", "__").split("__"):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            break
+        if not field.is_relation or field.related_model is None:
+            break
+        model = field.related_model
+        models.append(model)
+    return models
+
+
+@lru_cache(maxsize=None)
+def table_models(model_name):
+    """Returns every model whose rows can change what the `model_name` table renders."""
+    model = resolve_table_model(model_name)
+    config = TABLE_CONFIG[model_name]
+    plan = build_query_plan(model, tuple(config["fields"]))
+    paths = (
+        plan["select_related"] + plan["prefetch_related"]
+        + config.get("search_fields", []) + config.get("filter_fields", [])
+    )
+    models = {model}
+    for path in paths:
+        models.update(_path_models(model, path))
+    return sorted(models, key=lambda m: m._meta.label)
+
+
+def table_etag(request, model_name):
+    """
+    Computes the ETag of a `generic_table_view` response.
+
+    Covers the table, every query parameter (search, filters, sort, page or cursor, modes),
+    the user's visibility scope, their CSRF cookie (row action forms embed a token), and the
+    change counter of every model the table reads.
+    """
+    user = request.user
+    parts = [
+        model_name,
+        request.GET.urlencode(),
+        f"user={user.pk}:{user.is_staff}",
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+    ]
+    parts.extend(f"{m._meta.label}={model_version(m)}" for m in table_models(model_name))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def get_cached_fragment(etag):
+    """Returns the rendered table HTML stored under `etag`, or None."""
+    return cache.get(f"tables:fragment:{etag}")
+
+
+def set_cached_fragment(etag, content):
+    cache.set(f"tables:fragment:{etag}", content, FRAGMENT_TTL)
@@ -1,3 +1,485 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import unittest
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, models, transaction
+from django.db.models import Count
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Tracker import jobs
+from Tracker.erp_ids import allocate_erp_ids, archive_duplicate_erp_ids
+from Tracker.models import ArchiveReason, Companies, Documents, Equipments, EquipmentType, ErrorReports, Orders, Parts, PartTypes, \
+    Job, Processes, QualityErrorsList, StepTransitionLog, User
+from Tracker import part_generation
+from Tracker.part_generation import generate_parts
+from Tracker.part_import import apply_order_diff
+from Tracker.routing import routing_step
+from Tracker.tables.facets import _cache_key, facet_values
+from Tracker.tables.search import SEARCH_CONFIG
+from Tracker.tables.config import TABLE_CONFIG
+from Tracker.transition_log import transitions_between
+from Tracker.transitions import advance_part, advance_parts, pass_target
+from Tracker.views import generic_table_view
+
+
+def create_order_with_parts(count, name="Batch-A", num_steps=3):
+    """
+    Seeds a company, customer, part type, process with `num_steps` steps and an order with `count` parts on step 1.
+
+    Returns:
+        tuple[Orders, list[Parts]]
+    """
+    company = Companies.objects.create(name=f"{name} Diesel", description="", hubspot_api_id=f"HS-{name}")
+    customer = User.objects.create_user(username=f"customer-{name}", password="password", parent_company=company)
+    part_type = PartTypes.objects.create(name=f"{name} Injector", ID_prefix=name.upper())
+    process = Processes.objects.create(name="Reman", is_remanufactured=True, part_type=part_type, num_steps=num_steps)
+    process.generate_steps()
+    first_step = process.steps.get(step=1)
+    order = Orders.objects.create(name=name, customer=customer, company=company)
+    parts = [
+        Parts.objects.create(ERP_id=f"{part_type.ID_prefix}-{i}", part_type=part_type, step=first_step, order=order)
+        for i in range(1, count + 1)
+    ]
+    return order, parts
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class TableQueryBudgetTests(TestCase):
+    """
+    Every generic table renders a full page in a fixed number of queries, however many rows it shows.
+
+    Related objects come from the join plan derived from each table's "fields", so rows must not
+    add queries. Caches are cleared before a cold render, so its count covers a page built from
+    scratch rather than a cached fragment; a warm render is a new page of a query whose counts
+    and filter values are already cached. The cache runs in memory here, so only the view's own
+    queries are counted, not the round trips of the shared cache backend.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", password="password", is_staff=True)
+        order, parts = create_order_with_parts(30)
+        equipment_type = EquipmentType.objects.create(name="Test Bench")
+        machine = Equipments.objects.create(name="EQ-100", equipment_type=equipment_type)
+        QualityErrorsList.objects.create(error_name="Leak", error_example="Leak at 2 bar", part_type=parts[0].part_type)
+        for part in parts[:5]:
+            ErrorReports.objects.create(part=part, machine=machine, operator=cls.staff, description="Leak")
+
+    def cold_budget(self, config):
+        """
+        Queries a cold render of a table may run, each a fixed cost per page:
+
+        - 1 for the page of rows;
+        - 1 per filter field for its dropdown values, kept afterwards in the facet cache;
+        - 1 per filter field for its per-value counts, on tables with "facet_counts";
+        - 2 for the total of offset-paginated tables: the planner estimate (EXPLAIN) and, below
+          `APPROXIMATE_THRESHOLD`, the exact COUNT. Keyset-paginated tables have no total.
+        """
+        filters = len(config.get("filter_fields", []))
+        budget = 1 + filters
+        if config.get("facet_counts"):
+            budget += filters
+        if not config.get("cursor_pagination"):
+            budget += 2
+        return budget
+
+    def render(self, model_name, query="", clear=True):
+        if clear:
+            cache.clear()
+        request = RequestFactory().get(reverse("generic_table_view", args=[model_name]) + query)
+        request.user = self.staff
+        return generic_table_view(request, model_name)
+
+    def assert_queries(self, queries, budget):
+        self.assertLessEqual(len(queries), budget, "\n".join(query["sql"] for query in queries.captured_queries))
+
+    def test_cold_tables_within_budget(self):
+        for model_name, config in TABLE_CONFIG.items():
+            with self.subTest(table=model_name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.render(model_name)
+                self.assertEqual(response.status_code, 200)
+                self.assert_queries(queries, self.cold_budget(config))
+
+    def test_warm_tables_only_query_rows(self):
+        for model_name in TABLE_CONFIG:
+            with self.subTest(table=model_name):
+                self.render(model_name)
+                # Another page of the same query has its own ETag but reuses counts and filter values.
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.render(model_name, "?page=1", clear=False)
+                self.assertEqual(response.status_code, 200)
+                self.assert_queries(queries, 1)
+
+    def test_parts_queries_do_not_grow_with_rows(self):
+        Parts.objects.all().delete()
+        create_order_with_parts(1, name="Batch-B")
+        with CaptureQueriesContext(connection) as one_row:
+            self.render("Parts")
+
+        create_order_with_parts(25, name="Batch-C")
+        with CaptureQueriesContext(connection) as full_page:
+            self.render("Parts")
+        self.assertLessEqual(len(full_page), len(one_row))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class PassFacetTests(TestCase):
+    """Passing parts folds their new status into the cached Parts filter values instead of dropping them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.order, cls.parts = create_order_with_parts(3, num_steps=1)
+
+    def setUp(self):
+        cache.clear()
+        self.status_key = _cache_key(Parts, "status")
+        self.part_type_key = _cache_key(Parts, "part_type__name")
+        facet_values(Parts, "status")
+        facet_values(Parts, "part_type__name")
+
+    def assert_facets_kept(self):
+        self.assertIn(Parts.Status.COMPLETED, cache.get(self.status_key))
+        self.assertEqual(cache.get(self.part_type_key), facet_values(Parts, "part_type__name"))
+
+    def test_single_pass(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(advance_part(self.parts[0])["result"], "completed")
+        self.assert_facets_kept()
+
+    def test_bulk_pass(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            advance_parts(Parts.objects.filter(order=self.order))
+        self.assert_facets_kept()
+
+
+class QAPageTests(TestCase):
+    """The QA page rejects tampered form values with a 400 instead of failing on them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", password="password", is_staff=True)
+        cls.order, cls.parts = create_order_with_parts(1)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def post(self, **data):
+        return self.client.post(reverse("QA"), {"part_id": self.parts[0].pk, "action": "Pass", **data})
+
+    def test_tampered_ids_are_rejected(self):
+        for data in ({"step_id": "2; DROP"}, {"step_id": "-1"}, {"part_id": "x"}):
+            with self.subTest(**data):
+                self.assertEqual(self.post(**data).status_code, 400)
+        self.assertEqual(Parts.objects.get(pk=self.parts[0].pk).step_id, self.parts[0].step_id)
+
+    def test_pass(self):
+        self.assertEqual(self.post(step_id=self.parts[0].step_id).status_code, 302)
+        self.assertNotEqual(Parts.objects.get(pk=self.parts[0].pk).step_id, self.parts[0].step_id)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ScanPartTests(TestCase):
+    """
+    Every scan station action runs a fixed set of queries, without the per-row save signal chain.
+
+    Each count includes 6 shared queries: the session, user and part lookups, the savepoint the
+    scan is written in (2) and the equipment usage insert. Routings and content types are warmed
+    up first, as they are on a running server.
+    """
+
+    QUERIES = {
+        # advance_part: savepoint (2), conditional UPDATE, WIP summary, transition log, audit entry
+        "pass": 6 + 6,
+        # error report, its error types
+        "fail": 6 + 2,
+        # archive_parts: savepoint (2), lock, UPDATE, WIP summary, existing reasons, reasons, audit entry
+        "archive": 6 + 8,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", password="password", is_staff=True)
+        cls.order, cls.parts = create_order_with_parts(len(cls.QUERIES))
+        cls.machine = Equipments.objects.create(name="EQ-100", equipment_type=EquipmentType.objects.create(name="Bench"))
+        cls.error = QualityErrorsList.objects.create(
+            error_name="Leak", error_example="Leak at 2 bar", part_type=cls.parts[0].part_type
+        )
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+        ContentType.objects.get_for_model(Parts)
+        routing_step(self.parts[0].step_id)
+        pass_target(self.parts[0].step_id, self.parts[0].part_type_id)
+
+    def test_actions_query_counts(self):
+        for part, (action, queries) in zip(self.parts, self.QUERIES.items()):
+            body = {"erp_id": part.ERP_id, "action": action, "equipment_id": self.machine.pk, "errors": [self.error.pk]}
+            with self.subTest(action=action), self.assertNumQueries(queries):
+                response = self.client.post(reverse("scan_part"), json.dumps(body), content_type="application/json")
+                self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Parts.objects.get(pk=self.parts[0].pk).step.step, 2)
+        self.assertEqual(ErrorReports.objects.get(part=self.parts[1]).errors.get(), self.error)
+        self.assertTrue(Parts.objects.get(pk=self.parts[2].pk).archived)
+        self.assertTrue(ArchiveReason.objects.filter(object_id=self.parts[2].pk).exists())
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Search vectors require PostgreSQL.")
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SearchVectorTests(TestCase):
+    """Parts are found by the name of the part type row they reference."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.order, cls.parts = create_order_with_parts(3)
+
+    def found(self, word):
+        return set(
+            Parts.objects.filter(search_vector=SearchQuery(word, config=SEARCH_CONFIG)).values_list("pk", flat=True)
+        )
+
+    def test_in_place_rename_refreshes_parts(self):
+        part_type = PartTypes.objects.get(pk=self.parts[0].part_type_id)
+        part_type.name = "Nozzle"
+        # auditlog's read of the old row and its entry, the part type UPDATE and one UPDATE of its parts' vectors.
+        with self.assertNumQueries(4):
+            models.Model.save(part_type)
+        self.assertEqual(self.found("nozzle"), {part.pk for part in self.parts})
+
+        with self.assertNumQueries(2):
+            models.Model.save(part_type)
+
+    def test_new_version_leaves_parts(self):
+        part_type = PartTypes.objects.get(pk=self.parts[0].part_type_id)
+        part_type.name = "Nozzle"
+        part_type.save()
+        self.assertEqual(self.found("nozzle"), set())
+        self.assertEqual(self.found("injector"), {part.pk for part in self.parts})
+
+
+def _seq_scans(plan):
+    """Yields the relation name of every sequential scan node in an EXPLAIN (FORMAT JSON) plan tree."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from _seq_scans(child)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Query plan checks require PostgreSQL.")
+class QueryPlanTests(TestCase):
+    """
+    The hot-path lookups are served by an index, not a sequential scan.
+
+    The seeded tables are small, which makes a sequential scan the cheapest plan, so each query is
+    EXPLAINed with `enable_seqscan = off`: a sequential scan then only appears if no usable index
+    exists at all.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.order, cls.parts = create_order_with_parts(10)
+        cls.part = cls.parts[0]
+        StepTransitionLog.objects.create(part=cls.part, step=cls.part.step, timestamp=timezone.now())
+
+    def hot_queries(self):
+        """Hot-path ORM queries keyed by a description of where they run."""
+        now = timezone.now()
+        return {
+            "qa_page: active parts by id": Parts.objects.filter(archived=False).order_by("id")[:25],
+            "order edit: active parts of an order": Parts.objects.filter(order=self.order, archived=False),
+            "upload_parts_csv: part by order and ERP id": Parts.objects.filter(
+                order=self.order, ERP_id=self.part.ERP_id
+            ),
+            "table search: ERP id prefix": Parts.objects.filter(ERP_id__istartswith=self.part.ERP_id),
+            "send_reports: active orders of a customer": (
+                Orders.objects.filter(customer=self.order.customer, archived=False).order_by("-updated_at")
+            ),
+            "part history: transitions of a part": (
+                StepTransitionLog.objects.filter(part=self.part).order_by("timestamp")
+            ),
+            "transition report: one week window": transitions_between(now - timedelta(days=7), now),
+            "documents of an object": Documents.objects.filter(
+                content_type=ContentType.objects.get_for_model(Parts), object_id=self.part.pk
+            ),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for description, queryset in self.hot_queries().items():
+            with self.subTest(query=description):
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL enable_seqscan = off")
+                    plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+                self.assertEqual([name for name in _seq_scans(plan) if name], [], description)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Concurrent transitions need row-level locking.")
+class ConcurrentPassTests(TransactionTestCase):
+    """
+    Parallel stations passing the same parts never advance a part twice from the same step.
+
+    Every station reads the order's parts like a rendered QA table and passes each one against
+    the step it read; the conditional UPDATE lets one station win and reports a conflict to
+    the rest.
+    """
+
+    THREADS = 8
+    ROUNDS = 3
+
+    def setUp(self):
+        self.order, parts = create_order_with_parts(20, num_steps=self.ROUNDS + 2)
+        self.part_ids = [part.pk for part in parts]
+
+    def snapshot(self):
+        """Returns {part id: (step number, completed)} for the order's parts."""
+        state = {}
+        for pk, step_id, status in Parts.objects.filter(pk__in=self.part_ids).values_list("pk", "step_id", "status"):
+            step = routing_step(step_id) if step_id else None
+            state[pk] = (step["step"] if step else 0, status == Parts.Status.COMPLETED)
+        return state
+
+    def test_parallel_passes_do_not_double_advance(self):
+        before = self.snapshot()
+        results = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(self.THREADS)
+
+        def station():
+            local = Counter()
+            try:
+                start.wait()
+                for _ in range(self.ROUNDS):
+                    for part in Parts.objects.filter(pk__in=self.part_ids).select_related("order", "part_type"):
+                        local[part.advance_step(expected_step_id=part.step_id)["result"]] += 1
+            finally:
+                connection.close()
+                with lock:
+                    results.update(local)
+
+        threads = [threading.Thread(target=station) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results["error"], 0)
+        after = self.snapshot()
+        logged = dict(
+            StepTransitionLog.objects.filter(part_id__in=self.part_ids)
+            .values_list("part_id")
+            .annotate(times=Count("pk"))
+        )
+        # Every pass that reported success must correspond to exactly one step of real progress.
+        self.assertEqual(sum(logged.values()), results["advanced"] + results["completed"])
+        for pk, (start_step, start_completed) in before.items():
+            end_step, end_completed = after[pk]
+            with self.subTest(part=pk):
+                self.assertEqual(logged.get(pk, 0), end_step - start_step + (end_completed and not start_completed))
+
+
+class OrderImportNumberingTests(TestCase):
+    """Parts an order's CSV part list creates are not numbered again when parts are generated later."""
+
+    def test_generated_parts_follow_imported_ids(self):
+        order, parts = create_order_with_parts(2)
+        part_type, step = parts[0].part_type, parts[0].step
+        prefix = part_type.ID_prefix
+        allocate_erp_ids(prefix, 0)
+
+        rows = [f"{part.ERP_id},{part_type.pk},{step.pk}" for part in parts]
+        rows += [f"{prefix}-3,{part_type.pk},{step.pk}", f"{prefix}-0105,{part_type.pk},{step.pk}"]
+        upload = SimpleUploadedFile("parts.csv", "\n".join(["ERP_id,part_type_id,step_id", *rows]).encode())
+        diff = apply_order_diff(order, upload)
+        self.assertEqual(diff["errors"], [])
+        self.assertEqual(len(diff["create"]), 2)
+
+        report = generate_parts(order, [
+            {"part_type": part_type, "process": step.process, "quantity": 2, "enumeration_start": None},
+        ])
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            sorted(Parts.objects.filter(pk__in=report["part_ids"]).values_list("ERP_id", flat=True)),
+            [f"{prefix}-106", f"{prefix}-107"],
+        )
+
+
+class DuplicateErpIdTests(TestCase):
+    """Active ERP ids are unique, both for databases that predate the constraint and for concurrent requests."""
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "The duplicate cleanup is written for PostgreSQL.")
+    def test_duplicates_archived_before_constraint(self):
+        order, parts = create_order_with_parts(3)
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX parts_erp_id_unique_active")
+        duplicates = [
+            Parts.objects.create(ERP_id=parts[0].ERP_id.lower(), part_type=parts[0].part_type, step=parts[0].step, order=order)
+            for _ in range(2)
+        ]
+
+        self.assertEqual(archive_duplicate_erp_ids(), [(parts[0].ERP_id.upper(), [part.pk for part in duplicates])])
+        self.assertEqual(Parts.objects.filter(archived=True).count(), 2)
+        self.assertFalse(Parts.objects.get(pk=parts[0].pk).archived)
+        self.assertEqual(
+            set(ArchiveReason.objects.filter(reason="obsolete").values_list("object_id", flat=True)),
+            {part.pk for part in duplicates},
+        )
+
+    def test_generated_id_taken_after_check_is_skipped(self):
+        order, parts = create_order_with_parts(2)
+        part_type, step = parts[0].part_type, parts[0].step
+        line_item = {"part_type": part_type, "process": step.process, "quantity": 2, "enumeration_start": 2}
+
+        # The check before the insert misses the taken id, as it would if another request inserted it just after.
+        lookups = [lambda erp_ids: set(), part_generation.existing_erp_ids]
+        with mock.patch.object(part_generation, "existing_erp_ids", side_effect=lambda erp_ids: lookups.pop(0)(erp_ids)):
+            report = generate_parts(order, [line_item])
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["skipped"], [{"erp_id": parts[1].ERP_id, "reason": "ERP id already in use"}])
+        self.assertEqual(Parts.objects.filter(order=order, archived=False).count(), 3)
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    """A job that runs longer than `STALE_AFTER` without reporting progress is not requeued while it runs."""
+
+    def setUp(self):
+        jobs.register("test_sleep")(lambda progress, seconds: time.sleep(seconds) or {"slept": seconds})
+        self.addCleanup(jobs.JOBS.pop, "test_sleep")
+
+    @mock.patch.object(jobs, "HEARTBEAT_INTERVAL", timedelta(seconds=0.1))
+    @mock.patch.object(jobs, "STALE_AFTER", timedelta(seconds=0.5))
+    def test_long_job_is_not_requeued(self):
+        jobs.enqueue("test_sleep", {"seconds": 1.5})
+        job = jobs.claim_job()
+        worker = threading.Thread(target=lambda: (jobs.run_job(job), connection.close()))
+        worker.start()
+
+        time.sleep(1)
+        self.assertEqual(jobs.requeue_stale(), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.Status.RUNNING)
+
+        worker.join()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.attempts, 1)
+
+    @mock.patch.object(jobs, "STALE_AFTER", timedelta(seconds=0.5))
+    def test_abandoned_job_is_requeued(self):
+        jobs.enqueue("test_sleep", {"seconds": 0})
+        job = jobs.claim_job()
+
+        time.sleep(1)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.Status.QUEUED)
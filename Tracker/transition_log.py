@@ -0,0 +1,272 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from Tracker.models import StepTransitionDailyCount, StepTransitionLog
+
+MAX_REPORT_DAYS = 400
+"""Widest window `transitions_between` accepts, so reports cannot silently scan every partition."""
+
+
+def _table():
+    return StepTransitionLog._meta.db_table
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(month):
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Returns the table name of the partition holding `month` (a date on the 1st)."""
+    return f"{_table()}_y{month.year}m{month.month:02d}"
+
+
+def _bound(month):
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+# Partition management --------------------------------------------------------------------------
+
+def is_partitioned():
+    """Returns True if the transition log table is a partitioned (parent) table."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [_quote(_table())])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def partitions():
+    """
+    Returns the month partitions of the transition log.
+
+    Returns:
+        list[tuple[date, str]]: (first day of month, partition table name), oldest first. The
+        DEFAULT partition, which catches rows outside every month range, is not included.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [_quote(_table())],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{_table()}_y"
+    months = []
+    for name in names:
+        if name.startswith(prefix) and len(name) == len(prefix) + 7:
+            months.append((date(int(name[-7:-3]), int(name[-2:]), 1), name))
+    return sorted(months)
+
+
+def create_partition(month):
+    """Creates the partition for `month` if it does not exist yet. Indexes are inherited from the parent."""
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {_quote(name)} PARTITION OF {_quote(_table())} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [_bound(month), _bound(_next_month(month))],
+        )
+    return name
+
+
+def ensure_partitions(months_ahead=3, today=None):
+    """
+    Creates partitions from the current month through `months_ahead` months ahead.
+
+    Run it regularly (e.g. daily from cron via `manage.py transition_partitions`) so rows never
+    land in the DEFAULT partition; a new partition cannot be created while the DEFAULT partition
+    holds rows in its range.
+
+    Returns:
+        list[str]: Names of the partitions that exist for those months.
+    """
+    month = _month_start(today or date.today())
+    names = []
+    for _ in range(months_ahead + 1):
+        names.append(create_partition(month))
+        month = _next_month(month)
+    return names
+
+
+def convert_to_partitioned(months_ahead=3):
+    """
+    Rebuilds the transition log as a table range-partitioned by month on `timestamp`.
+
+    One-time migration, run in a single transaction under an ACCESS EXCLUSIVE lock: the table is
+    renamed, a partitioned table with the same columns (and identity) is created, month partitions
+    are created for every month with data plus `months_ahead`, rows are copied, the old table is
+    dropped, and the primary key (`id`, `timestamp`), foreign keys and the model's indexes (BRIN on
+    `timestamp`, btree on `part`, `timestamp`) are created on the parent so every partition gets
+    them. Schema changes to StepTransitionLog afterwards must be applied to the parent by hand.
+
+    Returns:
+        int: Number of rows copied.
+    """
+    table = _table()
+    legacy = f"{table}_legacy"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_quote(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {_quote(table)} RENAME TO {_quote(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {_quote(table)} (LIKE {_quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) "
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f"CREATE TABLE {_quote(table + '_default')} PARTITION OF {_quote(table)} DEFAULT")
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM {_quote(legacy)}')
+        oldest = cursor.fetchone()[0]
+        month = _month_start(oldest.astimezone(dt_timezone.utc) if oldest else date.today())
+        while month <= _month_start(date.today()):
+            create_partition(month)
+            month = _next_month(month)
+        ensure_partitions(months_ahead)
+
+        cursor.execute(f"INSERT INTO {_quote(table)} SELECT * FROM {_quote(legacy)}")
+        copied = cursor.rowcount
+        cursor.execute(f"DROP TABLE {_quote(legacy)}")
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM " + _quote(table),
+            [_quote(table)],
+        )
+
+        cursor.execute(f'ALTER TABLE {_quote(table)} ADD PRIMARY KEY (id, "timestamp")')
+        for field in StepTransitionLog._meta.concrete_fields:
+            if field.remote_field is None:
+                continue
+            target = field.related_model._meta
+            cursor.execute(
+                f"ALTER TABLE {_quote(table)} ADD CONSTRAINT {_quote(f'{table}_{field.column}_fk')} "
+                f"FOREIGN KEY ({_quote(field.column)}) "
+                f"REFERENCES {_quote(target.db_table)} ({_quote(target.pk.column)}) DEFERRABLE INITIALLY DEFERRED"
+            )
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in StepTransitionLog._meta.indexes:
+                schema_editor.add_index(StepTransitionLog, index)
+    return copied
+
+
+def move_partitions(before, tablespace):
+    """
+    Moves month partitions that end on or before `before` to `tablespace` (e.g. one on cheaper storage).
+
+    The rows stay attached and queryable; reports that do not reach back that far never touch them.
+
+    Returns:
+        list[str]: Names of the partitions moved.
+    """
+    moved = []
+    with connection.cursor() as cursor:
+        for month, name in partitions():
+            if _next_month(month) > before:
+                continue
+            cursor.execute(f"ALTER TABLE {_quote(name)} SET TABLESPACE {_quote(tablespace)}")
+            moved.append(name)
+    return moved
+
+
+def expire_partitions(before):
+    """
+    Rolls up and drops month partitions that end on or before `before`.
+
+    Each partition's rows are summarized into `StepTransitionDailyCount` (per day, step and
+    operator) and the partition is detached and dropped, in one transaction per month.
+
+    Returns:
+        list[str]: Names of the partitions dropped.
+    """
+    rollup = _quote(StepTransitionDailyCount._meta.db_table)
+    dropped = []
+    for month, name in partitions():
+        if _next_month(month) > before:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {rollup} (day, step_id, operator_id, count)
+                SELECT ("timestamp" AT TIME ZONE 'UTC')::date, step_id, operator_id, COUNT(*)
+                FROM {_quote(name)}
+                GROUP BY 1, 2, 3
+                """
+            )
+            cursor.execute(f"ALTER TABLE {_quote(_table())} DETACH PARTITION {_quote(name)}")
+            cursor.execute(f"DROP TABLE {_quote(name)}")
+        dropped.append(name)
+    return dropped
+
+
+# Time-bounded queries --------------------------------------------------------------------------
+
+def transitions_between(start, end):
+    """
+    Returns the transitions with `start <= timestamp < end`.
+
+    Both bounds are required and are sent as literals, so PostgreSQL prunes every partition
+    outside the window at plan time (and uses the BRIN index inside it).
+
+    Raises:
+        ValueError: If the window is empty or wider than `MAX_REPORT_DAYS`.
+
+    Example:
+        transitions_between(now - timedelta(days=7), now).filter(step__process=process)
+    """
+    if end <= start:
+        raise ValueError("The report window must end after it starts.")
+    if end - start > timedelta(days=MAX_REPORT_DAYS):
+        raise ValueError(f"Report windows are limited to {MAX_REPORT_DAYS} days; use transition_counts().")
+    return StepTransitionLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+
+
+def part_history(part_id, start, end):
+    """Returns a part's transitions within a time window, oldest first."""
+    return transitions_between(start, end).filter(part_id=part_id).order_by("timestamp")
+
+
+def transition_counts(start_day, end_day, by_operator=False):
+    """
+    Counts transitions per day and step for `start_day <= day < end_day`.
+
+    Days still in the log are counted from it (one pruned aggregate); days whose partitions
+    were expired come from `StepTransitionDailyCount`. The two never overlap.
+
+    Returns:
+        Counter: (day, step_id) -> count, or (day, step_id, operator_id) -> count with `by_operator`.
+    """
+    keys = ["day", "step_id"] + (["operator_id"] if by_operator else [])
+    counts = Counter()
+
+    start = datetime.combine(start_day, datetime.min.time(), tzinfo=dt_timezone.utc)
+    end = datetime.combine(end_day, datetime.min.time(), tzinfo=dt_timezone.utc)
+    live = (
+        StepTransitionLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        .annotate(day=TruncDate("timestamp", tzinfo=dt_timezone.utc))
+        .values(*keys)
+        .annotate(total=Count("pk"))
+        .order_by()
+    )
+    rolled = (
+        StepTransitionDailyCount.objects.filter(day__gte=start_day, day__lt=end_day)
+        .values(*keys)
+        .annotate(total=Sum("count"))
+        .order_by()
+    )
+    for rows in (live, rolled):
+        for row in rows:
+            counts[tuple(row[key] for key in keys)] += row["total"]
+    return counts
@@ -0,0 +1,506 @@
+from collections import Counter, defaultdict
+
+from auditlog.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from django.db.models.functions import Upper
+
+from Tracker.models import ArchiveReason, EquipmentUsage, Equipments, ErrorReports, Parts, QualityErrorsList, \
+    ScanEvent, StepTransitionLog, User
+from Tracker.routing import next_routing_step, process_routing, routing_step
+from Tracker.wip import apply_wip_deltas, part_state, record_part_change
+from Tracker.tables.facets import invalidate_facets, record_created, record_values
+from Tracker.tables.versions import bump_model_version
+
+
+class ScanKeyConflict(Exception):
+    """Raised when a concurrent upload stored a scan batch's idempotency keys first."""
+
+
+def advance_parts(parts, operator=None):
+    """
+    Advances every part in `parts` to its next process step in a single transaction.
+
+    The set-based counterpart of `Parts.increment_step()`: parts on a last step are marked
+    completed, every other part moves to step `n + 1` of its process. Parts already completed on
+    their last step are left out, as `advance_part` does. Next steps are resolved from the cached
+    process routings, rows are written with one UPDATE per distinct current step, and a
+    `StepTransitionLog` row and an audit entry are bulk-created for every part that moved or
+    completed. Selected rows are locked for the duration so concurrent passes cannot
+    double-advance them.
+
+    Args:
+        parts (QuerySet[Parts]): The parts to advance, e.g. `Parts.objects.filter(order=order, archived=False)`.
+        operator (User): Optional user recorded on the transition logs.
+
+    Returns:
+        dict[int, dict]: Per part id, `{"result": "advanced" | "completed", "step_id": int}` or
+        `{"result": "error", "error": str}` for parts that could not be advanced. Parts that were
+        already completed have no entry.
+
+    Example:
+        report = advance_parts(Parts.objects.filter(order_id=order.pk, archived=False), operator=request.user)
+    """
+    report = {}
+    now = timezone.now()
+
+    with transaction.atomic():
+        rows = list(
+            parts.select_for_update(of=("self",))
+            .order_by("pk")
+            .values_list(
+                "pk", "step_id", "step__process_id", "step__step", "step__is_last_step", "part_type_id",
+                "order_id", "status", "ERP_id", "order__name", "part_type__name",
+            )
+        )
+
+        step_ids = {
+            (step["process_id"], step["part_type_id"], step["step"]): step["id"]
+            for process_id in {row[2] for row in rows if row[2]}
+            for step in process_routing(process_id)
+        }
+
+        # Group parts by the write they need, so each group is a single UPDATE.
+        moves = defaultdict(list)
+        completed = []
+        deltas = Counter()
+        entries = []
+        for pk, step_id, process_id, number, is_last, part_type_id, order_id, status, *names in rows:
+            if not step_id or not part_type_id:
+                report[pk] = {"result": "error", "error": "Current step or part type is missing."}
+            elif is_last and status == Parts.Status.COMPLETED:
+                continue
+            elif is_last:
+                completed.append(pk)
+                record_part_change(
+                    deltas, (order_id, step_id, status, False), (order_id, step_id, Parts.Status.COMPLETED, False)
+                )
+                report[pk] = {"result": "completed", "step_id": step_id}
+                entries.append((pk, names, {"status": [status, Parts.Status.COMPLETED]}))
+            elif (process_id, part_type_id, number + 1) not in step_ids:
+                report[pk] = {"result": "error", "error": "Next step not found for this part."}
+            else:
+                next_step_id = step_ids[(process_id, part_type_id, number + 1)]
+                moves[(step_id, next_step_id)].append(pk)
+                record_part_change(deltas, (order_id, step_id, status, False), (order_id, next_step_id, status, False))
+                report[pk] = {"result": "advanced", "step_id": next_step_id}
+                entries.append((pk, names, {"step": [routing_step(step_id)["label"], routing_step(next_step_id)["label"]]}))
+
+        for (step_id, next_step_id), pks in moves.items():
+            Parts.objects.filter(pk__in=pks, step_id=step_id).update(step_id=next_step_id, updated_at=now)
+        if completed:
+            Parts.objects.filter(pk__in=completed).update(status=Parts.Status.COMPLETED, updated_at=now)
+        apply_wip_deltas(deltas)
+
+        StepTransitionLog.objects.bulk_create(
+            [
+                StepTransitionLog(part_id=pk, step_id=outcome["step_id"], operator=operator, timestamp=now)
+                for pk, outcome in report.items()
+                if outcome["result"] != "error"
+            ],
+            batch_size=1000,
+        )
+
+        # update() bypasses auditlog, so record each part's change the way save() would have.
+        content_type = ContentType.objects.get_for_model(Parts)
+        log_entries = LogEntry.objects.bulk_create(
+            [
+                LogEntry(
+                    actor=operator,
+                    action=LogEntry.Action.UPDATE,
+                    content_type=content_type,
+                    object_pk=str(pk),
+                    object_id=pk,
+                    object_repr=f"{erp_id} {order_name or 'Unknown Deal'} {part_type_name or 'Unknown Part Type'}",
+                    timestamp=now,
+                    changes=changes,
+                )
+                for pk, (erp_id, order_name, part_type_name), changes in entries
+            ],
+            batch_size=1000,
+        )
+
+        statuses = [Parts.Status.COMPLETED] if completed else []
+        transaction.on_commit(lambda: after_part_moves(statuses, log_entries, StepTransitionLog))
+
+    return report
+
+
+def pass_target(step_id, part_type_id):
+    """
+    Resolves what passing a part on `step_id` does, from the cached routings.
+
+    Returns:
+        tuple: `("completed", step)` on a last step, `("advanced", next step)` otherwise (routing
+        entries), or `("error", message)` when the step or the next one cannot be found.
+    """
+    current = routing_step(step_id) if step_id else None
+    if current is None or not part_type_id:
+        return "error", "Current step or part type is missing."
+    if current["is_last_step"]:
+        return "completed", current
+    next_step = next_routing_step(step_id, part_type_id=part_type_id)
+    if next_step is None:
+        return "error", "Next step not found for this part."
+    return "advanced", next_step
+
+
+def advance_part(part, expected_step_id=None, operator=None):
+    """
+    Advances one part with a conditional UPDATE, without locking it first.
+
+    The write only applies if the part is still on `expected_step_id` (and, for a last step,
+    not yet completed), i.e. `UPDATE ... WHERE id = %s AND step_id = %s`. When another station
+    moved the part in the meantime, nothing is written and the part's current state is reported
+    as a conflict instead of advancing it a second time.
+
+    Args:
+        part (Parts): The part to advance; updated in place on success.
+        expected_step_id (int): The step the operator saw the part on. Defaults to `part.step_id`.
+        operator (User): Optional user recorded on the transition log and audit entry.
+
+    Returns:
+        dict: `{"result": "advanced" | "completed", "step_id": int, "status": str}` on success,
+        `{"result": "conflict", "step_id": int, "status": str, "archived": bool}` with the part's
+        current state when it changed underneath, or `{"result": "error", "error": str}`.
+
+    Example:
+        outcome = advance_part(part, expected_step_id=int(request.POST["step_id"]), operator=request.user)
+        if outcome["result"] == "conflict":
+            ...
+    """
+    if expected_step_id is None:
+        expected_step_id = part.step_id
+    result, target = pass_target(expected_step_id, part.part_type_id)
+    if result == "error":
+        return {"result": "error", "error": target}
+
+    # The status is part of the condition too, so the WIP summary row the part leaves is exact.
+    rows = Parts.objects.filter(pk=part.pk, step_id=expected_step_id, status=part.status, archived=False)
+    now = timezone.now()
+
+    if result == "completed":
+        step_id, changes = expected_step_id, {"status": [part.status, Parts.Status.COMPLETED]}
+        values = {"status": Parts.Status.COMPLETED, "updated_at": now}
+        rows = rows.exclude(status=Parts.Status.COMPLETED)
+    else:
+        step_id, changes = target["id"], {"step": [routing_step(expected_step_id)["label"], target["label"]]}
+        values = {"step_id": step_id, "updated_at": now}
+
+    with transaction.atomic():
+        if not rows.update(**values):
+            state = Parts.objects.filter(pk=part.pk).values("step_id", "status", "archived").first()
+            if state is None:
+                return {"result": "error", "error": "Part no longer exists."}
+            return {"result": "conflict", **state}
+
+        deltas = Counter()
+        record_part_change(
+            deltas,
+            (part.order_id, expected_step_id, part.status, False),
+            (part.order_id, step_id, values.get("status", part.status), False),
+        )
+        apply_wip_deltas(deltas)
+
+        # Like advance_parts, without the save signals (the audit entry below covers the move).
+        StepTransitionLog.objects.bulk_create(
+            [StepTransitionLog(part_id=part.pk, step_id=step_id, operator=operator, timestamp=now)]
+        )
+        # update() bypasses auditlog, so record the change the way a save() would have.
+        LogEntry.objects.create(
+            actor=operator,
+            action=LogEntry.Action.UPDATE,
+            content_type=ContentType.objects.get_for_model(Parts),
+            object_pk=str(part.pk),
+            object_id=part.pk,
+            object_repr=str(part),
+            timestamp=now,
+            changes=changes,
+        )
+        # The audit entry was saved, so its signals have recorded it already.
+        status = values.get("status", part.status)
+        transaction.on_commit(lambda: after_part_moves([status], [], StepTransitionLog))
+
+    for name, value in values.items():
+        setattr(part, name, value)
+    part._wip_state = part_state(part)
+    return {"result": result, "step_id": step_id, "status": part.status}
+
+
+def apply_scan_events(events, default_operator=None):
+    """
+    Applies a batch of buffered station scans in one transaction and returns one result per event.
+
+    Replays are deduplicated by idempotency key: keys seen before return their stored outcome,
+    and repeats within the batch are reported as duplicates. The remaining events are applied
+    in scan-time order against an in-memory copy of the (locked) parts, so a part passed at three
+    consecutive steps moves three steps. Like `advance_part`, a pass only applies while the part is
+    still on the step it was scanned at, so a stale buffered scan of a part that an online station
+    has moved since is rejected instead of advancing it again. The outcome is then written
+    set-wise: one `bulk_update` of the changed parts, and `bulk_create` of transition logs,
+    equipment usage, error reports, archive reasons, audit entries and the `ScanEvent` rows that
+    make the batch idempotent.
+
+    Args:
+        events (list[dict]): Parsed events with keys `key`, `erp_id`, `action` ("pass", "fail"
+            or "archive"), `scanned_at` (aware datetime), `step_id` (the step the part was scanned
+            at; required for passes), and optionally `operator_id`, `equipment_id`,
+            `description`, `errors` (QualityErrorsList ids) and `notes`.
+        default_operator (User): Operator for events that do not name one.
+
+    Returns:
+        list[dict]: In input order, `{"key", "result", "message", "part_id", "step_id", "replayed"}`
+        where `result` is "advanced", "completed", "failed", "archived", "rejected" or "duplicate".
+
+    Raises:
+        ScanKeyConflict: If a concurrent upload stored one of the keys first; the batch is rolled
+        back and can be retried as a whole.
+    """
+    results = [None] * len(events)
+    first_index = {}
+    pending = []
+    for i, event in enumerate(events):
+        if event["key"] in first_index:
+            results[i] = _scan_result(event, "duplicate", f"Same idempotency key as event {first_index[event['key']]}.")
+        else:
+            first_index[event["key"]] = i
+            pending.append(i)
+
+    default_operator_id = getattr(default_operator, "pk", None)
+    operator_ids = set(User.objects.filter(
+        pk__in={events[i]["operator_id"] for i in pending if events[i].get("operator_id")}
+    ).values_list("pk", flat=True))
+    equipment_ids = set(Equipments.objects.filter(
+        pk__in={events[i]["equipment_id"] for i in pending if events[i].get("equipment_id")}
+    ).values_list("pk", flat=True))
+    error_ids = set(QualityErrorsList.objects.filter(
+        pk__in={pk for i in pending for pk in events[i].get("errors", [])}
+    ).values_list("pk", flat=True))
+
+    now = timezone.now()
+    with transaction.atomic():
+        parts_by_erp_id = defaultdict(list)
+        for part in (
+            Parts.objects.select_for_update(of=("self",))
+            .select_related("order", "part_type")
+            .annotate(erp_id_upper=Upper("ERP_id"))
+            .filter(erp_id_upper__in={events[i]["erp_id"].upper() for i in pending}, archived=False)
+            .order_by("pk")
+        ):
+            parts_by_erp_id[part.erp_id_upper].append(part)
+        original = {part.pk: part_state(part) for parts in parts_by_erp_id.values() for part in parts}
+
+        stored = {
+            event.idempotency_key: event
+            for event in ScanEvent.objects.filter(idempotency_key__in=[events[i]["key"] for i in pending])
+        }
+        for i in pending:
+            event = stored.get(events[i]["key"])
+            if event is not None:
+                results[i] = {
+                    "key": event.idempotency_key, "result": event.result, "message": event.message,
+                    "part_id": event.part_id, "step_id": None, "replayed": True,
+                }
+
+        changed, archived = {}, {}
+        logs, usages, reports, scan_events = [], [], [], []
+        for i in sorted((i for i in pending if results[i] is None), key=lambda i: events[i]["scanned_at"]):
+            event = events[i]
+            operator_id = event.get("operator_id") or default_operator_id
+            equipment_id = event.get("equipment_id")
+            matches = parts_by_erp_id.get(event["erp_id"].upper(), [])
+            part = matches[0] if len(matches) == 1 else None
+            worked_step_id = part.step_id if part else None
+            report = None
+
+            if not matches:
+                result, message = "rejected", "No active part with this ERP ID."
+            elif len(matches) > 1:
+                result, message = "rejected", "ERP ID matches more than one active part."
+            elif operator_id and operator_id not in operator_ids and operator_id != default_operator_id:
+                result, message = "rejected", f"Unknown operator {operator_id}."
+            elif equipment_id and equipment_id not in equipment_ids:
+                result, message = "rejected", f"Unknown equipment {equipment_id}."
+            elif part.archived:
+                result, message = "rejected", "Part was archived by an earlier scan."
+            elif event["action"] == ScanEvent.Action.PASS:
+                result, message = _apply_pass(part, event.get("step_id"))
+                if result != "rejected":
+                    logs.append(StepTransitionLog(
+                        part=part, step_id=part.step_id, operator_id=operator_id, timestamp=event["scanned_at"]
+                    ))
+            elif event["action"] == ScanEvent.Action.FAIL:
+                result, message = "failed", ""
+                report = ErrorReports(
+                    part=part,
+                    machine_id=equipment_id,
+                    operator_id=operator_id,
+                    description=event.get("description") or "Failed at scan station",
+                )
+                reports.append((report, [pk for pk in event.get("errors", []) if pk in error_ids]))
+            else:
+                result, message = "archived", ""
+                part.archived = True
+                archived[part.pk] = ArchiveReason(
+                    reason="user_error",
+                    notes=event.get("notes") or "Archived via scan station",
+                    object_id=part.pk,
+                    user_id=operator_id,
+                )
+
+            if result in ("advanced", "completed", "archived"):
+                changed[part.pk] = part
+            if result != "rejected" and equipment_id:
+                usages.append(EquipmentUsage(
+                    equipment_id=equipment_id,
+                    step_id=worked_step_id,
+                    part=part,
+                    operator_id=operator_id,
+                    error_report=report,
+                    used_at=event["scanned_at"],
+                ))
+
+            results[i] = _scan_result(event, result, message, part)
+            scan_events.append(ScanEvent(
+                idempotency_key=event["key"],
+                erp_id=event["erp_id"],
+                action=event["action"],
+                part=part,
+                step_id=event["step_id"] if event.get("step_id") and routing_step(event["step_id"]) else None,
+                operator_id=operator_id if operator_id in operator_ids or operator_id == default_operator_id else None,
+                equipment_id=equipment_id if equipment_id in equipment_ids else None,
+                scanned_at=event["scanned_at"],
+                result=result,
+                message=message,
+            ))
+
+        ErrorReports.objects.bulk_create([report for report, _ in reports])
+        ErrorReports.errors.through.objects.bulk_create([
+            ErrorReports.errors.through(errorreports_id=report.pk, qualityerrorslist_id=error_id)
+            for report, ids in reports
+            for error_id in ids
+        ])
+        EquipmentUsage.objects.bulk_create(usages, batch_size=1000)
+        StepTransitionLog.objects.bulk_create(logs, batch_size=1000)
+
+        deltas = Counter()
+        for part in changed.values():
+            part.updated_at = now
+            record_part_change(deltas, original[part.pk], part_state(part))
+        Parts.objects.bulk_update(list(changed.values()), ["step", "status", "archived", "updated_at"], batch_size=500)
+        apply_wip_deltas(deltas)
+
+        content_type = ContentType.objects.get_for_model(Parts)
+        if archived:
+            ArchiveReason.objects.filter(content_type=content_type, object_id__in=archived).delete()
+            for reason in archived.values():
+                reason.content_type = content_type
+            ArchiveReason.objects.bulk_create(archived.values())
+
+        # bulk_update() bypasses auditlog, so record each part's net change the way save() would have.
+        log_entries = LogEntry.objects.bulk_create([
+            LogEntry(
+                actor=default_operator,
+                action=LogEntry.Action.UPDATE,
+                content_type=content_type,
+                object_pk=str(part.pk),
+                object_id=part.pk,
+                object_repr=str(part),
+                timestamp=now,
+                changes=_part_changes(original[part.pk], part),
+                additional_data={"source": "scan upload"},
+            )
+            for part in changed.values()
+        ])
+        try:
+            with transaction.atomic():
+                ScanEvent.objects.bulk_create(scan_events, batch_size=1000)
+        except IntegrityError:
+            if ScanEvent.objects.filter(idempotency_key__in=[event.idempotency_key for event in scan_events]).exists():
+                raise ScanKeyConflict("Another upload stored some of these scans first.")
+            raise
+
+        statuses = {part.status for part in changed.values()}
+        transaction.on_commit(lambda: after_part_moves(
+            statuses, log_entries, StepTransitionLog, EquipmentUsage, ErrorReports, ArchiveReason, ScanEvent
+        ))
+
+    return results
+
+
+def _apply_pass(part, expected_step_id):
+    """Advances an in-memory part by one step if it is still on `expected_step_id`, returning `(result, message)`."""
+    if part.step_id != expected_step_id:
+        current = routing_step(part.step_id) if part.step_id else None
+        return "rejected", f"Part was moved to {current['label'] if current else 'another step'} since it was scanned."
+    result, target = pass_target(part.step_id, part.part_type_id)
+    if result == "error":
+        return "rejected", target
+    if result == "completed":
+        if part.status == Parts.Status.COMPLETED:
+            return "rejected", "Part is already completed."
+        part.status = Parts.Status.COMPLETED
+    else:
+        part.step_id = target["id"]
+    return result, ""
+
+
+def _part_changes(original, part):
+    _, step_id, status, _ = original
+    changes = {}
+    if step_id != part.step_id:
+        steps = [routing_step(pk) if pk else None for pk in (step_id, part.step_id)]
+        changes["step"] = [step["label"] if step else None for step in steps]
+    if status != part.status:
+        changes["status"] = [status, part.status]
+    if part.archived:
+        changes["archived"] = ["False", "True"]
+    return changes
+
+
+def _scan_result(event, result, message, part=None):
+    return {
+        "key": event["key"],
+        "result": result,
+        "message": message,
+        "part_id": part.pk if part else None,
+        "step_id": part.step_id if part else None,
+        "replayed": False,
+    }
+
+
+def after_bulk_write(*models):
+    """
+    Invalidates table caches that signals would have, for writes made with `update()`/`bulk_create()`.
+
+    Pass `LogEntry` too when audit entries were bulk-created, so audit log tables and history
+    views stop serving fragments cached before the write.
+    """
+    bump_model_version(*models)
+    for model in models:
+        invalidate_facets(model)
+
+
+def after_part_moves(statuses, log_entries, *models):
+    """
+    Refreshes table caches after parts moved to another step or status with `update()`/`bulk_update()`.
+
+    Does what `after_bulk_write(Parts, LogEntry, *models)` would, except that the cached filter
+    dropdowns of parts and the audit log are kept: a move changes no value another table
+    filters on, so the statuses the parts now have and the bulk-created `log_entries` are folded
+    in instead (`record_values`).
+    """
+    bump_model_version(Parts, LogEntry)
+    record_values(Parts, {"status": statuses})
+    record_created(LogEntry, log_entries)
+    after_bulk_write(*models)
+
+
+def summarize(report):
+    """Counts outcomes in a transition report, e.g. {"advanced": 40, "completed": 2, "error": 1}."""
+    counts = defaultdict(int)
+    for outcome in report.values():
+        counts[outcome["result"]] += 1
+    return dict(counts)
@@ -1,28 +1,54 @@
-import csv
-import io
 import os
+import re
 import uuid
+from datetime import datetime, timedelta
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
 from django.utils.timezone import now
 from auditlog.models import LogEntry
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import Http404, HttpResponse, JsonResponse, FileResponse
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, FileResponse, \
+    StreamingHttpResponse
 from django.shortcuts import render, redirect, get_list_or_404, get_object_or_404
+from django.urls import reverse
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date, parse_datetime
 from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views import View
 from django.views.generic import FormView
+from django.views.decorators.http import require_POST
 from django.apps import apps
 from Tracker.models import Parts, Orders, PartTypes, Steps, User, Companies, Equipments, ErrorReports, \
-    QualityErrorsList, Processes, Documents, StepTransitionLog
+    QualityErrorsList, Processes, Documents, Job
 from Tracker.forms import DealForm, PartTypeForm, ProcessForm, LineItemForm, LineItemFormSet, PartDocForm, \
     ErrorReportForm, PartFormSet
+from Tracker.analytics_export import DATASETS as ANALYTICS_DATASETS, dataset_rows, iter_arrow_stream
+from Tracker.archiving import archive_order
+from Tracker.jobs import enqueue
+from Tracker.part_generation import generate_parts, number_line_items
+from Tracker.part_import import DEFAULT_EXPORT_COLUMNS, IMPORT_FIELDS, CsvFormatError, apply_order_diff, \
+    diff_order_parts, import_part_updates, part_export_queryset
+from Tracker.routing import routing_step, step_choices
+from Tracker.tables.config import TABLE_CONFIG, resolve_table_model
+from Tracker.tables.counts import EstimatedCountPaginator
+from Tracker.tables.export import export_columns, gzip_stream, iter_csv
+from Tracker.tables.facets import facet_counts, facet_values
+from Tracker.tables.pagination import KeysetPaginator
+from Tracker.tables.query_plan import apply_query_plan
+from Tracker.tables.search import search_queryset
+from Tracker.tables.versions import get_cached_fragment, set_cached_fragment, table_etag
+from Tracker.transition_log import MAX_REPORT_DAYS
+from Tracker.transitions import advance_parts, summarize
+from Tracker.wip import order_progress, order_steps, status_counts
+
+DEAL_VIEW_PART_LIMIT = 200
+"""Most parts listed individually on the order detail page; progress covers the rest."""
 
 
 @login_required
@@ -51,14 +77,17 @@ def tracker(request):
 
     Context:
         {
-            "parts": QuerySet of Parts relevant to the user (all if staff, or filtered by ownership),
-            "deals": QuerySet of Orders relevant to the user (all if staff, or filtered by customer)
+            "deals": QuerySet of Orders relevant to the user (all if staff, or filtered by customer),
+            "has_deals": bool,
+            "part_counts": Dict[str, int] (active parts per status, from the WIP summary),
+            "part_total": int
         }
 
     Notes:
         - Authentication is required; view is gated by `@login_required`.
         - Staff users get full access to all deals and parts.
         - Customers (non-staff users) only see deals and parts assigned to them.
+        - Part counts come from `WipSummary` rows rather than aggregating over `Parts`.
         - May be used as a user landing page or activity overview.
 
     Example:
@@ -68,15 +97,17 @@ def tracker(request):
     user = request.user
     if user.is_authenticated:
         if user.is_staff:
-            parts = Parts.objects.all()
-            context.update({'parts': parts})
             deals = Orders.objects.all()
-            context.update({'deals': deals})
+            part_counts = status_counts()
         else:
             deals = Orders.objects.filter(customer=user)
-            context.update({'deals': deals})
-            parts = Parts.objects.filter(order__customer=user)
-            context.update({'parts': parts})
+            part_counts = status_counts(order_ids=deals.values("pk"))
+        context.update({
+            'deals': deals,
+            'has_deals': deals.exists(),
+            'part_counts': part_counts,
+            'part_total': sum(part_counts.values()),
+        })
     return render(request, template_name='tracker/tracker.html', context=context)
 
 
@@ -156,7 +187,6 @@ def deal_view(request, order_id):
     Raises:
         Http404:
             - If the order does not exist.
-            - If no parts are found for the order.
 
     Template:
         tracker/deal_view.html
@@ -164,11 +194,13 @@ def deal_view(request, order_id):
     Context:
         {
             "deal": Orders instance,
-            "parts": List[Parts] (all parts associated with the order)
+            "progress": List[Dict] (active part counts per step and status, from the WIP summary),
+            "part_total": int,
+            "parts": List[Parts] (the first `DEAL_VIEW_PART_LIMIT` active parts of the order)
         }
 
     Notes:
-        - Uses `get_list_or_404` for parts, which raises a 404 if there are no parts for the order.
+        - Progress is read from `WipSummary` rows instead of loading and counting every part.
         - Accessible only to authenticated users — may want to further restrict based on ownership or role.
         - This view serves as a centralized summary for an order and its part progress/status.
 
@@ -176,10 +208,12 @@ def deal_view(request, order_id):
         <a href="{% url 'deal_view' order.id %}">View Order Details</a>
     """
     context = {}
-    deal = get_object_or_404(Orders, id=order_id)
+    deal = get_object_or_404(Orders.objects.select_related("customer", "company"), id=order_id)
     context.update({'deal': deal})
-    parts = get_list_or_404(Parts, order_id=order_id)
-    context.update({'parts': parts})
+    progress = order_steps(order_id)
+    context.update({'progress': progress, 'part_total': sum(row["count"] for row in progress)})
+    parts = Parts.objects.filter(order_id=order_id, archived=False).select_related("order", "part_type").order_by("pk")
+    context.update({'parts': parts[:DEAL_VIEW_PART_LIMIT]})
 
     return render(request, 'tracker/deal_view.html', context=context)
 
@@ -333,7 +367,7 @@ def edit_part(request, part_id):
 
     context = {
         'part': part,
-        'part_types': PartTypes.objects.all(), 'steps': Steps.objects.filter(part_type_id=part.part_type.id),
+        'part_types': PartTypes.objects.all(), 'steps': step_choices(part.part_type_id),
         'employees': User.objects.filter(groups__name='Employees'),
         'customers': User.objects.filter(groups__name='Customers'),
         'Dealss': Orders.objects.all(),
@@ -408,9 +442,10 @@ class qa_page(View):
 
     POST:
         - Handles actions for a single part, based on `part_id` and `action`:
-            - `"Pass"`: Moves the part to the next step (via `increment_step()`), and logs the transition.
+            - `"Pass"`: Moves the part to the next step (via `advance_step()`), and logs the transition.
             - `"Error"`: Redirects to the error reporting form.
             - `"Archive"`: Archives the part with a predefined reason and logs the action.
+        - Responds 400 if `part_id`, or the `step_id` a pass was rendered with, is not a number.
 
     Raises:
         Http404: If the submitted `part_id` does not correspond to an existing part.
@@ -434,7 +469,8 @@ class qa_page(View):
 
     Notes:
         - Access is restricted to staff users.
-        - The `Pass` action calls `part.increment_step()` and logs a `StepTransitionLog`.
+        - The `Pass` action calls `part.advance_step()` against the step the row was rendered with,
+          and reports a conflict if another station moved the part first.
         - The `Error` action redirects to `error_form`, preserving part context.
         - The `Archive` action uses `part.archive()` with a standard reason and notes.
         - You may want to add search/filter features in the future.
@@ -444,14 +480,15 @@ class qa_page(View):
     """
 
     def get(self, request):
-        parts = Parts.objects.filter(archived=False).order_by('id')
+        fields = ["ERP_id", "part_type", "order.company.name", "order.customer", "step", "status"]
+        parts = apply_query_plan(Parts.objects.filter(archived=False).order_by('id'), fields)
 
-        paginator = Paginator(parts, 25)
+        paginator = EstimatedCountPaginator(parts, 25)
         page_obj = paginator.get_page(request.GET.get("page"))
 
         context = {
             "headers": ["ERP ID", "Part Type", "Company", "Customer", "Step", "Status"],
-            "fields": ["ERP_id", "part_type", "order.company.name", "order.customer", "step", "status"],
+            "fields": fields,
             "rows": page_obj.object_list,
             "page_obj": page_obj,
             "table_id": "qa-parts-table",
@@ -464,20 +501,32 @@ class qa_page(View):
         return render(request, 'tracker/QA.html', context)
 
     def post(self, request, *args, **kwargs):
-        part = get_object_or_404(Parts, id=request.POST.get('part_id'))
+        part_id, expected_step_id = request.POST.get("part_id", ""), request.POST.get("step_id", "")
+        if not part_id.isdigit() or (expected_step_id and not expected_step_id.isdigit()):
+            return HttpResponseBadRequest("part_id and step_id must be numbers.")
+        part = get_object_or_404(Parts.objects.select_related("order", "part_type"), id=int(part_id))
         action = request.POST.get("action")
 
         if action == "Pass":
-            try:
-                result = part.increment_step()
-                StepTransitionLog.objects.create(part=part, step=part.step, operator=request.user)
-
-                if result == "completed":
-                    messages.success(request, f"Part {part.ERP_id} marked as completed.")
-                else:
-                    messages.info(request, f"Part {part.ERP_id} moved to next step.")
-            except ValueError as e:
-                messages.error(request, f"Could not advance step: {str(e)}")
+            outcome = part.advance_step(
+                expected_step_id=int(expected_step_id) if expected_step_id else None,
+                operator=request.user,
+            )
+
+            if outcome["result"] == "completed":
+                messages.success(request, f"Part {part.ERP_id} marked as completed.")
+            elif outcome["result"] == "advanced":
+                messages.info(request, f"Part {part.ERP_id} moved to next step.")
+            elif outcome["result"] == "conflict":
+                step = routing_step(outcome["step_id"]) if outcome["step_id"] else None
+                state = "archived" if outcome["archived"] else f"{step['label'] if step else 'no step'} ({outcome['status']})"
+                messages.warning(
+                    request,
+                    f"Part {part.ERP_id} was already updated by another station and is now {state}. "
+                    f"Nothing was changed; check the part and pass it again if needed.",
+                )
+            else:
+                messages.error(request, f"Could not advance step: {outcome['error']}")
 
         elif action == "Error":
             return redirect('error_form', part_id=part.id)
@@ -610,19 +659,22 @@ def qa_orders(request):
 
     Context:
         {
-            "deals": QuerySet of all Orders
+            "deals": List of all Orders, each with a `wip` dict ({"active": int, "completed": int})
         }
 
     Notes:
         - Restricted to staff users only.
         - Consider filtering the queryset to only include active or relevant orders (e.g., not archived).
-        - You may want to extend this to include additional metadata like counts of parts, status flags, or recent QA activity.
+        - Part counts per order come from one aggregate over `WipSummary` rows.
 
     Example:
         <a href="{% url 'qa_orders' %}">QA Orders</a>
     """
     context = {}
-    deals = Orders.objects.all()
+    deals = list(Orders.objects.select_related("company", "customer"))
+    progress = order_progress([deal.pk for deal in deals])
+    for deal in deals:
+        deal.wip = progress[deal.pk]
     context["deals"] = deals
 
     return render(request, 'tracker/qa_orders.html', context=context)
@@ -672,6 +724,7 @@ def bulk_edit_parts(request, order_id):
     return render(request, 'tracker/bulk_edit.html', context=context)
 
 
+@staff_member_required(login_url="login")
 def archive_deal(request, order_id):
     """
     View Name: archive_deal
@@ -680,7 +733,7 @@ def archive_deal(request, order_id):
         path('orders/<int:order_id>/archive/', views.archive_deal, name='archive_deal')
 
     Decorators:
-        None
+        @staff_member_required(login_url="login")
 
     Purpose:
         Archives an `Order` (deal) and all associated `Parts`. This is a soft-delete approach that marks
@@ -700,22 +753,16 @@ def archive_deal(request, order_id):
         None
 
     Notes:
-        - Sets the `archived` field to `True` on the `Orders` instance.
-        - Also bulk-updates all `Parts` linked via `deal` to set `archived=True`.
+        - Archives the `Orders` instance and all of its `Parts` via `archive_order()`: one UPDATE for the
+          parts, bulk-created `ArchiveReason` rows, and one summary audit entry on the order.
         - The redirect still goes to `deal_view`, which may need to account for archived deals in its logic.
-        - No authentication or permission checks are included—should be enforced externally.
 
     Example:
         <a href="{% url 'archive_deal' order.id %}">Archive Order</a>
     """
     deal = get_object_or_404(Orders, id=order_id)
-
-    # Set deal as archived
-    deal.archived = True
-    deal.save()
-
-    # Archive all related parts
-    Parts.objects.filter(deal=deal).update(archived=True)
+    archived = archive_order(deal, user=request.user, notes="Archived with order")
+    messages.success(request, f"{deal.name} archived with {len(archived)} parts.")
 
     return redirect('deal_view', order_id=deal.id)
 
@@ -871,12 +918,15 @@ class OrderCreateView(View):
         - Expects valid DealForm and LineItemFormSet data.
         - For each line item with valid data, creates `Parts` based on quantity, part type, and process.
         - Each part gets a generated ERP ID using the part type’s ID prefix and enumeration start.
+        - Parts are created in bulk by `generate_parts`; the outcome is reported with Django messages.
+        - Above `BACKGROUND_PART_THRESHOLD` parts, a background job is queued instead and the user is
+          redirected to the edit page, which polls the job's progress.
 
     Raises:
-        None directly, but silently skips parts where:
+        None directly, but skips (and reports) parts where:
             - Required data is missing
             - `Steps(step=1)` for the process does not exist
-            - `Parts.objects.create(...)` raises an exception
+            - The ERP ID is already used by an active part, or repeated within the request
 
     Templates:
         tracker/deal_form.html
@@ -889,10 +939,11 @@ class OrderCreateView(View):
         }
 
     Notes:
-        - Uses `enumeration_start` to number newly created parts.
+        - Uses `enumeration_start` to number newly created parts; without it, numbers are reserved
+          from the prefix's `ErpIdSequence` so they never collide with other orders.
         - Automatically links each created part to the first step in the selected process.
         - ERP IDs follow the format `{ID_prefix}-{number}`, defaulting to "PART" if prefix is missing.
-        - Logs part creation errors to the console with `print()` — consider using logging in production.
+        - ERP ID collisions are checked for all line items in one query before anything is written.
 
     Example Usage:
         <a href="{% url 'order_create' %}">Create New Order</a>
@@ -914,30 +965,9 @@ class OrderCreateView(View):
         if order_form.is_valid() and lineitem_formset.is_valid():
             order = order_form.save()
 
-            for form in lineitem_formset:
-                quantity = form.cleaned_data.get("quantity")
-                part_type = form.cleaned_data.get("part_type")
-                process = form.cleaned_data.get("process")
-                enumeration_start = form.cleaned_data.get("enumeration_start") or 1
-
-                if quantity and part_type and process:
-                    try:
-                        first_step = Steps.objects.get(process=process, step=1)
-                    except Steps.DoesNotExist:
-                        continue
-
-                    for i in range(quantity):
-                        erp_id = f"{part_type.ID_prefix or 'PART'}-{enumeration_start + i}"
-                        try:
-                            Parts.objects.create(
-                                ERP_id=erp_id,
-                                part_type=part_type,
-                                step=first_step,
-                                order=order,
-                            )
-                        except Exception as e:
-                            print(f"Error creating part {erp_id}: {e}")
-                            continue
+            job = create_line_item_parts(request, order, lineitem_formset)
+            if job:
+                return redirect(f"{reverse('deal_edit', args=[order.id])}?job={job.pk}")
 
             return redirect("deal_view", order_id=order.id)
 
@@ -950,6 +980,67 @@ class OrderCreateView(View):
 
 PART_EDIT_THRESHOLD = 200
 
+CSV_IMPORT_DIR = "part_imports"
+"""Storage directory holding uploaded part list CSVs between preview and confirmation."""
+
+CSV_PREVIEW_ROWS = 20
+"""Example rows shown per change type in the CSV import preview."""
+
+
+BACKGROUND_PART_THRESHOLD = 2000
+"""Line items generating more parts than this in total are created by a background job."""
+
+
+def create_line_item_parts(request, order, lineitem_formset):
+    """
+    Creates the parts for a submitted line item formset.
+
+    Small submissions are generated in the request and reported with messages; above
+    `BACKGROUND_PART_THRESHOLD` parts a `generate_parts` job is queued instead.
+
+    Returns:
+        Job | None: The queued job, if the parts are generated in the background.
+    """
+    items = [
+        form.cleaned_data for form in lineitem_formset
+        if form.cleaned_data.get("quantity") and form.cleaned_data.get("part_type") and form.cleaned_data.get("process")
+    ]
+    user = request.user if request.user.is_authenticated else None
+    if sum(item["quantity"] for item in items) <= BACKGROUND_PART_THRESHOLD:
+        report_generated_parts(request, generate_parts(order, items, user=user))
+        return None
+    number_line_items(items)
+    return enqueue(
+        "generate_parts",
+        {
+            "order_id": order.pk,
+            "line_items": [
+                {
+                    "part_type_id": item["part_type"].pk,
+                    "process_id": item["process"].pk,
+                    "quantity": item["quantity"],
+                    "enumeration_start": item.get("enumeration_start"),
+                }
+                for item in items
+            ],
+            "user_id": user.pk if user else None,
+        },
+        user=user,
+    )
+
+
+def report_generated_parts(request, report):
+    """Turns a `generate_parts` report into success and warning messages."""
+    if report["created"]:
+        messages.success(request, f"Created {report['created']} parts.")
+    skipped = [entry["erp_id"] for entry in report["skipped"] if "erp_id" in entry]
+    if skipped:
+        shown = ", ".join(skipped[:10]) + (" …" if len(skipped) > 10 else "")
+        messages.warning(request, f"Skipped {len(skipped)} parts with ERP IDs already in use: {shown}")
+    for entry in report["skipped"]:
+        if "erp_id" not in entry:
+            messages.warning(request, f"Skipped {entry['part_type']} parts: {entry['process']} {entry['reason']}.")
+
 
 class OrderUpdateView(View):
     """
@@ -994,7 +1085,8 @@ class OrderUpdateView(View):
 
     Notes:
         - Uses `PART_EDIT_THRESHOLD` to decide between inline editing vs. CSV upload mode.
-        - CSV upload logic is currently stubbed out and should be implemented under the POST flow.
+        - In CSV mode an upload is the order's complete part list: it is diffed against the active parts
+          (create, update, archive) and the diff is shown for confirmation before anything is written.
         - Assumes authenticated access but does not enforce it via decorator — ensure proper URL protection.
         - Uses `LineItemFormSet` for dynamic line item creation, rendered even if part_formset is not shown.
 
@@ -1015,28 +1107,32 @@ class OrderUpdateView(View):
             part_formset = None
             use_csv = True
 
+        job_id = request.GET.get("job", "")
+        job = Job.objects.filter(pk=job_id, params__order_id=order.id).first() if job_id.isdigit() else None
+
         return render(request, "tracker/deal_form.html", {
             "deal_form": order_form,
             "part_formset": part_formset,
             "lineitem_formset": lineitem_formset,
             "use_csv": use_csv,
             "deal": order,
+            "job": job,
         })
 
     def post(self, request, order_id):
-        lineitem_formset = LineItemFormSet(prefix="lineitem")
+        lineitem_formset = LineItemFormSet(request.POST, prefix="lineitem")
         order = get_object_or_404(Orders, pk=order_id)
         order_form = DealForm(request.POST, instance=order)
         parts_qs = Parts.objects.filter(order=order, archived=False)
 
         # Handle CSV if part count is high
         if parts_qs.count() > PART_EDIT_THRESHOLD:
+            if "import_token" in request.POST:
+                return self.apply_csv(request, order)
             if order_form.is_valid():
                 order_form.save()
-                # Handle CSV upload (stub for now)
                 if "csv_file" in request.FILES:
-                    # Handle CSV parsing logic here
-                    pass
+                    return self.preview_csv(request, order, request.FILES["csv_file"])
                 return redirect("deal_view", order_id=order.id)
             return render(request, "tracker/deal_form.html", {
                 "deal_form": order_form,
@@ -1051,40 +1147,94 @@ class OrderUpdateView(View):
             order_form.save()
             part_formset.save()
 
-            for form in lineitem_formset:
-                quantity = form.cleaned_data.get("quantity")
-                part_type = form.cleaned_data.get("part_type")
-                process = form.cleaned_data.get("process")
-                enumeration_start = form.cleaned_data.get("enumeration_start") or 1
-
-                if quantity and part_type and process:
-                    try:
-                        first_step = Steps.objects.get(process=process, step=1)
-                    except Steps.DoesNotExist:
-                        continue
-
-                    for i in range(quantity):
-                        erp_id = f"{part_type.ID_prefix or 'PART'}-{enumeration_start + i}"
-                        try:
-                            Parts.objects.create(
-                                ERP_id=erp_id,
-                                part_type=part_type,
-                                step=first_step,
-                                order=order,
-                            )
-                        except Exception as e:
-                            print(f"Error creating part {erp_id}: {e}")
-                            continue
+            job = create_line_item_parts(request, order, lineitem_formset)
+            if job:
+                return redirect(f"{reverse('deal_edit', args=[order.id])}?job={job.pk}")
 
             return redirect("deal_view", order_id=order.id)
 
         return render(request, "tracker/deal_form.html", {
             "deal_form": order_form,
             "part_formset": part_formset,
+            "lineitem_formset": lineitem_formset,
             "use_csv": False,
             "deal": order,
         })
 
+    def preview_csv(self, request, order, upload):
+        """
+        Shows the set-wise diff a full part list CSV would make, without changing anything.
+
+        The upload is kept in storage under an opaque token until it is confirmed or cancelled.
+        """
+        try:
+            diff = diff_order_parts(order, upload)
+        except CsvFormatError as e:
+            messages.error(request, f"Could not read the CSV: {e}")
+            return redirect("deal_edit", order_id=order.id)
+
+        upload.seek(0)
+        token = default_storage.save(f"{CSV_IMPORT_DIR}/{order.id}-{uuid.uuid4().hex}.csv", upload)
+        return render(request, "tracker/parts_import_preview.html", {
+            "deal": order,
+            "diff": diff,
+            "token": token,
+            "creates": diff["create"][:CSV_PREVIEW_ROWS],
+            "updates": [
+                {"erp_id": part[1], "changes": [
+                    (field, part[2 + IMPORT_FIELDS.index(field)], value) for field, value in changes.items()
+                ]}
+                for part, changes in diff["update"][:CSV_PREVIEW_ROWS]
+            ],
+            "archives": [part[1] for part in diff["archive"][:CSV_PREVIEW_ROWS]],
+            "preview_rows": CSV_PREVIEW_ROWS,
+        })
+
+    def apply_csv(self, request, order):
+        """Applies (or discards) a previewed CSV upload identified by its token."""
+        token = request.POST["import_token"]
+        if not re.fullmatch(rf"{CSV_IMPORT_DIR}/{order.id}-[0-9a-f]{{32}}\.csv", token) or not default_storage.exists(token):
+            messages.error(request, "That upload has expired; please upload the CSV again.")
+            return redirect("deal_edit", order_id=order.id)
+
+        try:
+            if "confirm_import" in request.POST:
+                user = request.user if request.user.is_authenticated else None
+                with default_storage.open(token, "rb") as upload:
+                    diff = apply_order_diff(order, upload, user=user)
+                messages.success(
+                    request,
+                    f"Created {len(diff['create'])}, updated {len(diff['update'])} and archived "
+                    f"{len(diff['archive'])} parts; {len(diff['errors'])} rows skipped.",
+                )
+        except CsvFormatError as e:
+            messages.error(request, f"Could not read the CSV: {e}")
+        finally:
+            default_storage.delete(token)
+        return redirect("deal_view", order_id=order.id)
+
+
+@staff_member_required(login_url="login")
+def job_status(request, job_id):
+    """
+    View Name: job_status
+
+    URL Pattern:
+        path('jobs/<int:job_id>/', views.job_status, name='job_status')
+
+    Decorators:
+        - @staff_member_required(login_url="login")
+
+    Purpose:
+        Renders a background job's progress for HTMX polling. The fragment polls itself while the
+        job is queued or running and renders the final report, without polling, once it finishes.
+
+    Templates:
+        tracker/partials/job_progress.html
+    """
+    job = get_object_or_404(Job, pk=job_id)
+    return render(request, "tracker/partials/job_progress.html", {"job": job})
+
 
 def add_parttype_partial(request):
     """
@@ -1475,39 +1625,43 @@ def export_parts_csv(request, order_id):
         request (HttpRequest): The HTTP request object.
         order_id (int): The ID of the order whose parts should be exported.
 
+    GET Parameters:
+        columns (str): Optional comma-separated columns from `PART_EXPORT_COLUMNS`, e.g.
+            "ERP_id,part_type,step,entered_step_at". Defaults to `ERP_id,part_type_id,step_id,status`,
+            the format `upload_parts_csv` reads.
+        compress (str): "gzip" to download a gzip-compressed `.csv.gz`.
+
     Raises:
-        None
+        None (unknown columns return 400 Bad Request)
 
     Template:
-        None (returns a streamed CSV file via HttpResponse)
+        None (returns a StreamingHttpResponse)
 
     Context:
         None
 
     Notes:
         - Filters out archived parts automatically.
-        - The CSV includes columns: `ERP_id`, `part_type_id`, `step_id`, `status`.
+        - Rows are streamed from one `values_list().iterator()` query with joined names, so memory use is
+          constant however many parts the order has.
         - Sets the `Content-Disposition` header to trigger a file download with a filename format like `order_123_parts.csv`.
 
     Example:
-        <a href="{% url 'export_parts_csv' order.id %}">Download Parts CSV</a>
+        <a href="{% url 'export_parts_csv' order.id %}?columns=ERP_id,step,entered_step_at&compress=gzip">Download Parts CSV</a>
     """
-    parts = Parts.objects.filter(order_id=order_id, archived=False)
-
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = f'attachment; filename="order_{order_id}_parts.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(["ERP_id", "part_type_id", "step_id", "status"])
-
-    for part in parts:
-        writer.writerow([
-            part.ERP_id,
-            part.part_type_id,
-            part.step_id,
-            part.status
-        ])
-
+    columns = [column.strip() for column in request.GET.get("columns", "").split(",") if column.strip()]
+    try:
+        parts, paths = part_export_queryset(order_id, columns or DEFAULT_EXPORT_COLUMNS)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    filename = f"order_{order_id}_parts.csv"
+    if request.GET.get("compress") == "gzip":
+        response = StreamingHttpResponse(gzip_stream(iter_csv(parts, paths)), content_type="application/gzip")
+        filename += ".gz"
+    else:
+        response = StreamingHttpResponse(iter_csv(parts, paths), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
 
@@ -1540,9 +1694,10 @@ def upload_parts_csv(request, order_id):
 
     Notes:
         - Only processes the CSV if the request method is POST and contains a file under the key "csv_file".
-        - Expects the CSV to have columns: `ERP_id`, `part_type_id`, `step_id`, and `status`.
-        - Silently skips rows where `Parts` with the given `ERP_id` and `order` do not exist.
-        - Does not perform validation beyond simple existence and ID assignment.
+        - Expects an `ERP_id` column plus any of `part_type_id`, `step_id` and `status`; blank cells leave
+          the field unchanged.
+        - The upload is streamed and applied in one transaction by `import_part_updates`; rows with unknown
+          ERP IDs, part types, steps or statuses are skipped and listed in the row-level error report.
         - Can be used in a form with enctype="multipart/form-data".
 
     Example:
@@ -1555,23 +1710,90 @@ def upload_parts_csv(request, order_id):
     order = get_object_or_404(Orders, pk=order_id)
 
     if request.method == "POST" and "csv_file" in request.FILES:
-        file = request.FILES["csv_file"]
-        decoded_file = file.read().decode("utf-8")
-        reader = csv.DictReader(io.StringIO(decoded_file))
-
-        for row in reader:
-            try:
-                part = Parts.objects.get(order=order, ERP_id=row["ERP_id"])
-                part.part_type_id = row["part_type_id"]
-                part.step_id = row["step_id"]
-                part.status = row["status"]
-                part.save()
-            except Parts.DoesNotExist:
-                continue  # Skip invalid ERP IDs
+        user = request.user if request.user.is_authenticated else None
+        try:
+            report = import_part_updates(order, request.FILES["csv_file"], user=user)
+        except CsvFormatError as e:
+            messages.error(request, f"Could not read the CSV: {e}")
+            return redirect("deal_view", order_id=order.id)
+
+        messages.success(
+            request, f"Updated {report['updated']} of {report['rows']} parts ({report['unchanged']} unchanged)."
+        )
+        if report["errors"]:
+            return render(request, "tracker/parts_import_report.html", {"deal": order, "report": report})
 
     return redirect("deal_view", order_id=order.id)
 
 
+def table_queryset(request, model_name, Model, config):
+    """
+    Builds the queryset behind a generic table exactly as the user currently sees it.
+
+    Applies, in order: the configured join plan, the archived filter, customer visibility
+    scoping, the `q` search, the dropdown filters, and the `sort`/`direction` ordering.
+    Shared by `generic_table_view` and `export_table_view` so an export always matches the view.
+
+    Parameters:
+        request (HttpRequest): The HTTP request carrying the table's GET parameters.
+        model_name (str): The TABLE_CONFIG key of the table.
+        Model (Model): The resolved model class.
+        config (dict): The TABLE_CONFIG entry.
+
+    Raises:
+        Http404: If a non-staff user requests a table they have no scoped access to.
+
+    Returns:
+        tuple: (queryset, query, sort, direction, filtered), where `sort` is None when the
+        default id ordering applies and `filtered` is True if a search or filter is active.
+    """
+    qs = apply_query_plan(Model.objects.all().order_by("id"), config["fields"])
+
+    # Only show non-archived items if applicable
+    if "archived" in [field.name for field in Model._meta.fields]:
+        qs = qs.filter(archived=False)
+
+    # Restrict customer visibility
+    if not request.user.is_staff:
+        if model_name == "Orders":
+            qs = qs.filter(customer=request.user)
+        elif model_name == "Parts":
+            qs = qs.filter(order__customer=request.user)
+        else:
+            raise Http404("Unknown model.")
+
+    # Search
+    query = request.GET.get("q", "")
+    ranked = False
+    if query:
+        qs, ranked = search_queryset(qs, config["search_fields"], query)
+
+    # Filters
+    filtered = bool(query)
+    for field in config.get("filter_fields", []):
+        value = request.GET.get(field)
+        if value:
+            qs = qs.filter(**{field: value})
+            filtered = True
+
+    sort = request.GET.get("sort")
+    direction = request.GET.get("direction", "asc")
+
+    if sort and sort in config["fields"]:
+        if direction == "desc":
+            qs = qs.order_by(f"-{sort}")
+        else:
+            qs = qs.order_by(sort)
+    elif ranked:
+        # Best matches first when searching without an explicit sort column
+        sort, direction = "search_rank", "desc"
+        qs = qs.order_by("-search_rank", "id")
+    else:
+        sort = None
+
+    return qs, query, sort, direction, filtered
+
+
 @login_required
 def generic_table_view(request, model_name):
     """
@@ -1589,7 +1811,7 @@ def generic_table_view(request, model_name):
 
     Parameters:
         request (HttpRequest): The HTTP request object.
-        model_name (str): The name of the model to render in table form. Must exist in the CONFIG dict.
+        model_name (str): The name of the model to render in table form. Must exist in TABLE_CONFIG.
 
     Raises:
         Http404: If the model is not configured or invalid.
@@ -1602,12 +1824,14 @@ def generic_table_view(request, model_name):
             "headers": List[str],               # Table headers
             "fields": List[str],                # Fields to display in the table rows
             "rows": QuerySet,                   # Paginated queryset of model instances
-            "page_obj": Page,                   # Paginator object for rendering pagination controls
+            "page_obj": Page|KeysetPage,        # Paginator object for rendering pagination controls
+            "querystring": str,                 # Current GET params minus page/cursor, for pagination links
             "table_id": str,                    # A unique table ID used in HTML
             "link_prefix": str,                 # Prefix used for row links/actions
             "query": str,                       # The current search query string
             "filter_fields": List[str],         # List of fields with dropdown filters
             "filter_values": Dict[str, List],   # Values for filter dropdowns
+            "filter_counts": Dict[str, Dict],   # Per-value row counts for the current query, if enabled
             "model_name": str,                  # The name of the model being displayed
             "qa_mode": bool,                    # Whether the QA row actions should be shown
             "edit_mode": bool,                  # Whether edit row actions should be shown
@@ -1618,160 +1842,72 @@ def generic_table_view(request, model_name):
         - Access is restricted to authenticated users.
         - Non-staff users can only see their own Orders or Parts, if applicable.
         - Supports optional query filtering via `q` GET parameter and multiple field filters.
+          Search goes through `Tracker.tables.search`: indexed, ranked prefix search on PostgreSQL for
+          models with a search vector, `icontains` across `search_fields` otherwise.
         - Uses different row action templates depending on `qa_mode` or `edit_mode` GET parameters.
-        - Relies on a predefined CONFIG dictionary mapping model names to rendering details.
+        - Relies on `Tracker.tables.config.TABLE_CONFIG` mapping model names to rendering details.
+        - Responses carry an ETag built by `Tracker.tables.versions.table_etag` from the request
+          parameters, user scope and per-model change counters. A matching `If-None-Match` gets a 304,
+          and a repeat request from another tab is served from the cached fragment.
+        - Dropdown values come from `Tracker.tables.facets`, cached per model and field and kept
+          current by save/delete signals, instead of a DISTINCT over the whole table per request.
+        - Joins and the column projection are derived from the configured fields by
+          `Tracker.tables.query_plan`, so rendering a page does not lazily load relations per row.
+        - Models with `cursor_pagination` in TABLE_CONFIG are paged by keyset on (sort column, id) using an
+          opaque `cursor` GET parameter instead of `page`, so deep pages cost the same as the first
+          and no COUNT(*) is issued. Other models are counted through `Tracker.tables.counts`: a planner
+          estimate for large unfiltered views, a short-lived cached count for filtered ones.
 
     Example:
         <a href="{% url 'generic_table_view' 'Parts' %}?q=123&status=Active&qa_mode=true">Filtered Parts Table</a>
     """
-    # Support either 'ModelName' or 'app_label.ModelName'
-    if '_' in model_name:
-        app_label, model_str = model_name.split('_', 1)
-    else:
-        app_label = 'Tracker'  # default app
-        model_str = model_name
-
+    # Support either 'ModelName' or 'app_label_ModelName'
     try:
-        Model = apps.get_model(app_label, model_str)
+        Model = resolve_table_model(model_name)
     except LookupError:
         raise Http404("Model not found.")
 
-    CONFIG = {
-        "auditlog_logentry": {
-            "headers": ["Timestamp", "Actor Email", "Action", "Object", "Changes", "Remote IP"],
-            "fields": ["timestamp", "actor_email", "action", "object_repr", "changes_text", "remote_addr"],
-            "link_prefix": "auditlog_logentry",
-            "search_fields": [
-                "actor_email",
-                "object_repr",
-                "changes_text",
-                "remote_addr",
-                "action",
-                "additional_data"
-            ],
-            "filter_fields": ["action", "actor_email"]
-        },
-        "Orders": {
-            "headers": ["Name", "Estimated Completion", "Status"],
-            "fields": ["name", "estimated_completion", "status"],
-            "link_prefix": "Orders",
-            "search_fields": ["name", "status"],
-            "filter_fields": ["status"]
-        },
-        "Parts": {
-            "headers": ["ERP ID", "Part Type", "Step", "Status"],
-            "fields": ["ERP_id", "part_type", "step", "status"],
-            "link_prefix": "Parts",
-            "search_fields": ["ERP_id", "status", "part_type__name"],
-            "filter_fields": ["status", "part_type__name"]
-        },
-        "Documents": {
-            "headers": ["File Name", "File", "Part", "Upload Date", "Uploaded By"],
-            "fields": ["file_name", "file", "part", "upload_date", "uploaded_by"],
-            "link_prefix": "Documents",
-            "search_fields": ["file_name", "file", "part__part_type__ID_prefix", "part__part_type__name",
-                              "part__order__name", "uploaded_by__first_name", "uploaded_by__last_name",
-                              "uploaded_by__email", "uploaded_by__username"],
-        },
-        "WorkOrder": {
-            "headers": ["ERP ID", "Operator", "Related Order", "Status", "Expected Completion"],
-            "fields": ["ERP_id", "operator", "related_order", "status", "expected_completion"],
-            "link_prefix": "WorkOrder",
-            "search_fields": ["ERP_id", "operator__username", "related_order__name", "status"],
-            "filter_fields": ["status", "operator__username"]
-        },
-        "PartTypes": {
-            "headers": ["Name", "Updated Last", "Glovia ID Prefix"],
-            "fields": ["name", "updated_at", "ID_prefix"],
-            "link_prefix": "PartTypes",
-            "search_fields": ["Name", "ID_prefix"],
-        },
-        "QualityErrorsList": {
-            "headers": ["Error Name", "Error Example", "Part Type"],
-            "fields": ["error_name", "error_example", "part_type"],
-            "link_prefix": "QualityErrorsList",
-            "search_fields": ["error_name", "error_example", "part_type__name"],
-        },
-        "Processes": {
-            "headers": ["Name", "Remanufactured Process", "Number of Steps", "Version", "Part Type"],
-            "fields": ["name", "is_remanufactured", "num_steps", "version", "part_type__name"],
-            "link_prefix": "Processes",
-            "search_fields": ["name", "num_steps", "version", "part_type__name", ],
-        },
-        "Equipments": {
-            "headers": ["Name", "Equipment Type"],
-            "fields": ["name", "equipment_type__name"],
-            "link_prefix": "Equipments",
-            "search_fields": [],
-        },
-        "EquipmentType": {
-            "headers": ["Name"],
-            "fields": ["name"],
-            "link_prefix": "EquipmentType",
-            "search_fields": ["name"],
-        },
-        "Steps": {
-            "headers": ["Step", "Part Type", "Process"],
-            "fields": ["step", "part_type__name", "process__name"],
-            "link_prefix": "Steps",
-            "search_fields": ["part_type__name", "process__name"],
-        }
-    }
-
-    if model_name not in CONFIG:
+    if model_name not in TABLE_CONFIG:
         raise Http404("Unknown model.")
 
-    config = CONFIG[model_name]
-
-    qs = Model.objects.all().order_by("id")
-
-    # Only show non-archived items if applicable
-    if "archived" in [field.name for field in Model._meta.fields]:
-        qs = qs.filter(archived=False)
-
-    # Restrict customer visibility
-    if not request.user.is_staff:
-        if model_name == "Orders":
-            qs = qs.filter(customer=request.user)
-        elif model_name == "Parts":
-            qs = qs.filter(order__customer=request.user)
-        else:
-            return Http404("Unknown model.")
+    config = TABLE_CONFIG[model_name]
 
-    # Search
-    query = request.GET.get("q", "")
-    if query:
-        q_filter = Q()
-        for field in config["search_fields"]:
-            q_filter |= Q(**{f"{field}__icontains": query})
-        qs = qs.filter(q_filter)
+    # Conditional GET: unchanged tables are answered with 304 or a cached fragment,
+    # skipping both the ORM and the template engine
+    etag = quote_etag(table_etag(request, model_name))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        fragment = get_cached_fragment(etag)
+        if fragment is not None:
+            response = HttpResponse(fragment)
+    if response is not None:
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
-    # Filters
-    for field in config.get("filter_fields", []):
-        value = request.GET.get(field)
-        if value:
-            qs = qs.filter(**{field: value})
+    qs, query, sort, direction, filtered = table_queryset(request, model_name, Model, config)
 
-    # Filter values for dropdowns
+    # Filter values for dropdowns, served from the facet cache
     filter_values = {}
+    filter_counts = {}
     for field in config.get("filter_fields", []):
         try:
-            values = Model.objects.order_by().values_list(field, flat=True).distinct()
-            filter_values[field] = [v for v in values if v is not None]
+            filter_values[field] = facet_values(Model, field)
+            if config.get("facet_counts"):
+                filter_counts[field] = facet_counts(qs, field)
         except Exception:
             filter_values[field] = []
 
-    sort = request.GET.get("sort")
-    direction = request.GET.get("direction", "asc")
-
-    if sort and sort in config["fields"]:
-        if direction == "desc":
-            qs = qs.order_by(f"-{sort}")
-        else:
-            qs = qs.order_by(sort)
+    if config.get("cursor_pagination"):
+        paginator = KeysetPaginator(qs, 25, sort=sort, descending=direction == "desc")
+        page_obj = paginator.get_page(request.GET.get("cursor"))
+    else:
+        paginator = EstimatedCountPaginator(qs, 25, filtered=filtered)
+        page_obj = paginator.get_page(request.GET.get("page"))
 
-    paginator = Paginator(qs, 25)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    querystring = request.GET.copy()
+    querystring.pop("page", None)
+    querystring.pop("cursor", None)
 
     # Modes
     qa_mode = request.GET.get("qa_mode") == "true"
@@ -1788,11 +1924,13 @@ def generic_table_view(request, model_name):
         "fields": config["fields"],
         "rows": page_obj.object_list,
         "page_obj": page_obj,
+        "querystring": querystring.urlencode(),
         "table_id": f"{model_name.lower()}-table",
         "link_prefix": config.get("link_prefix"),
         "query": query,
         "filter_fields": config.get("filter_fields", []),
         "filter_values": filter_values,
+        "filter_counts": filter_counts,
         "model_name": model_name,
         "qa_mode": qa_mode,
         "edit_mode": edit_mode,
@@ -1803,7 +1941,125 @@ def generic_table_view(request, model_name):
         )
     }
 
-    return render(request, "tracker/partials/generic_table.html", context)
+    response = render(request, "tracker/partials/generic_table.html", context)
+    set_cached_fragment(etag, response.content)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@login_required
+def export_table_view(request, model_name):
+    """
+    View Name: export_table_view
+
+    URL Pattern:
+        path('tables/export/<str:model_name>', views.export_table_view, name='export_table_view')
+
+    Decorators:
+        - @login_required
+
+    Purpose:
+        Streams the current view of a generic table as a CSV download: every row matching the same
+        search, filters, sort and customer scoping as `generic_table_view`, not just the visible page.
+
+    Parameters:
+        request (HttpRequest): The HTTP request object, carrying the table's GET parameters.
+        model_name (str): The name of the model to export. Must exist in TABLE_CONFIG.
+
+    Raises:
+        Http404: If the model is not configured or the user has no access to it.
+
+    Template:
+        None (returns a StreamingHttpResponse)
+
+    Context:
+        None
+
+    Notes:
+        - Columns come from `Tracker.tables.export.export_columns`, using the entry's `export_fields` if set.
+        - Rows are read with `values_list().iterator()` in chunks, so memory use is flat even for
+          millions of Parts or audit log entries.
+        - Pagination parameters (`page`, `cursor`) are ignored.
+
+    Example:
+        <a href="{% url 'export_table_view' 'Parts' %}?q=DI-&status=PENDING">Export CSV</a>
+    """
+    try:
+        Model = resolve_table_model(model_name)
+    except LookupError:
+        raise Http404("Model not found.")
+
+    if model_name not in TABLE_CONFIG:
+        raise Http404("Unknown model.")
+
+    config = TABLE_CONFIG[model_name]
+    qs, _, _, _, _ = table_queryset(request, model_name, Model, config)
+
+    response = StreamingHttpResponse(iter_csv(qs, export_columns(Model, config)), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{model_name.lower()}_{now():%Y%m%d_%H%M}.csv"'
+    return response
+
+
+@staff_member_required(login_url="login")
+def analytics_export_view(request, dataset):
+    """
+    View Name: analytics_export_view
+
+    URL Pattern:
+        path('analytics/export/<str:dataset>/', views.analytics_export_view, name='analytics_export')
+
+    Decorators:
+        - @staff_member_required
+
+    Purpose:
+        Streams one analytics dataset (parts, transitions, error_reports, equipment_usage) for a date
+        window as an Arrow IPC stream, so analysts can load it straight into pandas without re-parsing CSV.
+
+    GET Parameters:
+        start (str): ISO date or datetime; required.
+        end (str): ISO date or datetime; defaults to now. Windows are limited to `MAX_REPORT_DAYS`.
+
+    Raises:
+        Http404: If the dataset is unknown.
+
+    Template:
+        None (returns a StreamingHttpResponse)
+
+    Notes:
+        - For scheduled, incremental exports use `manage.py export_analytics`, which writes
+          partitioned Parquet files and keeps a watermark.
+
+    Example:
+        pyarrow.ipc.open_stream(requests.get(url, params={"start": "2025-06-01"}).content).read_pandas()
+    """
+    if dataset not in ANALYTICS_DATASETS:
+        raise Http404("Unknown dataset.")
+
+    def parse(value):
+        parsed = parse_datetime(value) or (
+            datetime.combine(parse_date(value), datetime.min.time()) if parse_date(value) else None
+        )
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    try:
+        start = parse(request.GET.get("start", ""))
+        end = parse(request.GET["end"]) if request.GET.get("end") else timezone.now()
+    except ValueError:
+        start = end = None
+    if start is None or end is None or end <= start:
+        return HttpResponseBadRequest("Pass a valid start (and optional end) as ISO dates.")
+    if end - start > timedelta(days=MAX_REPORT_DAYS):
+        return HttpResponseBadRequest(f"Windows are limited to {MAX_REPORT_DAYS} days.")
+
+    response = StreamingHttpResponse(
+        iter_arrow_stream(dataset, dataset_rows(dataset, start, end)),
+        content_type="application/vnd.apache.arrow.stream",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{dataset}_{start:%Y%m%d}_{end:%Y%m%d}.arrows"'
+    return response
 
 
 def get_client_ip(request):
@@ -1928,11 +2184,18 @@ def edit_model_page(request, model_name):
     return render(request, "tracker/generics/generic_edit_page.html", {"model_name": model_name})
 
 
+@staff_member_required(login_url="login")
+@require_POST
 def deal_pass(request, order_id):
     order = get_object_or_404(Orders, pk=order_id)
-    parts = Parts.objects.filter(order_id=order.pk)
-    for part in parts:
-        part.increment_step()
+    report = advance_parts(Parts.objects.filter(order_id=order.pk, archived=False), operator=request.user)
+    counts = summarize(report)
+    messages.info(
+        request,
+        f"{order.name}: {counts.get('advanced', 0)} parts advanced, {counts.get('completed', 0)} completed.",
+    )
+    if counts.get("error"):
+        messages.error(request, f"{order.name}: {counts['error']} parts could not be advanced.")
     return redirect("qa_orders")
 
 def history(request):
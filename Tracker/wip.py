@@ -0,0 +1,157 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+
+from Tracker.models import Parts, WipSummary
+from Tracker.routing import routing_step
+
+WIP_FIELDS = ("order_id", "step_id", "status", "archived")
+"""Part attributes that decide which `WipSummary` row a part is counted in."""
+
+
+def part_state(part):
+    """
+    Returns the `(order_id, step_id, status, archived)` a part instance is counted under.
+
+    Reads the instance's loaded values only; returns None if any of them is deferred, rather
+    than triggering a query.
+    """
+    values = part.__dict__
+    if any(name not in values for name in WIP_FIELDS):
+        return None
+    return tuple(values[name] for name in WIP_FIELDS)
+
+
+def record_part_change(deltas, old, new):
+    """
+    Adds the effect of a part moving from state `old` to state `new` to `deltas`.
+
+    States are `(order_id, step_id, status, archived)` tuples, or None for a part that did not
+    exist before / no longer exists. Archived parts are not counted.
+    """
+    if old is not None and not old[3]:
+        deltas[old[:3]] -= 1
+    if new is not None and not new[3]:
+        deltas[new[:3]] += 1
+
+
+def apply_wip_deltas(deltas):
+    """
+    Adds `deltas` ({(order_id, step_id, status): change}) to `WipSummary` in one statement.
+
+    Missing rows are created by the upsert. Keys are written in a fixed order so concurrent
+    transactions lock summary rows in the same order and cannot deadlock on each other. Call it
+    inside the transaction that changes the parts, so the summary commits or rolls back with them.
+    """
+    items = sorted(
+        ((key, change) for key, change in deltas.items() if change),
+        key=lambda item: (item[0][0] or 0, item[0][1] or 0, item[0][2]),
+    )
+    if not items:
+        return
+    table = connection.ops.quote_name(WipSummary._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (order_id, step_id, status, count, updated_at)
+            SELECT d.order_id, d.step_id, d.status, d.change, now()
+            FROM unnest(%s::bigint[], %s::bigint[], %s::varchar[], %s::integer[])
+                AS d(order_id, step_id, status, change)
+            ON CONFLICT (COALESCE(order_id, 0), COALESCE(step_id, 0), status)
+            DO UPDATE SET count = {table}.count + EXCLUDED.count, updated_at = EXCLUDED.updated_at
+            """,
+            [
+                [key[0] for key, _ in items],
+                [key[1] for key, _ in items],
+                [key[2] for key, _ in items],
+                [change for _, change in items],
+            ],
+        )
+
+
+def rebuild_wip_summary():
+    """
+    Recomputes `WipSummary` from Parts.
+
+    Takes an EXCLUSIVE lock on the summary table for the duration, so concurrent delta writers
+    wait and then apply on top of the rebuilt counts instead of being lost.
+
+    Returns:
+        int: Number of summary rows written.
+    """
+    table = connection.ops.quote_name(WipSummary._meta.db_table)
+    parts_table = connection.ops.quote_name(Parts._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (order_id, step_id, status, count, updated_at)
+            SELECT order_id, step_id, status, COUNT(*), now()
+            FROM {parts_table}
+            WHERE NOT archived
+            GROUP BY order_id, step_id, status
+            """
+        )
+        return cursor.rowcount
+
+
+def status_counts(order_ids=None):
+    """
+    Returns active part counts per status, optionally limited to `order_ids`.
+
+    Returns:
+        dict[str, int]: status -> count, only for statuses with parts.
+    """
+    rows = WipSummary.objects.filter(count__gt=0)
+    if order_ids is not None:
+        rows = rows.filter(order_id__in=order_ids)
+    return {
+        row["status"]: row["total"]
+        for row in rows.values("status").annotate(total=Sum("count")).order_by("status")
+    }
+
+
+def order_progress(order_ids):
+    """
+    Returns per-order active and completed part counts for order lists.
+
+    Returns:
+        dict[int, dict]: order id -> {"active": int, "completed": int}
+    """
+    progress = defaultdict(lambda: {"active": 0, "completed": 0})
+    rows = (
+        WipSummary.objects.filter(order_id__in=order_ids, count__gt=0)
+        .values("order_id")
+        .annotate(
+            active=Sum("count"),
+            completed=Sum("count", filter=Q(status=Parts.Status.COMPLETED)),
+        )
+    )
+    for row in rows:
+        progress[row["order_id"]] = {"active": row["active"], "completed": row["completed"] or 0}
+    return progress
+
+
+def order_steps(order_id):
+    """
+    Returns an order's active part counts per step and status, in step order, for progress views.
+
+    Returns:
+        list[dict]: `{"step_id", "step", "number", "status", "count"}` rows; `step` is the routing label.
+    """
+    rows = []
+    for step_id, status, count in (
+        WipSummary.objects.filter(order_id=order_id, count__gt=0).values_list("step_id", "status", "count")
+    ):
+        step = routing_step(step_id) if step_id else None
+        rows.append({
+            "step_id": step_id,
+            "step": step["label"] if step else "No step",
+            "number": step["step"] if step else 0,
+            "status": status,
+            "count": count,
+        })
+    return sorted(rows, key=lambda row: (row["number"], row["status"]))
+